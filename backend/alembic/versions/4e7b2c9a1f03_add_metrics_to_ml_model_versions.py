@@ -0,0 +1,24 @@
+"""add_metrics_to_ml_model_versions
+
+Revision ID: 4e7b2c9a1f03
+Revises: dd01025878b5
+Create Date: 2026-10-17 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = '4e7b2c9a1f03'
+down_revision = 'dd01025878b5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('ml_model_versions', sa.Column('metrics', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('ml_model_versions', 'metrics')
@@ -0,0 +1,80 @@
+"""
+Dependencies de limitation de débit
+"""
+from typing import Optional, Tuple
+from fastapi import Depends, HTTPException, Request, Response, status
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from jose import jwt
+from app.core.config import settings
+from app.services.rate_limiter import rate_limiter
+
+
+def _identity(
+    request: Request, credentials: Optional[HTTPAuthorizationCredentials]
+) -> Tuple[str, Optional[str]]:
+    """
+    (identité, rôle) du client : claims du JWT si présent, sinon IP.
+    Simple lecture des claims, sans accès base : la validité du token
+    (révocation, existence de l'utilisateur) reste vérifiée par get_current_user.
+    """
+    if credentials is not None:
+        try:
+            payload = jwt.decode(
+                credentials.credentials, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
+            )
+            if payload.get("type") == "access" and payload.get("sub"):
+                return str(payload["sub"]), payload.get("role") or "USER"
+        except jwt.JWTError:
+            pass
+    host = request.client.host if request.client else "unknown"
+    return host, None
+
+
+async def _apply(request: Request, response: Response, cost: int):
+    identity, role = request.state.rate_limit_identity
+    result = await rate_limiter.hit(identity, role, cost)
+    if not result.limit:
+        return
+    if not result.allowed:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded",
+            headers=result.headers(),
+        )
+    response.headers.update(result.headers())
+
+
+async def rate_limit(
+    request: Request,
+    response: Response,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False)),
+):
+    """
+    Dependency : une unité de quota par requête, en-têtes X-RateLimit-* en retour.
+
+    Usage:
+        api_router.include_router(router, dependencies=[Depends(rate_limit)])
+    """
+    request.state.rate_limit_identity = _identity(request, credentials)
+    await _apply(request, response, cost=1)
+
+
+async def charge_rate_limit(request: Request, response: Response, cost: int):
+    """
+    Débite des unités supplémentaires (endpoints batch : une unité par élément).
+    Doit être appelé après la dependency rate_limit, qui a déjà débité une
+    unité. Un lot plus grand que le quota de la période ne pourra jamais
+    passer : il est refusé (413) sans rien débiter de plus.
+    """
+    _, role = request.state.rate_limit_identity
+    quota = rate_limiter.quota_for(role)
+    if quota and cost + 1 > quota:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=(
+                f"Batch of {cost + 1} items exceeds the rate limit quota "
+                f"({quota} per {settings.RATE_LIMIT_PERIOD_SECONDS} s): split it into smaller batches"
+            ),
+        )
+    if cost > 0:
+        await _apply(request, response, cost)
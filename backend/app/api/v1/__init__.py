@@ -1,4 +1,5 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
+from app.api.deps.rate_limit_deps import rate_limit
 from app.api.v1.endpoints.phone import router as phone_router
 from app.api.v1.endpoints.sms import router as sms_router
 from app.api.v1.endpoints.email import router as email_router
@@ -14,9 +15,15 @@ from app.api.v1.endpoints.blacklist import router as blacklist_router
 api_router = APIRouter()
 
 print("DEBUG: Registering routers in /api/v1")
-api_router.include_router(phone_router, prefix="/phone", tags=["phone"])
-api_router.include_router(sms_router, prefix="/sms", tags=["sms"])
-api_router.include_router(email_router, prefix="/email", tags=["email"])
+api_router.include_router(
+    phone_router, prefix="/phone", tags=["phone"], dependencies=[Depends(rate_limit)]
+)
+api_router.include_router(
+    sms_router, prefix="/sms", tags=["sms"], dependencies=[Depends(rate_limit)]
+)
+api_router.include_router(
+    email_router, prefix="/email", tags=["email"], dependencies=[Depends(rate_limit)]
+)
 api_router.include_router(reports_router, prefix="/reports", tags=["reports"])
 api_router.include_router(auth_router, prefix="/auth", tags=["auth"])
 api_router.include_router(users_router, prefix="/users", tags=["users"])
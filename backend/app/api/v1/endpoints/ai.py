@@ -1,15 +1,26 @@
-from fastapi import APIRouter, Depends, BackgroundTasks, UploadFile, File, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
 import pandas as pd
 import io
-import csv
 from app.db.session import get_db
-from app.schemas.ai import ChatRequest, ChatResponse, TrainingDataRequest, TrainingResponse
+from typing import List
+from app.schemas.ai import (
+    ChatRequest,
+    ChatResponse,
+    TrainingDataRequest,
+    TrainingResponse,
+    ModelVersionResponse,
+    TrainingStatusResponse,
+)
 from app.services.ai_service import ai_service
-from app.services.ml_service.service import ml_service
+from app.services.ml_service.registry import model_registry
+from app.services.ml_service.incremental import enqueue_samples, incremental_mode
+from app.services.ml_service.training_jobs import request_training, training_status
 from app.api.deps.auth_deps import get_current_user
+from app.api.deps.role_deps import require_admin
 from app.models.user import User
-from app.ml.train import trigger_training, DATA_DIR
+from app.ml.dataset_store import training_store
 
 router = APIRouter()
 
@@ -28,46 +39,53 @@ async def chat_with_ai(
     return ChatResponse(**result)
 
 
-async def run_training_background():
-    """Tâche de fond pour l'entraînement et le rechargement."""
+async def schedule_training() -> str:
+    """
+    Entraînement en tâche Celery (file ml), hors du processus API. Les
+    demandes rapprochées sont regroupées en un seul run.
+    """
     try:
-        trigger_training()
-        ml_service.load_models()
+        job = await request_training("api")
     except Exception as e:
-        print(f"Error in background training: {e}")
+        raise HTTPException(status_code=503, detail=f"Entraînement non planifié : {e}")
+    return "Entraînement planifié." if job["queued"] else "Entraînement déjà planifié, demande regroupée."
 
 
 @router.post("/train/text", response_model=TrainingResponse)
 async def add_training_text(
     request: TrainingDataRequest,
-    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
 ):
     """
     Ajouter un message unique au jeu d'entraînement et déclencher le ré-entraînement.
     """
     try:
-        dataset_path = DATA_DIR / "sms_train.csv"
-        file_exists = dataset_path.exists()
+        # Nouveau segment du store (écriture hors boucle, sans verrou entre workers)
+        await asyncio.to_thread(
+            training_store.append,
+            [(request.content, 1 if request.is_fraud else 0, "api_submission")],
+        )
 
-        with open(dataset_path, "a", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            if not file_exists:
-                writer.writerow(["content", "is_fraud", "fraud_type"])
-            writer.writerow([request.content, 1 if request.is_fraud else 0, "api_submission"])
+        if incremental_mode():
+            # Appris au prochain cycle incrémental, sans réentraînement complet
+            await enqueue_samples([(request.content, 1 if request.is_fraud else 0)])
+            return TrainingResponse(
+                success=True,
+                message="Données ajoutées. Apprentissage incrémental au prochain cycle."
+            )
 
-        background_tasks.add_task(run_training_background)
         return TrainingResponse(
             success=True,
-            message="Données ajoutées. Entraînement lancé en arrière-plan."
+            message=f"Données ajoutées. {await schedule_training()}"
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/train/csv", response_model=TrainingResponse)
 async def upload_training_csv(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_user),
 ):
@@ -94,21 +112,55 @@ async def upload_training_csv(
             df_new["fraud_type"] = "csv_upload"
 
         # On ne garde que ce qui nous intéresse
-        df_new = df_new[["content", "is_fraud", "fraud_type"]]
+        df_new = df_new[["content", "is_fraud", "fraud_type"]].dropna(subset=["content"])
 
-        dataset_path = DATA_DIR / "sms_train.csv"
-        if dataset_path.exists():
-            df_existing = pd.read_csv(dataset_path)
-            df_final = pd.concat([df_existing, df_new], ignore_index=True)
-        else:
-            df_final = df_new
+        # Un segment pour l'upload : coût proportionnel aux lignes ajoutées
+        await asyncio.to_thread(
+            training_store.append,
+            zip(df_new["content"].astype(str), df_new["is_fraud"], df_new["fraud_type"]),
+        )
 
-        df_final.to_csv(dataset_path, index=False)
+        if incremental_mode():
+            await enqueue_samples(
+                list(zip(df_new["content"].astype(str), df_new["is_fraud"]))
+            )
+            return TrainingResponse(
+                success=True,
+                message=f"{len(df_new)} exemples ajoutés. Apprentissage incrémental au prochain cycle."
+            )
 
-        background_tasks.add_task(run_training_background)
         return TrainingResponse(
             success=True,
-            message=f"{len(df_new)} exemples ajoutés. Entraînement lancé en arrière-plan."
+            message=f"{len(df_new)} exemples ajoutés. {await schedule_training()}"
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/train/status", response_model=TrainingStatusResponse)
+async def get_training_status(current_user: User = Depends(get_current_user)):
+    """Job d'entraînement en cours, dernier job terminé et demandes en attente."""
+    try:
+        return await training_status()
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@router.get("/models", response_model=List[ModelVersionResponse])
+async def list_model_versions(current_user: User = Depends(require_admin)):
+    """Versions du classifieur SMS enregistrées (la plus récente d'abord)."""
+    return await model_registry.list_versions()
+
+
+@router.post("/models/{version_id}/activate", response_model=ModelVersionResponse)
+async def activate_model_version(version_id: int, current_user: User = Depends(require_admin)):
+    """
+    Active une version (rollback compris) : chaque worker la charge en
+    arrière-plan puis bascule d'un coup.
+    """
+    try:
+        return await model_registry.activate(version_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
@@ -2,6 +2,14 @@ from fastapi import APIRouter, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_db
 from app.services.analytics_service import analytics_service
+from app.services.ml_service import inference_executor, ml_service, model_registry
+from app.services.ml_service.evaluation import dashboard_quality
+from app.services.detection import detection_log_sink, sms_rule_engine
+from app.services.cache import cache_service
+from app.rag.batcher import embedding_batcher
+from app.services.rag_service import rag_service
+from app.services.singleflight import singleflight
+from app.services.rate_limiter import rate_limiter
 from app.models.user import User
 from app.api.deps.role_deps import require_organisation, require_admin
 from datetime import datetime
@@ -65,18 +73,10 @@ async def get_admin_dashboard(
     trends = await analytics_service.get_fraud_trends(db)
     leaderboard = await analytics_service.get_leaderboard(db, "month", 10)
 
-    # Qualité (mock pour MVP)
+    # Qualité : dernière évaluation de la version active sur le holdout
     quality = {
         "total_detections": overview["total_detections"],
-        "true_positives": int(overview["total_detections"] * 0.95),
-        "false_positives": int(overview["total_detections"] * 0.02),
-        "false_negatives": int(overview["total_detections"] * 0.02),
-        "true_negatives": int(overview["total_detections"] * 0.01),
-        "precision": 0.979,
-        "recall": 0.979,
-        "f1_score": 0.979,
-        "accuracy": 0.960,
-        "by_fraud_type": {}
+        **await dashboard_quality(db),
     }
 
     dashboard = {
@@ -126,6 +126,15 @@ async def analytics_health(
     return {
         "status": "healthy" if db_ok else "degraded",
         "database": "ok" if db_ok else "error",
-        "cache": "disabled",
+        "cache": cache_service.stats(),
+        "inference": inference_executor.stats(),
+        "model_registry": model_registry.stats(),
+        "ml_model": ml_service.stats(),
+        "embeddings": embedding_batcher.stats(),
+        "rag": rag_service.stats(),
+        "detection_logs": detection_log_sink.stats(),
+        "sms_rules": sms_rule_engine.stats(),
+        "singleflight": singleflight.stats(),
+        "rate_limit": rate_limiter.stats(),
         "response_time_ms": response_time
     }
\ No newline at end of file
@@ -10,6 +10,7 @@ from app.api.deps.role_deps import require_organisation
 from app.models.user import User
 from app.models.fraud import FraudulentNumber, FraudulentDomain, FraudType
 from app.services.cache import cache_service
+from app.services.detection import blacklist_index
 
 router = APIRouter()
 
@@ -236,6 +237,7 @@ async def blacklist_phone(
     db.add(new_entry)
     await db.commit()
     await db.refresh(new_entry)
+    await blacklist_index.propagate("add", new_entry.phone_number)
     await cache_service.delete(f"phone:{payload.phone_number}")
 
     return BlacklistPhoneResponse(
@@ -274,6 +276,7 @@ async def remove_phone_from_blacklist(
         )
     )
     await db.commit()
+    await blacklist_index.propagate("remove", phone_number)
     await cache_service.delete(f"phone:{phone_number}")
 
     return {"message": f"{phone_number} retiré de la blacklist"}
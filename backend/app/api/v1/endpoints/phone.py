@@ -1,10 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_db
-from app.schemas.phone import PhoneCheckRequest, PhoneCheckResponse
+from app.schemas.phone import (
+    PhoneCheckRequest,
+    PhoneCheckResponse,
+    PhoneBatchCheckRequest,
+    PhoneBatchCheckResponse,
+)
 from app.services.detection import detection_service
-from app.services.cache import cache_service
 from app.api.deps.auth_deps import get_current_user
+from app.api.deps.rate_limit_deps import charge_rate_limit
 from app.models.user import User
 
 router = APIRouter()
@@ -16,15 +21,30 @@ async def check_phone(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    if request.user_id:
-        rate_ok = await cache_service.check_rate_limit(
-            request.user_id, current_user.role
-        )
-        if not rate_ok:
-            raise HTTPException(status_code=429, detail="Rate limit exceeded")
-
     result = await detection_service.check_phone(
         db=db, phone=request.phone, country=request.country, user_id=request.user_id
     )
 
     return PhoneCheckResponse(**result)
+
+
+@router.post("/check-phones", response_model=PhoneBatchCheckResponse)
+async def check_phones(
+    request: PhoneBatchCheckRequest,
+    http_request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Vérification d'un lot de numéros (jusqu'à 5000) en une seule requête.
+    Les résultats sont renvoyés dans l'ordre des numéros reçus.
+    """
+    # Une unité par élément (la première est débitée par la dependency du routeur) ; 413 si le lot dépasse le quota
+    await charge_rate_limit(http_request, response, len(request.phones) - 1)
+
+    result = await detection_service.check_phones(
+        db=db, phones=request.phones, country=request.country, user_id=request.user_id
+    )
+
+    return PhoneBatchCheckResponse(**result)
@@ -19,9 +19,11 @@ from typing import Optional
 from datetime import datetime
 import hashlib
 from app.services.rag_service import rag_service
-from app.rag.embeddings import embedding_service
+from app.rag.batcher import embedding_batcher
 from app.core.phone_utils import normalize_phone_number
 from app.services.cache import cache_service
+from app.services.detection import blacklist_index
+from app.services.ml_service.incremental import enqueue_samples
 
 router = APIRouter()
 
@@ -119,6 +121,8 @@ async def report_phone(
             auto_added = True
 
         await db.commit()
+        if auto_added:
+            await blacklist_index.propagate("add", normalized_phone)
         verified = True
 
     # Invalidation proactive du cache de détection
@@ -172,6 +176,8 @@ async def report_sms(
         fraud_category=report.fraud_category,
         comment=report.comment,
         verification_status=VerificationStatus.PENDING,
+        # Texte complet : exemple d'entraînement une fois le signalement vérifié
+        meta_data={"content": report.content},
     )
 
     db.add(new_report)
@@ -196,10 +202,16 @@ async def report_sms(
         )
         await db.commit()
 
+        if total_reports == 5:
+            # Vient de passer vérifié : appris au prochain cycle incrémental
+            await enqueue_samples([(report.content, 1)])
+
         # === Network Effect: Add to Vector DB for community protection ===
-        vector = embedding_service.get_embedding(report.content)
+        vector = await embedding_batcher.embed(report.content)
         if vector:
-            rag_service.add_vector(
+            # Un point par contenu : report_count mis à jour à chaque signalement
+            await rag_service.add_vector(
+                content_hash,
                 vector=vector,
                 payload={
                     "content": report.content[:500],
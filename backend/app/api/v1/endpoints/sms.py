@@ -1,10 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_db
-from app.schemas.sms import SMSAnalyzeRequest, SMSAnalyzeResponse
+from app.schemas.sms import (
+    SMSAnalyzeRequest,
+    SMSAnalyzeResponse,
+    SMSBatchAnalyzeRequest,
+    SMSBatchAnalyzeResponse,
+)
 from app.services.detection import detection_service
-from app.services.cache import cache_service
 from app.api.deps.auth_deps import get_current_user
+from app.api.deps.rate_limit_deps import charge_rate_limit
 from app.models.user import User
 
 router = APIRouter()
@@ -16,15 +21,32 @@ async def analyze_sms(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    if request.user_id:
-        rate_ok = await cache_service.check_rate_limit(
-            request.user_id, current_user.role
-        )
-        if not rate_ok:
-            raise HTTPException(status_code=429, detail="Rate limit exceeded")
-
     result = await detection_service.check_sms(
         db=db, content=request.content, sender=request.sender, user_id=request.user_id
     )
 
     return SMSAnalyzeResponse(**result)
+
+
+@router.post("/analyze-sms-batch", response_model=SMSBatchAnalyzeResponse)
+async def analyze_sms_batch(
+    request: SMSBatchAnalyzeRequest,
+    http_request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Analyse d'un lot de SMS (passerelles de messagerie), jusqu'à 1000 messages.
+    Les résultats sont renvoyés dans l'ordre des messages reçus.
+    """
+    # Une unité par élément (la première est débitée par la dependency du routeur) ; 413 si le lot dépasse le quota
+    await charge_rate_limit(http_request, response, len(request.messages) - 1)
+
+    result = await detection_service.check_sms_batch(
+        db=db,
+        messages=[m.model_dump() for m in request.messages],
+        user_id=request.user_id,
+    )
+
+    return SMSBatchAnalyzeResponse(**result)
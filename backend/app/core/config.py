@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 
 
 class Settings(BaseSettings):
@@ -19,6 +19,52 @@ class Settings(BaseSettings):
     REDIS_URL: str = "redis://localhost:6379/0"
     QDRANT_URL: str = "http://localhost:6333"
 
+    # RAG (similarité avec les SMS signalés) : modèle d'embeddings + Qdrant chargés au démarrage
+    RAG_ENABLED: bool = True
+
+    # Embeddings RAG : requêtes concurrentes regroupées en lots de longueurs voisines
+    EMBEDDING_MAX_BATCH_SIZE: int = 32
+    EMBEDDING_MAX_WAIT_MS: float = 5.0
+    # Textes collectés par cycle = EMBEDDING_MAX_BATCH_SIZE * EMBEDDING_MAX_BUCKETS
+    EMBEDDING_MAX_BUCKETS: int = 4
+    # Dans un lot, texte le plus long <= ratio x le plus court
+    EMBEDDING_BUCKET_LENGTH_RATIO: float = 2.0
+    # Cache des embeddings (sha256 du texte normalisé) : LRU par worker + Redis float16
+    EMBEDDING_CACHE_LRU_SIZE: int = 20000
+    EMBEDDING_CACHE_TTL_SECONDS: int = 30 * 24 * 3600
+
+    # RAG : index vectoriel local (repli de Qdrant), exact jusqu'à N points puis HNSW
+    RAG_LOCAL_INDEX_ENABLED: bool = True
+    RAG_LOCAL_BRUTE_FORCE_MAX: int = 20000
+    RAG_HNSW_M: int = 16
+    RAG_HNSW_EF_CONSTRUCTION: int = 100
+    RAG_HNSW_EF_SEARCH: int = 64
+    # Qdrant en erreur ou plus lent que RAG_QDRANT_SLOW_MS : index local pendant le backoff
+    RAG_QDRANT_TIMEOUT_SECONDS: int = 2
+    RAG_QDRANT_SLOW_MS: float = 100.0
+    RAG_QDRANT_BACKOFF_SECONDS: float = 30.0
+    # Qdrant injoignable (au démarrage ou ensuite) : nouvelle tentative de connexion
+    RAG_QDRANT_RECONNECT_SECONDS: float = 30.0
+    # Ajouts de points : écrits par lots (Qdrant + index local)
+    RAG_UPSERT_BATCH_SIZE: int = 64
+    RAG_UPSERT_FLUSH_INTERVAL_MS: int = 500
+    RAG_UPSERT_MAX_PENDING: int = 10000
+    # Recherche de similarité : quantification int8 (rescore sur limit x oversampling candidats)
+    RAG_QDRANT_QUANTIZATION: bool = True
+    RAG_QDRANT_OVERSAMPLING: float = 2.0
+    RAG_SIMILAR_FRAUD_MIN_MATCHES: int = 3
+
+    # Cache L1 en mémoire devant Redis (TTL en secondes par namespace de clé)
+    CACHE_L1_MAX_SIZE: int = 10000
+    CACHE_L1_TTLS: Dict[str, int] = {"phone": 60, "analytics": 30}
+
+    # Single-flight : coalescence des calculs identiques (verrou Redis optionnel entre workers)
+    SINGLEFLIGHT_DISTRIBUTED: bool = False
+    SINGLEFLIGHT_LOCK_TTL_MS: int = 5000
+    SINGLEFLIGHT_LOCK_WAIT_MS: int = 1000
+    SINGLEFLIGHT_POLL_MS: int = 20
+    SINGLEFLIGHT_RESULT_TTL: int = 10
+
     # CORS
     CORS_ORIGINS: List[str] = ["*"]
 
@@ -26,13 +72,94 @@ class Settings(BaseSettings):
     ML_MODEL_PATH: str = "/app/models/ml_models"
     FRAUD_CONFIDENCE_THRESHOLD: float = 0.7
 
-    # Rate limiting
+    # Inférence ML (pool de threads + micro-batching)
+    ML_INFERENCE_WORKERS: int = 1
+    ML_INFERENCE_MAX_BATCH_SIZE: int = 32
+    ML_INFERENCE_MAX_WAIT_MS: float = 5.0
+
+    # Registre de modèles : vérification périodique de la version active
+    ML_REGISTRY_SYNC_SECONDS: int = 60
+
+    # Artefacts mmap (app/ml/artifacts.py) partagés entre workers ; sinon pickles
+    ML_MMAP_ARTIFACTS: bool = True
+    # Pickles : prédiction par l'évaluateur à tableaux plats plutôt que sklearn
+    ML_COMPILED_FOREST: bool = True
+    # Cascade : régression logistique d'abord, forêt seulement dans la bande
+    # d'incertitude réglée à l'entraînement (app/ml/cascade.py)
+    ML_CASCADE_ENABLED: bool = True
+
+    # Entraînement : "full" (RandomForest + TF-IDF, réentraîné en entier) ou
+    # "incremental" (HashingVectorizer + SGD, partial_fit sur les nouveaux exemples)
+    ML_TRAINING_MODE: str = "full"
+    ML_INCREMENTAL_BATCH_SIZE: int = 256
+    ML_INCREMENTAL_MAX_SAMPLES: int = 10000
+    ML_CONSOLIDATION_EPOCHS: int = 5
+
+    # Jobs d'entraînement Celery : verrou Redis (au-delà du time limit Celery,
+    # 1h) et délai avant nouvel essai quand un autre entraînement tourne
+    ML_TRAIN_LOCK_TTL_SECONDS: int = 3900
+    ML_TRAIN_RETRY_SECONDS: int = 60
+
+    # Store d'entraînement (segments Parquet) : compaction à partir de N segments
+    ML_DATASET_COMPACT_MIN_SEGMENTS: int = 20
+
+    # Évaluation des versions (version active + candidates plus récentes) sur le holdout
+    ML_EVAL_MAX_CANDIDATES: int = 2
+    ML_EVAL_HOLDOUT_MAX: int = 5000
+    ML_EVAL_LATENCY_SAMPLES: int = 200
+    ML_EVAL_BATCH_SIZE: int = 32
+
+    # Index blacklist en mémoire
+    BLACKLIST_INDEX_REFRESH_SECONDS: int = 30
+    BLACKLIST_INDEX_FULL_RELOAD_SECONDS: int = 900
+    BLACKLIST_INDEX_FALSE_POSITIVE_RATE: float = 0.01
+
+    # Budgets de latence des étapes de détection (ms, par nom d'étape ; absente = sans limite).
+    # Les étapes qui touchent la base (blacklist, persistance) n'ont pas de budget.
+    DETECTION_STAGE_BUDGETS_MS: Dict[str, float] = {
+        "cache": 50,
+        "ml": 1000,
+        "similarity": 200,
+        "spf": 500,
+    }
+
+    # Moteur de règles SMS (fraudulent_sms_patterns)
+    SMS_RULES_MIN_KEYWORDS: int = 2
+    SMS_RULES_BLOCK_SEVERITY: int = 8
+    SMS_RULES_REFRESH_SECONDS: int = 60
+    SMS_RULES_FLUSH_SECONDS: int = 10
+
+    # Logs de détection (écriture différée)
+    DETECTION_LOG_BATCH_SIZE: int = 500
+    DETECTION_LOG_FLUSH_INTERVAL_MS: int = 200
+    DETECTION_LOG_QUEUE_SIZE: int = 20000
+    DETECTION_LOG_ENQUEUE_TIMEOUT_MS: int = 50
+
+    # DNS / SPF
+    DNS_NAMESERVERS: List[str] = []
+    DNS_PORT: int = 53
+    SPF_LOOKUP_TIMEOUT: float = 2.0
+    SPF_MIN_TTL: int = 60
+    SPF_MAX_TTL: int = 86400
+    SPF_NEGATIVE_TTL: int = 900
+    SPF_ERROR_TTL: int = 30
+    SPF_LOCAL_CACHE_SIZE: int = 10000
+
+    # Rate limiting (quotas par RATE_LIMIT_PERIOD_SECONDS, 0 = illimité ;
+    # MAX_REQUESTS_PER_MINUTE s'applique aux clients anonymes, par IP)
     MAX_REQUESTS_PER_MINUTE: int = 100
 
     USER_QUOTA: int = 5
     ORGANISATION_QUOTA: int = 100
     ADMIN_QUOTA: int = 0
 
+    RATE_LIMIT_PERIOD_SECONDS: int = 60
+    # Réservation locale de jetons pour les quotas élevés
+    RATE_LIMIT_LOCAL_MIN_QUOTA: int = 100
+    RATE_LIMIT_LOCAL_BATCH: int = 10
+    RATE_LIMIT_LOCAL_LEASE_MS: int = 2000
+    RATE_LIMIT_LOCAL_MAX_KEYS: int = 10000
+
     class Config:
         env_file = ".env"
         case_sensitive = True
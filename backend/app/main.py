@@ -1,20 +1,41 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from app.core.config import settings
 from app.api.v1 import api_router
 from app.services.cache import cache_service
-from app.services.ml_service import ml_service
+from app.services.ml_service import ml_service, inference_executor, model_registry
+from app.services.detection import blacklist_index, detection_log_sink, sms_rule_engine
+from app.rag.batcher import embedding_batcher
+from app.rag.embeddings import embedding_service
+from app.services.rag_service import rag_service
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await cache_service.connect()
     ml_service.load_models()
-    # rag_service.connect()
-    # embedding_service.load_model()
+    await model_registry.start()
+    await inference_executor.start()
+    await blacklist_index.start()
+    await sms_rule_engine.start()
+    await detection_log_sink.start()
+    if settings.RAG_ENABLED:
+        # Modèle absent ou Qdrant injoignable : RAG ignoré / index local seul
+        await asyncio.to_thread(embedding_service.load_model)
+        await rag_service.connect()
+    await embedding_batcher.start()
+    await rag_service.start()
 
     yield
 
+    await rag_service.stop()
+    await embedding_batcher.stop()
+    await detection_log_sink.stop()
+    await sms_rule_engine.stop()
+    await blacklist_index.stop()
+    await inference_executor.stop()
+    await model_registry.stop()
     await cache_service.disconnect()
 
 
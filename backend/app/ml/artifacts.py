@@ -0,0 +1,275 @@
+"""
+Artefacts ML mappables en mémoire (numpy mmap).
+
+Le pickle sklearn d'une forêt est désérialisé dans la mémoire privée de chaque
+worker : N workers = N copies. Ici les tableaux des arbres (enfants, feature,
+seuil, probas des feuilles) et le vocabulaire TF-IDF sont écrits en .npy bruts
+et rouverts avec np.load(mmap_mode="r") : les pages viennent du page cache et
+sont partagées par tous les processus de la machine.
+
+Format (dossier MMAP_DIR à côté des .pkl) :
+- forest_left / forest_right : enfants, indices globaux (-1 = feuille)
+- forest_feature / forest_threshold : test de chaque nœud
+- forest_proba : probas de classe normalisées par nœud (comme sklearn)
+- forest_roots : nœud racine de chaque arbre
+- classes, vocab_terms (triés), vocab_columns, idf
+- manifest.json : paramètres du vectorizer et dimensions
+
+Les mêmes tableaux servent à l'inférence (FlatForest, FlatTfidfVectorizer),
+qu'ils viennent du mmap ou de pickles compilés en mémoire (compile_model) :
+résultats identiques au bit près à predict_proba / transform de sklearn.
+"""
+
+import json
+import shutil
+import uuid
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+MMAP_DIR = "mmap"
+FORMAT_VERSION = 1
+
+# Paramètres du vectorizer nécessaires à transform (sérialisables en JSON)
+_VECTORIZER_PARAMS = (
+    "analyzer",
+    "lowercase",
+    "strip_accents",
+    "token_pattern",
+    "ngram_range",
+    "stop_words",
+    "binary",
+    "norm",
+    "sublinear_tf",
+)
+
+
+def flatten(model, vectorizer) -> Tuple[Dict[str, np.ndarray], dict]:
+    """
+    Forêt + vectorizer sklearn -> tableaux plats et manifeste. Lève ValueError
+    si le modèle n'est pas exportable (tokenizer personnalisé, multi-sorties...).
+    """
+    if not hasattr(model, "estimators_") or not hasattr(vectorizer, "vocabulary_"):
+        raise ValueError("Only RandomForest + TfidfVectorizer models can be exported")
+    if vectorizer.tokenizer is not None or vectorizer.preprocessor is not None:
+        raise ValueError("Custom tokenizer/preprocessor cannot be exported")
+    if not isinstance(vectorizer.analyzer, str):
+        raise ValueError("Callable analyzer cannot be exported")
+    if getattr(model, "n_outputs_", 1) != 1:
+        raise ValueError("Multi-output forests cannot be exported")
+
+    left, right, feature, threshold, proba, roots = [], [], [], [], [], []
+    offset = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        roots.append(offset)
+        # Indices locaux -> globaux ; les feuilles (-1) restent -1
+        left.append(np.where(tree.children_left >= 0, tree.children_left + offset, -1))
+        right.append(np.where(tree.children_right >= 0, tree.children_right + offset, -1))
+        feature.append(tree.feature)
+        threshold.append(tree.threshold)
+        # Même normalisation que DecisionTreeClassifier.predict_proba
+        value = tree.value[:, 0, : len(model.classes_)].astype(np.float64)
+        normalizer = value.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        proba.append(value / normalizer)
+        offset += tree.node_count
+
+    vocabulary = vectorizer.vocabulary_
+    terms = np.array(sorted(vocabulary))
+    idf = getattr(vectorizer, "idf_", None) if vectorizer.use_idf else None
+    arrays = {
+        "forest_left": np.concatenate(left).astype(np.int32),
+        "forest_right": np.concatenate(right).astype(np.int32),
+        "forest_feature": np.concatenate(feature).astype(np.int32),
+        "forest_threshold": np.concatenate(threshold).astype(np.float64),
+        "forest_proba": np.concatenate(proba),
+        "forest_roots": np.array(roots, dtype=np.int64),
+        "classes": np.asarray(model.classes_),
+        "vocab_terms": terms,
+        "vocab_columns": np.array([vocabulary[t] for t in terms], dtype=np.int32),
+    }
+    if idf is not None:
+        arrays["idf"] = np.asarray(idf, dtype=np.float64)
+
+    params = {name: getattr(vectorizer, name) for name in _VECTORIZER_PARAMS}
+    params["ngram_range"] = list(params["ngram_range"])
+    if params["stop_words"] is not None and not isinstance(params["stop_words"], str):
+        params["stop_words"] = sorted(params["stop_words"])
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "n_trees": len(model.estimators_),
+        "n_nodes": offset,
+        "n_features": len(vocabulary),
+        "vectorizer": params,
+    }
+    return arrays, manifest
+
+
+def export_artifacts(model, vectorizer, out_dir: Path) -> Path:
+    """
+    Écrit la forêt et le vectorizer au format mmap dans out_dir.
+    Écriture dans un dossier temporaire puis renommage : un lecteur ne voit
+    jamais un export partiel.
+    """
+    arrays, manifest = flatten(model, vectorizer)
+    out_dir = Path(out_dir)
+    tmp_dir = out_dir.parent / f".{out_dir.name}-{uuid.uuid4().hex}"
+    tmp_dir.mkdir(parents=True)
+    try:
+        for name, array in arrays.items():
+            np.save(tmp_dir / f"{name}.npy", array, allow_pickle=False)
+        (tmp_dir / "manifest.json").write_text(json.dumps(manifest, indent=2))
+        if out_dir.exists():
+            shutil.rmtree(out_dir)
+        tmp_dir.rename(out_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return out_dir
+
+
+class FlatForest:
+    """
+    Forêt aléatoire en lecture seule sur tableaux plats (mmap ou en mémoire) ;
+    même interface que RandomForestClassifier pour la prédiction.
+
+    Tous les arbres sont parcourus ensemble : un pas de la boucle fait
+    descendre d'un niveau chaque couple (message, arbre) qui n'est pas encore
+    sur une feuille, soit au plus max_depth opérations numpy par appel au lieu
+    d'un appel Python (et d'une validation d'entrée) par arbre.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        # np.asarray : vues ndarray sur le mmap (l'indexation d'un np.memmap
+        # crée des sous-objets memmap, coûteux dans la boucle de parcours)
+        self.left = np.asarray(arrays["forest_left"])
+        self.right = np.asarray(arrays["forest_right"])
+        self.feature = np.asarray(arrays["forest_feature"])
+        self.threshold = np.asarray(arrays["forest_threshold"])
+        self.proba = np.asarray(arrays["forest_proba"])
+        # Petits tableaux lus à chaque appel : copiés en mémoire
+        self.roots = np.array(arrays["forest_roots"])
+        self.classes_ = np.array(arrays["classes"])
+
+    @property
+    def n_estimators(self) -> int:
+        return len(self.roots)
+
+    def apply(self, X) -> np.ndarray:
+        """Feuille atteinte dans chaque arbre, shape (n_samples, n_estimators)."""
+        # sklearn compare des float32 aux seuils : même conversion pour des
+        # décisions identiques aux frontières
+        if sp.issparse(X):
+            X = X.astype(np.float32).toarray()
+        else:
+            X = np.asarray(X, dtype=np.float32)
+        n_samples, n_trees = X.shape[0], len(self.roots)
+        nodes = np.tile(self.roots, n_samples)
+        samples = np.repeat(np.arange(n_samples), n_trees)
+        active = np.flatnonzero(self.left[nodes] >= 0)
+        while active.size:
+            current = nodes[active]
+            go_left = X[samples[active], self.feature[current]] <= self.threshold[current]
+            nodes[active] = np.where(go_left, self.left[current], self.right[current])
+            active = active[self.left[nodes[active]] >= 0]
+        return nodes.reshape(n_samples, n_trees)
+
+    def predict_proba(self, X) -> np.ndarray:
+        leaves = self.proba[self.apply(X)]
+        # Somme séquentielle arbre par arbre (cumsum), comme l'accumulation de
+        # RandomForestClassifier : résultats identiques au bit près
+        total = np.cumsum(leaves, axis=1)[:, -1]
+        total /= len(self.roots)
+        return total
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_.take(self.predict_proba(X).argmax(axis=1))
+
+
+class FlatTfidfVectorizer:
+    """
+    transform() de TfidfVectorizer à partir du vocabulaire plat (termes triés,
+    recherche dichotomique) ; l'analyzer est celui de sklearn, reconstruit
+    depuis les paramètres du manifeste.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], params: dict, n_features: int):
+        self.terms = np.asarray(arrays["vocab_terms"])
+        self.columns = np.asarray(arrays["vocab_columns"])
+        self.idf_ = np.asarray(arrays["idf"]) if "idf" in arrays else None
+        self.n_features = n_features
+        self.binary = params["binary"]
+        self.norm = params["norm"]
+        self.sublinear_tf = params["sublinear_tf"]
+        analyzer_params = {name: params[name] for name in _VECTORIZER_PARAMS}
+        analyzer_params["ngram_range"] = tuple(analyzer_params["ngram_range"])
+        self._analyze = TfidfVectorizer(**analyzer_params).build_analyzer()
+
+    def _columns(self, tokens: List[str]) -> np.ndarray:
+        if not tokens or not len(self.terms):
+            return np.empty(0, dtype=np.int32)
+        tokens = np.array(tokens)
+        positions = np.searchsorted(self.terms, tokens)
+        positions[positions >= len(self.terms)] = 0
+        known = self.terms[positions] == tokens
+        return self.columns[positions[known]]
+
+    def transform(self, raw_documents) -> sp.csr_matrix:
+        indices, values, indptr = [], [], [0]
+        for document in raw_documents:
+            columns, counts = np.unique(self._columns(self._analyze(document)), return_counts=True)
+            indices.append(columns)
+            values.append(counts)
+            indptr.append(indptr[-1] + len(columns))
+        X = sp.csr_matrix(
+            (
+                np.concatenate(values).astype(np.float64) if values else np.empty(0),
+                np.concatenate(indices).astype(np.int32) if indices else np.empty(0, np.int32),
+                np.array(indptr, dtype=np.int32),
+            ),
+            shape=(len(indptr) - 1, self.n_features),
+        )
+        # Même suite d'opérations que CountVectorizer + TfidfTransformer
+        if self.binary:
+            X.data.fill(1)
+        if self.sublinear_tf:
+            np.log(X.data, X.data)
+            X.data += 1.0
+        if self.idf_ is not None:
+            X.data *= self.idf_[X.indices]
+        if self.norm is not None:
+            X = normalize(X, norm=self.norm, copy=False)
+        return X
+
+
+def has_artifacts(path: Path) -> bool:
+    return (Path(path) / MMAP_DIR / "manifest.json").exists()
+
+
+def _build(arrays: Dict[str, np.ndarray], manifest: dict):
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported mmap artifact format {manifest.get('format_version')}")
+    forest = FlatForest(arrays)
+    vectorizer = FlatTfidfVectorizer(arrays, manifest["vectorizer"], manifest["n_features"])
+    return forest, vectorizer
+
+
+def load_artifacts(path: Path):
+    """(FlatForest, FlatTfidfVectorizer) sur les tableaux mmap de path/MMAP_DIR."""
+    mmap_dir = Path(path) / MMAP_DIR
+    manifest = json.loads((mmap_dir / "manifest.json").read_text())
+    arrays = {
+        array_path.stem: np.load(array_path, mmap_mode="r", allow_pickle=False)
+        for array_path in mmap_dir.glob("*.npy")
+    }
+    return _build(arrays, manifest)
+
+
+def compile_model(model, vectorizer):
+    """(FlatForest, FlatTfidfVectorizer) en mémoire, pour des pickles sans export mmap."""
+    return _build(*flatten(model, vectorizer))
@@ -0,0 +1,126 @@
+"""
+Cascade SMS : régression logistique d'abord, RandomForest seulement si incertain.
+
+La régression logistique (mêmes features TF-IDF) coûte un produit creux par
+message. Elle répond seule quand sa probabilité de fraude sort de la bande
+]lower, upper[ ; les messages dans la bande passent par la forêt.
+
+Bande choisie sur des prédictions hors échantillon (validation croisée sur le
+jeu d'entraînement, forêt et régression) : la plus étroite en trafic escaladé
+telle que les erreurs de la cascade ne dépassent pas celles de la forêt seule
+de plus de max_accuracy_loss.
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+from sklearn.base import clone
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import StratifiedKFold, cross_val_predict
+
+FAST_MODEL_FILE = "sms_fast_model.pkl"
+CASCADE_FOLDS = 5
+
+# Bande qui escalade tout : cascade sans effet
+NO_BAND = {"lower": -1.0, "upper": 2.0}
+
+
+def make_fast_model() -> LogisticRegression:
+    return LogisticRegression(C=10.0, max_iter=1000)
+
+
+def fraud_proba(fast_model, X) -> np.ndarray:
+    """
+    P(fraude) de la régression logistique binaire, sans la validation de
+    predict_proba : même calcul (expit de la fonction de décision).
+    """
+    scores = X @ fast_model.coef_[0] + fast_model.intercept_[0]
+    return 1.0 / (1.0 + np.exp(-np.asarray(scores).ravel()))
+
+
+def _best_prefix(p: np.ndarray, delta: np.ndarray, side: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Seuils candidats d'un côté de la bande, avec pour chacun le nombre de
+    messages répondus par la régression et le surcoût en erreurs.
+    Côté "lower" : p <= seuil (p < 0.5) ; côté "upper" : p >= seuil (p >= 0.5).
+    """
+    if side == "lower":
+        mask = p < 0.5
+        order = np.argsort(p[mask], kind="stable")
+    else:
+        mask = p >= 0.5
+        order = np.argsort(-p[mask], kind="stable")
+    values, costs = p[mask][order], np.cumsum(delta[mask][order])
+    # Ex-aequo : un seuil inclut tous les messages de même probabilité
+    last = np.r_[values[1:] != values[:-1], True] if len(values) else np.zeros(0, dtype=bool)
+    thresholds = values[last]
+    coverage = np.flatnonzero(last) + 1
+    extra_errors = costs[last]
+    # Aucun message répondu de ce côté
+    empty = NO_BAND[side]
+    return np.r_[empty, thresholds], np.r_[0, coverage], np.r_[0, extra_errors]
+
+
+def tune_band(
+    y: np.ndarray, p_fast: np.ndarray, p_forest: np.ndarray, max_accuracy_loss: float = 0.0
+) -> dict:
+    """
+    Bande minimisant le trafic escaladé sous la contrainte
+    erreurs(cascade) <= erreurs(forêt) + max_accuracy_loss * n.
+    """
+    y = np.asarray(y).astype(int)
+    fast_wrong = (p_fast >= 0.5).astype(int) != y
+    # predict() de la forêt : argmax, classe 0 en cas d'égalité
+    forest_wrong = (p_forest > 0.5).astype(int) != y
+    # Erreurs ajoutées (ou retirées) quand la régression répond à la place de la forêt
+    delta = fast_wrong.astype(int) - forest_wrong.astype(int)
+    budget = int(np.floor(max_accuracy_loss * len(y) + 1e-9))
+
+    low_t, low_n, low_cost = _best_prefix(p_fast, delta, "lower")
+    up_t, up_n, up_cost = _best_prefix(p_fast, delta, "upper")
+
+    # Pour chaque seuil bas : seuil haut de couverture maximale dans le budget
+    # restant (coûts triés, argmax cumulé des couvertures)
+    order = np.argsort(up_cost, kind="stable")
+    coverage = up_n[order]
+    is_best = coverage == np.maximum.accumulate(coverage)
+    argbest = order[np.maximum.accumulate(np.where(is_best, np.arange(len(order)), 0))]
+    k = np.searchsorted(up_cost[order], budget - low_cost, side="right") - 1
+    covered = np.where(k >= 0, low_n + up_n[argbest[np.maximum(k, 0)]], -1)
+
+    i = int(np.argmax(covered))
+    if covered[i] < 0:
+        lower, upper, n_covered = NO_BAND["lower"], NO_BAND["upper"], 0
+    else:
+        j = argbest[k[i]]
+        lower, upper, n_covered = float(low_t[i]), float(up_t[j]), int(covered[i])
+    answered = (p_fast <= lower) | (p_fast >= upper)
+    cascade_pred = np.where(answered, p_fast >= 0.5, p_forest > 0.5).astype(int)
+    return {
+        "lower": lower,
+        "upper": upper,
+        "escalation_rate": float(1 - n_covered / len(y)) if len(y) else 1.0,
+        "validation_accuracy_forest": float(np.mean(~forest_wrong)),
+        "validation_accuracy_cascade": float(np.mean(cascade_pred == y)),
+        "validation_samples": int(len(y)),
+        "max_accuracy_loss": max_accuracy_loss,
+    }
+
+
+def fit_cascade(
+    forest, X, y, max_accuracy_loss: float = 0.0, folds: int = CASCADE_FOLDS
+) -> Tuple[Optional[LogisticRegression], dict]:
+    """
+    Régression logistique entraînée sur X + bande réglée par validation
+    croisée (la forêt est réentraînée `folds` fois sur les sous-ensembles).
+    """
+    y = np.asarray(y).astype(int)
+    n_splits = min(folds, int(np.bincount(y, minlength=2).min()))
+    if n_splits < 2:
+        return None, dict(NO_BAND)
+    cv = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=42)
+    p_fast = cross_val_predict(make_fast_model(), X, y, cv=cv, method="predict_proba")[:, 1]
+    p_forest = cross_val_predict(clone(forest), X, y, cv=cv, method="predict_proba")[:, 1]
+    band = tune_band(y, p_fast, p_forest, max_accuracy_loss)
+    fast_model = make_fast_model().fit(X, y)
+    return fast_model, band
@@ -0,0 +1,238 @@
+"""
+Jeu d'entraînement SMS en segments Parquet ajout seul.
+
+Chaque ajout (message API, upload CSV, import initial de sms_train.csv) écrit
+un nouveau segment : fichier temporaire puis renommage atomique, nom unique
+par écrivain. Aucun fichier existant n'est réécrit, donc des écrivains
+concurrents (workers API, Celery) ne s'attendent pas entre eux et le coût
+d'un ajout ne dépend que des lignes ajoutées. Seuls l'horodatage du nom et le
+renommage se font sous verrou partagé, pour qu'une compaction ne s'intercale
+pas entre les deux.
+
+Déduplication par content_hash (sha256 du texte) : à la lecture, le segment
+le plus récent l'emporte (une correction de label remplace l'ancienne). La
+compaction fusionne les segments en un seul, dédupliqué ; les lecteurs
+tiennent un verrou partagé (flock) pendant l'itération, la compaction un
+verrou exclusif non bloquant : elle est reportée si une lecture est en cours.
+Le segment compacté est horodaté sous ce verrou : après tous ceux qu'il
+fusionne, avant tous ceux publiés ensuite.
+"""
+
+import fcntl
+import hashlib
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+DATA_DIR = Path(__file__).parent.parent.parent / "data" / "datasets"
+STORE_DIR_NAME = "store"
+SEGMENT_PREFIX = "seg-"
+# Un contenu sur HOLDOUT_BUCKETS (choisi par hash, donc stable entre les runs)
+# n'est jamais appris : évaluation commune à toutes les versions de modèles
+HOLDOUT_BUCKETS = 5
+
+SCHEMA = pa.schema(
+    [
+        ("content_hash", pa.string()),
+        ("content", pa.string()),
+        ("is_fraud", pa.int8()),
+        ("fraud_type", pa.string()),
+        ("added_at", pa.timestamp("ms")),
+    ]
+)
+
+Row = Tuple[str, int, Optional[str]]
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def is_holdout(content: str) -> bool:
+    return hashlib.sha256(content.encode("utf-8")).digest()[0] % HOLDOUT_BUCKETS == 0
+
+
+def _table(rows: dict) -> pa.Table:
+    """{content_hash: (content, is_fraud, fraud_type)} -> table au schéma du store."""
+    values = list(rows.values())
+    return pa.table(
+        {
+            "content_hash": list(rows),
+            "content": [r[0] for r in values],
+            "is_fraud": [r[1] for r in values],
+            "fraud_type": [r[2] for r in values],
+            "added_at": [datetime.utcnow()] * len(values),
+        },
+        schema=SCHEMA,
+    )
+
+
+class TrainingDataStore:
+    def __init__(self, data_dir: Path):
+        self.legacy_csv = data_dir / "sms_train.csv"
+        self.path = data_dir / STORE_DIR_NAME
+        self._lock_path = self.path / ".lock"
+
+    # === VERROUS ===
+
+    @contextmanager
+    def _locked(self, mode: int):
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, mode)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # === ÉCRITURE ===
+
+    def segments(self) -> List[Path]:
+        """Segments du plus ancien au plus récent (le nom commence par l'horodatage)."""
+        if not self.path.exists():
+            return []
+        return sorted(self.path.glob(f"{SEGMENT_PREFIX}*.parquet"))
+
+    def _write_segment(self, table: pa.Table, timestamp_ns: Optional[int] = None) -> Path:
+        """
+        Écrit un segment. timestamp_ns imposé : l'appelant tient déjà le verrou
+        exclusif ; sinon horodatage au moment du renommage, sous verrou partagé.
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        tmp = self.path / f".{uuid.uuid4().hex}.tmp"
+        pq.write_table(table, tmp, compression="zstd")
+        if timestamp_ns is not None:
+            return self._publish(tmp, timestamp_ns)
+        with self._locked(fcntl.LOCK_SH):
+            return self._publish(tmp, time.time_ns())
+
+    def _publish(self, tmp: Path, timestamp_ns: int) -> Path:
+        target = self.path / f"{SEGMENT_PREFIX}{timestamp_ns:020d}-{uuid.uuid4().hex[:8]}.parquet"
+        os.replace(tmp, target)
+        return target
+
+    @staticmethod
+    def _timestamp(segment: Path) -> int:
+        return int(segment.name[len(SEGMENT_PREFIX):].split("-", 1)[0])
+
+    def append(self, rows: Iterable[Row]) -> int:
+        """
+        Ajoute (content, is_fraud, fraud_type) dans un nouveau segment.
+        Doublons internes au lot retirés (dernier gagnant) ; retourne le nombre
+        de lignes écrites.
+        """
+        self.ensure_initialized()
+        latest = {}
+        for content, is_fraud, fraud_type in rows:
+            if content is None or str(content) == "":
+                continue
+            content = str(content)
+            latest[content_hash(content)] = (content, int(is_fraud), fraud_type)
+        if not latest:
+            return 0
+        self._write_segment(_table(latest))
+        return len(latest)
+
+    def ensure_initialized(self):
+        """Importe sms_train.csv comme premier segment si le store est vide."""
+        if self.segments() or not self.legacy_csv.exists():
+            return
+        with self._locked(fcntl.LOCK_EX):
+            if self.segments():
+                return
+            df = pd.read_csv(self.legacy_csv).dropna(subset=["content", "is_fraud"])
+            if "fraud_type" not in df.columns:
+                df["fraud_type"] = None
+            rows = {}
+            for content, is_fraud, fraud_type in zip(
+                df["content"].astype(str), df["is_fraud"].astype(int), df["fraud_type"]
+            ):
+                rows[content_hash(content)] = (content, is_fraud, None if pd.isna(fraud_type) else str(fraud_type))
+            # Horodatage 1 : toujours plus ancien que les ajouts ultérieurs
+            self._write_segment(_table(rows), timestamp_ns=1)
+
+    # === LECTURE ===
+
+    def available(self) -> bool:
+        return bool(self.segments()) or self.legacy_csv.exists()
+
+    def iter_batches(self, batch_size: int = 10000) -> Iterator[pd.DataFrame]:
+        """
+        Lignes dédupliquées (version la plus récente de chaque contenu), par
+        paquets, sans charger tout le jeu de données en mémoire.
+        """
+        self.ensure_initialized()
+        seen = set()
+        with self._locked(fcntl.LOCK_SH):
+            for segment in reversed(self.segments()):
+                parquet = pq.ParquetFile(segment)
+                for batch in parquet.iter_batches(
+                    batch_size=batch_size, columns=["content_hash", "content", "is_fraud", "fraud_type"]
+                ):
+                    df = batch.to_pandas()
+                    fresh = ~df["content_hash"].isin(seen) & ~df["content_hash"].duplicated()
+                    df = df[fresh]
+                    seen.update(df["content_hash"])
+                    if len(df):
+                        yield df.reset_index(drop=True)
+
+    def read_all(self) -> pd.DataFrame:
+        batches = list(self.iter_batches())
+        if not batches:
+            return pd.DataFrame(columns=["content_hash", "content", "is_fraud", "fraud_type"])
+        return pd.concat(batches, ignore_index=True)
+
+    # === COMPACTION ===
+
+    def compact(self, min_segments: int = 2) -> Optional[dict]:
+        """
+        Fusionne les segments existants en un seul segment dédupliqué. Les
+        segments écrits pendant la compaction sont publiés après elle, tels quels.
+        None si rien à faire ou si une lecture/compaction est en cours.
+        """
+        if len(self.segments()) < min_segments:
+            return None
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self._lock_path, "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+            try:
+                # Listés sous le verrou : aucun écrivain n'est entre horodatage et renommage
+                snapshot = self.segments()
+                if len(snapshot) < min_segments:
+                    return None
+                merged = pa.concat_tables(pq.read_table(s, schema=SCHEMA) for s in snapshot)
+                rows_before = merged.num_rows
+                df = merged.to_pandas().drop_duplicates("content_hash", keep="last")
+                table = pa.Table.from_pandas(df, schema=SCHEMA, preserve_index=False)
+                # Horodatage pris maintenant : après tous les segments fusionnés,
+                # avant ceux que les écrivains publieront une fois le verrou rendu
+                timestamp_ns = max(time.time_ns(), self._timestamp(snapshot[-1]) + 1)
+                self._write_segment(table, timestamp_ns=timestamp_ns)
+                for segment in snapshot:
+                    segment.unlink(missing_ok=True)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return {"segments": len(snapshot), "rows_before": rows_before, "rows_after": table.num_rows}
+
+    def stats(self) -> dict:
+        segments = self.segments()
+        return {
+            "segments": len(segments),
+            "rows": sum(pq.ParquetFile(s).metadata.num_rows for s in segments),
+            "bytes": sum(s.stat().st_size for s in segments),
+        }
+
+
+training_store = TrainingDataStore(DATA_DIR)
@@ -0,0 +1,371 @@
+"""
+Cache des comptages de termes du jeu d'entraînement.
+
+Chaque document est tokenisé une seule fois (analyseur du TfidfVectorizer :
+minuscules, token_pattern, n-grammes) ; ses comptages sont conservés en CSR
+dans des fichiers .npz, indexés par content_hash. Un entraînement ne tokenise
+que les contenus absents du cache (nouvelles lignes du store) puis reconstruit
+le TF-IDF à partir des comptages : vocabulaire, min_df / max_df /
+max_features, idf et normalisation peuvent varier entre deux runs sans
+relire le texte.
+
+Les termes n'ont pas d'identifiant global stable d'un vocabulaire à l'autre :
+le cache attribue ses propres identifiants (ordre d'apparition), chaque
+partie .npz porte les termes qu'elle introduit. Un répertoire par empreinte
+des réglages de tokenisation (et de la version de scikit-learn) : changer
+ngram_range, lowercase, token_pattern... repart d'un cache vide.
+
+La reconstruction réutilise les étapes privées de CountVectorizer
+(_sort_features, _limit_features) de la version épinglée de scikit-learn :
+le vectorizer obtenu est identique à celui de fit_transform sur le texte.
+"""
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from numbers import Integral
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import scipy.sparse as sp
+import sklearn
+from sklearn.feature_extraction.text import TfidfTransformer, TfidfVectorizer
+
+from app.ml.dataset_store import DATA_DIR, content_hash
+
+logger = logging.getLogger(__name__)
+
+FEATURES_DIR = DATA_DIR / "features"
+PART_PREFIX = "part-"
+FORMAT_VERSION = 1
+
+# Réglages qui changent la sortie de l'analyseur ; les autres (min_df,
+# max_features, norm, idf...) s'appliquent après comptage
+ANALYZER_PARAMS = (
+    "input",
+    "encoding",
+    "decode_error",
+    "strip_accents",
+    "lowercase",
+    "preprocessor",
+    "tokenizer",
+    "stop_words",
+    "token_pattern",
+    "ngram_range",
+    "analyzer",
+)
+
+
+def fingerprint(vectorizer: TfidfVectorizer) -> str:
+    """Empreinte des réglages de tokenisation. ValueError si non sérialisable."""
+    params = vectorizer.get_params()
+    if vectorizer.vocabulary is not None:
+        raise ValueError("fixed vocabulary is not supported by the feature cache")
+    key = {}
+    for name in ANALYZER_PARAMS:
+        value = params[name]
+        if callable(value):
+            raise ValueError(f"callable {name} cannot be fingerprinted")
+        if name == "stop_words" and value is not None and not isinstance(value, str):
+            value = sorted(value)
+        key[name] = value
+    key["sklearn"] = sklearn.__version__
+    key["format"] = FORMAT_VERSION
+    payload = json.dumps(key, sort_keys=True, default=list)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _pack_terms(terms: Sequence[str]) -> dict:
+    # UTF-8 concaténé + bornes : un tableau "<U" réserve la longueur du plus long n-gramme par terme
+    encoded = [term.encode("utf-8") for term in terms]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return {"term_bytes": np.frombuffer(b"".join(encoded), dtype=np.uint8), "term_offsets": offsets}
+
+
+def _unpack_terms(term_bytes: np.ndarray, offsets: np.ndarray) -> List[str]:
+    raw = term_bytes.tobytes()
+    return [raw[start:end].decode("utf-8") for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+
+class FeatureCache:
+    def __init__(self, vectorizer: TfidfVectorizer, root: Path = FEATURES_DIR):
+        self.fingerprint = fingerprint(vectorizer)
+        self.root = root
+        self.path = root / self.fingerprint
+        self._lock_path = self.path / ".lock"
+        self._analyze = vectorizer.build_analyzer()
+        self._reset()
+
+    def _reset(self):
+        self._parts: List[str] = []
+        self._terms: List[str] = []
+        self._term_index: Dict[str, int] = {}
+        self._rows: Dict[str, int] = {}
+        self._blocks: List[sp.csr_matrix] = []
+        self._matrix: Optional[sp.csr_matrix] = None
+
+    # === VERROUS ===
+
+    @contextmanager
+    def _locked(self, mode: int):
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, mode)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # === PARTIES ===
+
+    def parts(self) -> List[Path]:
+        if not self.path.exists():
+            return []
+        return sorted(self.path.glob(f"{PART_PREFIX}*.npz"))
+
+    def _load_part(self, part: Path):
+        with np.load(part) as data:
+            offset = int(data["term_offset"])
+            if offset != len(self._terms):
+                raise ValueError(f"feature cache part {part.name} is out of sequence")
+            new_terms = _unpack_terms(data["term_bytes"], data["term_offsets"])
+            hashes = data["hashes"].astype(str).tolist()
+            block = sp.csr_matrix(
+                (data["data"], data["indices"], data["indptr"]),
+                shape=(len(hashes), int(data["n_terms"])),
+            )
+        for term in new_terms:
+            self._term_index[term] = len(self._terms)
+            self._terms.append(term)
+        base = sum(b.shape[0] for b in self._blocks)
+        for i, h in enumerate(hashes):
+            self._rows[h] = base + i
+        self._blocks.append(block)
+        self._parts.append(part.name)
+        self._matrix = None
+
+    def _refresh(self):
+        """Charge les parties écrites depuis le dernier appel (autres processus)."""
+        names = [part.name for part in self.parts()]
+        if not set(self._parts) <= set(names):
+            # Compaction intervenue entre-temps : les identifiants de lignes ont changé
+            self._reset()
+        for name in names:
+            if name not in self._parts:
+                self._load_part(self.path / name)
+
+    def _write_part(
+        self,
+        hashes: Sequence[str],
+        matrix: sp.csr_matrix,
+        new_terms: Sequence[str],
+        term_offset: int,
+        timestamp_ns: Optional[int] = None,
+    ) -> Path:
+        name = f"{PART_PREFIX}{timestamp_ns or time.time_ns():020d}-{uuid.uuid4().hex[:8]}.npz"
+        target = self.path / name
+        tmp = self.path / f".{name}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                hashes=np.asarray(hashes, dtype="S64"),
+                indptr=matrix.indptr,
+                indices=matrix.indices,
+                data=matrix.data,
+                n_terms=np.int64(matrix.shape[1]),
+                term_offset=np.int64(term_offset),
+                **_pack_terms(new_terms),
+            )
+        os.replace(tmp, target)
+        return target
+
+    def _add(self, documents: Dict[str, str]) -> int:
+        """Tokenise les documents absents (appelé sous verrou exclusif)."""
+        self._refresh()
+        missing = [(h, doc) for h, doc in documents.items() if h not in self._rows]
+        if not missing:
+            return 0
+        offset = len(self._terms)
+        # Nouveaux termes : enregistrés dans l'index par _load_part, une fois la partie écrite
+        new_index: Dict[str, int] = {}
+        indptr, indices, values = [0], [], []
+        for _, doc in missing:
+            counts: Dict[int, int] = {}
+            for term in self._analyze(doc):
+                term_id = self._term_index.get(term)
+                if term_id is None:
+                    term_id = new_index.setdefault(term, offset + len(new_index))
+                counts[term_id] = counts.get(term_id, 0) + 1
+            indices.extend(counts)
+            values.extend(counts.values())
+            indptr.append(len(indices))
+        new_terms = list(new_index)
+        matrix = sp.csr_matrix(
+            (
+                np.asarray(values, dtype=np.int32),
+                np.asarray(indices, dtype=np.int32),
+                np.asarray(indptr, dtype=np.int64),
+            ),
+            shape=(len(missing), offset + len(new_terms)),
+        )
+        # Pas de sort_indices : chaque ligne garde l'ordre de première occurrence
+        # des termes dans le SMS, celui que CountVectorizer utilise
+        part = self._write_part([h for h, _ in missing], matrix, new_terms, offset)
+        self._load_part(part)
+        return len(missing)
+
+    # === COMPTAGES ===
+
+    def counts(self, contents: Sequence[str]) -> sp.csr_matrix:
+        """
+        Comptages (documents x termes du cache) des contenus, dans l'ordre
+        donné ; seuls les contenus absents du cache sont tokenisés.
+        """
+        hashes = [content_hash(str(content)) for content in contents]
+        with self._locked(fcntl.LOCK_SH):
+            self._refresh()
+        if any(h not in self._rows for h in hashes):
+            with self._locked(fcntl.LOCK_EX):
+                added = self._add(dict(zip(hashes, map(str, contents))))
+            logger.info("Feature cache %s: %d documents tokenized", self.fingerprint, added)
+        if self._matrix is None:
+            n_terms = len(self._terms)
+            self._matrix = sp.vstack(
+                [sp.csr_matrix((b.data, b.indices, b.indptr), shape=(b.shape[0], n_terms)) for b in self._blocks],
+                format="csr",
+            )
+        return self._matrix[np.fromiter((self._rows[h] for h in hashes), dtype=np.int64, count=len(hashes))]
+
+    def fit_transform(self, vectorizer: TfidfVectorizer, contents: Sequence[str]) -> sp.csr_matrix:
+        """Équivalent de vectorizer.fit_transform(contents), depuis les comptages."""
+        if fingerprint(vectorizer) != self.fingerprint:
+            raise ValueError("vectorizer tokenization does not match this feature cache")
+        counts = self.counts(contents)
+
+        # Colonnes numérotées par ordre d'apparition dans ces documents, comme
+        # _count_vocab : _sort_features ne retrie pas les lignes, l'ordre des
+        # valeurs (donc les sommes de normalisation) en dépend
+        used, first = np.unique(counts.indices, return_index=True)
+        appearance = used[np.argsort(first)]
+
+        vectorizer._validate_params()
+        vectorizer._check_params()
+        vectorizer._validate_ngram_range()
+        vectorizer._validate_vocabulary()
+        n_doc = counts.shape[0]
+        max_df, min_df, max_features = vectorizer.max_df, vectorizer.min_df, vectorizer.max_features
+        max_doc_count = max_df if isinstance(max_df, Integral) else max_df * n_doc
+        min_doc_count = min_df if isinstance(min_df, Integral) else min_df * n_doc
+        if max_doc_count < min_doc_count:
+            raise ValueError("max_df corresponds to < documents than min_df")
+        # Filtre min_df / max_df appliqué avant de construire le vocabulaire :
+        # _limit_features refait le même filtre (sans effet) et trie les
+        # survivants dans le même ordre
+        dfs = np.bincount(counts.indices, minlength=counts.shape[1])[appearance]
+        appearance = appearance[(dfs >= min_doc_count) & (dfs <= max_doc_count)]
+        keep = np.zeros(counts.shape[1], dtype=bool)
+        keep[appearance] = True
+        counts = counts.copy()
+        counts.data[~keep[counts.indices]] = 0
+        counts.eliminate_zeros()
+        remap = np.empty(counts.shape[1], dtype=counts.indices.dtype)
+        remap[appearance] = np.arange(len(appearance))
+        X = sp.csr_matrix(
+            (counts.data.astype(vectorizer.dtype), remap[counts.indices], counts.indptr.copy()),
+            shape=(counts.shape[0], len(appearance)),
+        )
+        X.sort_indices()
+        vocabulary = {self._terms[term_id]: i for i, term_id in enumerate(appearance)}
+        if vectorizer.binary:
+            X.data.fill(1)
+        if max_features is not None:
+            X = vectorizer._sort_features(X, vocabulary)
+        X = vectorizer._limit_features(X, vocabulary, max_doc_count, min_doc_count, max_features)
+        if max_features is None:
+            X = vectorizer._sort_features(X, vocabulary)
+        vectorizer.vocabulary_ = vocabulary
+
+        vectorizer._tfidf = TfidfTransformer(
+            norm=vectorizer.norm,
+            use_idf=vectorizer.use_idf,
+            smooth_idf=vectorizer.smooth_idf,
+            sublinear_tf=vectorizer.sublinear_tf,
+        )
+        vectorizer._tfidf.fit(X)
+        return vectorizer._tfidf.transform(X, copy=False)
+
+    def transform(self, vectorizer: TfidfVectorizer, contents: Sequence[str]) -> sp.csr_matrix:
+        """Équivalent de vectorizer.transform(contents) pour un vectorizer ajusté."""
+        if fingerprint(vectorizer) != self.fingerprint:
+            raise ValueError("vectorizer tokenization does not match this feature cache")
+        counts = self.counts(contents)
+        # Terme du vocabulaire absent du cache : aucun document en cache ne le contient
+        pairs = [(self._term_index[t], j) for t, j in vectorizer.vocabulary_.items() if t in self._term_index]
+        rows = np.fromiter((p[0] for p in pairs), dtype=np.int64, count=len(pairs))
+        cols = np.fromiter((p[1] for p in pairs), dtype=np.int64, count=len(pairs))
+        projection = sp.csr_matrix(
+            (np.ones(len(pairs), dtype=vectorizer.dtype), (rows, cols)),
+            shape=(counts.shape[1], len(vectorizer.vocabulary_)),
+        )
+        X = (counts.astype(vectorizer.dtype) @ projection).tocsr()
+        X.sort_indices()
+        if vectorizer.binary:
+            X.data.fill(1)
+        return vectorizer._tfidf.transform(X, copy=False)
+
+    # === MAINTENANCE ===
+
+    def compact(self, min_parts: int = 2) -> Optional[dict]:
+        """Fusionne les parties en une seule. None si rien à faire ou cache occupé."""
+        if len(self.parts()) < min_parts:
+            return None
+        with open(self._lock_path, "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+            try:
+                self._reset()
+                self._refresh()
+                snapshot = [self.path / name for name in self._parts]
+                n_terms = len(self._terms)
+                matrix = sp.vstack(
+                    [sp.csr_matrix((b.data, b.indices, b.indptr), shape=(b.shape[0], n_terms)) for b in self._blocks],
+                    format="csr",
+                )
+                hashes = sorted(self._rows, key=self._rows.get)
+                last_ts = int(snapshot[-1].name[len(PART_PREFIX):].split("-", 1)[0])
+                compacted = self._write_part(hashes, matrix, self._terms, 0, timestamp_ns=last_ts)
+                for part in snapshot:
+                    part.unlink(missing_ok=True)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        self._reset()
+        return {"parts": len(snapshot), "documents": len(hashes), "terms": n_terms, "file": compacted.name}
+
+    def drop_stale(self) -> List[str]:
+        """Supprime les caches d'autres réglages de tokenisation."""
+        removed = []
+        if not self.root.exists():
+            return removed
+        for directory in self.root.iterdir():
+            if directory.is_dir() and directory.name != self.fingerprint:
+                shutil.rmtree(directory, ignore_errors=True)
+                removed.append(directory.name)
+        return removed
+
+    def stats(self) -> dict:
+        parts = self.parts()
+        return {
+            "fingerprint": self.fingerprint,
+            "parts": len(parts),
+            "bytes": sum(p.stat().st_size for p in parts),
+        }
@@ -0,0 +1,174 @@
+"""
+Entraînement incrémental du classifieur SMS.
+
+HashingVectorizer (sans vocabulaire, donc sans état à réapprendre) +
+SGDClassifier (régression logistique, partial_fit) : une mise à jour ne
+parcourt que les nouveaux exemples. La consolidation reconstruit le modèle
+depuis zéro sur tout le jeu de données, par mini-lots.
+
+Les messages du holdout (dataset_store.is_holdout) ne sont jamais appris et
+servent à l'évaluation de chaque version.
+"""
+
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import joblib
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score
+
+from app.ml.dataset_store import is_holdout, training_store
+from app.ml.train import MODEL_DIR
+
+STATE_DIR = MODEL_DIR / "incremental"
+# Holdout figé à la consolidation et borné : l'évaluation d'une mise à jour
+# incrémentale ne relit pas tout le jeu de données
+HOLDOUT_MAX = 5000
+CLASSES = np.array([0, 1])
+
+Sample = Tuple[str, int]
+
+
+def make_vectorizer() -> HashingVectorizer:
+    # Mêmes n-grammes que le TF-IDF de train.py ; alternate_sign=False garde
+    # des valeurs positives (comptages normalisés)
+    return HashingVectorizer(
+        n_features=2**18,
+        ngram_range=(1, 2),
+        alternate_sign=False,
+        norm="l2",
+    )
+
+
+def make_classifier() -> SGDClassifier:
+    # log_loss : predict_proba disponible pour MLService
+    return SGDClassifier(loss="log_loss", alpha=1e-5, random_state=42)
+
+
+def iter_dataset(chunk_size: int = 1000) -> Iterator[List[Sample]]:
+    """Jeu d'entraînement (store Parquet) par paquets, sans le charger en entier."""
+    for chunk in training_store.iter_batches(chunk_size):
+        yield list(zip(chunk["content"].astype(str), chunk["is_fraud"].astype(int)))
+
+
+def _split(samples: Iterable[Sample]) -> Tuple[List[Sample], List[Sample]]:
+    train, holdout = [], []
+    for sample in samples:
+        (holdout if is_holdout(sample[0]) else train).append(sample)
+    return train, holdout
+
+
+def _fit(model: SGDClassifier, vectorizer: HashingVectorizer, samples: List[Sample], batch_size: int) -> int:
+    for start in range(0, len(samples), batch_size):
+        batch = samples[start : start + batch_size]
+        X = vectorizer.transform([content for content, _ in batch])
+        model.partial_fit(X, [label for _, label in batch], classes=CLASSES)
+    return len(samples)
+
+
+def evaluate(model, vectorizer, holdout: Optional[List[Sample]] = None) -> dict:
+    """Métriques sur le holdout (par défaut : celui du jeu d'entraînement)."""
+    if holdout is None:
+        holdout = [s for chunk in iter_dataset() for s in chunk if is_holdout(s[0])]
+    if not holdout:
+        return {}
+    y_true = [label for _, label in holdout]
+    y_pred = model.predict(vectorizer.transform([content for content, _ in holdout]))
+    return {
+        "accuracy": float(accuracy_score(y_true, y_pred)),
+        "precision": float(precision_score(y_true, y_pred, zero_division=0)),
+        "recall": float(recall_score(y_true, y_pred, zero_division=0)),
+        "f1_score": float(f1_score(y_true, y_pred, zero_division=0)),
+        "n_samples_test": len(holdout),
+    }
+
+
+def _dump(obj, path: Path):
+    # Écriture puis renommage : un lecteur ne voit jamais un fichier partiel
+    tmp = path.with_name(f".{path.name}.tmp")
+    joblib.dump(obj, tmp)
+    os.replace(tmp, path)
+
+
+def save_state(model, vectorizer, metadata: dict, out_dir: Path = STATE_DIR) -> Path:
+    """Artefacts au format attendu par MLService / le registre."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    _dump(model, out_dir / "sms_model.pkl")
+    _dump(vectorizer, out_dir / "vectorizer.pkl")
+    _dump(metadata, out_dir / "sms_metadata.pkl")
+    return out_dir
+
+
+def load_state(state_dir: Path = STATE_DIR) -> Tuple[Optional[SGDClassifier], dict]:
+    if not (state_dir / "sms_model.pkl").exists():
+        return None, {}
+    metadata_path = state_dir / "sms_metadata.pkl"
+    metadata = joblib.load(metadata_path) if metadata_path.exists() else {}
+    return joblib.load(state_dir / "sms_model.pkl"), metadata
+
+
+def _metadata(n_seen: int, n_new: int, metrics: dict, mode: str) -> dict:
+    return {
+        **metrics,
+        "accuracy": metrics.get("accuracy", 0.0),
+        "n_samples_train": n_seen,
+        "n_samples_new": n_new,
+        "model_type": "SGDClassifier",
+        "training_mode": mode,
+        "updated_at": datetime.utcnow().isoformat(),
+        "version": "incremental",
+    }
+
+
+def consolidate(extra: Iterable[Sample] = (), batch_size: int = 256, epochs: int = 5) -> dict:
+    """
+    Reconstruction complète : jeu d'entraînement + exemples additionnels (signalements
+    vérifiés), plusieurs passes mélangées. Remplace l'état incrémental.
+    """
+    train, holdout = [], []
+    for chunk in iter_dataset():
+        chunk_train, chunk_holdout = _split(chunk)
+        train += chunk_train
+        holdout += chunk_holdout
+    extra_train, extra_holdout = _split(extra)
+    train += extra_train
+    holdout += extra_holdout
+
+    vectorizer = make_vectorizer()
+    model = make_classifier()
+    rng = np.random.default_rng(42)
+    for _ in range(epochs):
+        order = rng.permutation(len(train))
+        _fit(model, vectorizer, [train[i] for i in order], batch_size)
+
+    holdout = holdout[:HOLDOUT_MAX]
+    metadata = _metadata(len(train), len(train), evaluate(model, vectorizer, holdout), "consolidation")
+    save_state(model, vectorizer, metadata)
+    _dump(holdout, STATE_DIR / "holdout.pkl")
+    return metadata
+
+
+def partial_update(samples: Iterable[Sample], batch_size: int = 256) -> Optional[dict]:
+    """
+    Apprend uniquement les nouveaux exemples sur le modèle courant (consolidé
+    d'abord s'il n'existe pas encore). None si aucun exemple n'est apprenable.
+    """
+    train, _ = _split(samples)
+    if not train:
+        return None
+    model, previous = load_state()
+    if model is None:
+        return consolidate(train, batch_size=batch_size)
+
+    vectorizer = make_vectorizer()
+    _fit(model, vectorizer, train, batch_size)
+    n_seen = previous.get("n_samples_train", 0) + len(train)
+    holdout_path = STATE_DIR / "holdout.pkl"
+    holdout = joblib.load(holdout_path) if holdout_path.exists() else None
+    metadata = _metadata(n_seen, len(train), evaluate(model, vectorizer, holdout), "incremental")
+    save_state(model, vectorizer, metadata)
+    return metadata
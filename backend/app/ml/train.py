@@ -5,49 +5,88 @@ Entraîne RandomForest pour classification SMS frauduleux
 
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics import classification_report, confusion_matrix, accuracy_score
+from sklearn.metrics import (
+    classification_report,
+    confusion_matrix,
+    accuracy_score,
+    precision_score,
+    recall_score,
+    f1_score,
+)
 import joblib
+import logging
 import os
 from pathlib import Path
 
+from app.ml.artifacts import MMAP_DIR, export_artifacts
+from app.ml.cascade import FAST_MODEL_FILE, fit_cascade, fraud_proba
+from app.ml.dataset_store import is_holdout, training_store
+from app.ml.feature_cache import FeatureCache
+
+logger = logging.getLogger(__name__)
+
 # Chemins
 BASE_DIR = Path(__file__).parent.parent.parent
 DATA_DIR = BASE_DIR / "data" / "datasets"
 MODEL_DIR = BASE_DIR / "models" / "ml_models"
 
+# Parties du cache de features fusionnées au-delà de ce nombre
+FEATURE_CACHE_COMPACT_PARTS = 20
+
 # Créer dossiers si nécessaire
 MODEL_DIR.mkdir(parents=True, exist_ok=True)
 
 
+def vectorize(vectorizer, X_train, X_test):
+    """
+    TF-IDF train/test depuis le cache de comptages (seuls les SMS jamais vus
+    sont tokenisés). Repli sur fit_transform si le cache est inutilisable,
+    y compris si une mise à jour de sklearn casse les internes qu'il utilise.
+    """
+    try:
+        cache = FeatureCache(vectorizer)
+        X_train_tfidf = cache.fit_transform(vectorizer, list(X_train))
+        X_test_tfidf = cache.transform(vectorizer, list(X_test))
+    except Exception as e:
+        logger.warning("Feature cache unavailable, falling back to full tokenization", exc_info=True)
+        print(f"   ⚠️ Cache de features indisponible ({e}), tokenisation complète")
+        return vectorizer.fit_transform(X_train), vectorizer.transform(X_test)
+
+    print(f"   ✓ Cache de features {cache.fingerprint}: {len(cache.parts())} parties")
+    # Caches d'anciens réglages de tokenisation : plus jamais relus
+    cache.drop_stale()
+    cache.compact(FEATURE_CACHE_COMPACT_PARTS)
+    return X_train_tfidf, X_test_tfidf
+
+
 def train_sms_classifier():
     """Entraîne le classifieur SMS"""
     print("=" * 60)
     print("🤖 ENTRAÎNEMENT MODÈLE SMS DYLETH")
     print("=" * 60)
 
-    # 1. Charger données
+    # 1. Charger données (store Parquet, lu par paquets et dédupliqué)
     print("\n📊 Chargement données...")
-    df = pd.read_csv(DATA_DIR / "sms_train.csv")
-    print(f"   ✓ {len(df)} SMS chargés")
-    print(
-        f"   ✓ Frauduleux: {df['is_fraud'].sum()} ({df['is_fraud'].sum() / len(df) * 100:.1f}%)"
-    )
-    print(
-        f"   ✓ Légitimes: {(~df['is_fraud'].astype(bool)).sum()} ({(~df['is_fraud'].astype(bool)).sum() / len(df) * 100:.1f}%)"
-    )
+    contents, labels = [], []
+    for batch in training_store.iter_batches():
+        contents.extend(batch["content"])
+        labels.extend(batch["is_fraud"].astype(int))
+    X = pd.Series(contents, name="content")
+    y = pd.Series(labels, name="is_fraud")
+    print(f"   ✓ {len(X)} SMS chargés")
+    print(f"   ✓ Frauduleux: {y.sum()} ({y.sum() / len(y) * 100:.1f}%)")
+    print(f"   ✓ Légitimes: {(y == 0).sum()} ({(y == 0).sum() / len(y) * 100:.1f}%)")
 
     # 2. Préparation données
     print("\n🔧 Préparation features...")
-    X = df["content"]
-    y = df["is_fraud"]
 
-    # Split train/test
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42, stratify=y
-    )
+    # Split train/test sur le holdout partagé : jamais appris par aucune
+    # version, les métriques restent comparables d'un modèle à l'autre
+    holdout = X.map(is_holdout)
+    X_train, X_test = X[~holdout], X[holdout]
+    y_train, y_test = y[~holdout], y[holdout]
     print(f"   ✓ Train: {len(X_train)} SMS")
     print(f"   ✓ Test: {len(X_test)} SMS")
 
@@ -60,8 +99,7 @@ def train_sms_classifier():
         stop_words=None,  # On garde tout pour le français
     )
 
-    X_train_tfidf = vectorizer.fit_transform(X_train)
-    X_test_tfidf = vectorizer.transform(X_test)
+    X_train_tfidf, X_test_tfidf = vectorize(vectorizer, X_train, X_test)
     print(f"   ✓ {X_train_tfidf.shape[1]} features extraites")
 
     # 4. Entraînement Random Forest
@@ -79,6 +117,14 @@ def train_sms_classifier():
     model.fit(X_train_tfidf, y_train)
     print("   ✓ Modèle entraîné")
 
+    # Cascade : régression logistique pour les cas sûrs, forêt dans la bande incertaine
+    print("\n⚡ Cascade régression logistique...")
+    fast_model, cascade = fit_cascade(model, X_train_tfidf, y_train)
+    print(
+        f"   ✓ Bande ]{cascade['lower']:.3f}, {cascade['upper']:.3f}[ - "
+        f"escalade validation: {cascade.get('escalation_rate', 1.0) * 100:.1f}%"
+    )
+
     # 5. Évaluation
     print("\n📈 Évaluation modèle...")
     y_pred = model.predict(X_test_tfidf)
@@ -86,6 +132,16 @@ def train_sms_classifier():
 
     accuracy = accuracy_score(y_test, y_pred)
     print(f"   ✓ Accuracy: {accuracy * 100:.2f}%")
+    if fast_model is not None:
+        p_fast = fraud_proba(fast_model, X_test_tfidf)
+        answered = (p_fast <= cascade["lower"]) | (p_fast >= cascade["upper"])
+        y_cascade = np.where(answered, p_fast >= 0.5, y_pred == 1).astype(int)
+        cascade["test_accuracy"] = float(accuracy_score(y_test, y_cascade))
+        cascade["test_escalation_rate"] = float(1 - answered.mean()) if len(answered) else 1.0
+        print(
+            f"   ✓ Cascade: accuracy {cascade['test_accuracy'] * 100:.2f}%, "
+            f"escalade {cascade['test_escalation_rate'] * 100:.1f}%"
+        )
 
     # Rapport détaillé
     print("\n📊 Rapport classification:")
@@ -135,15 +191,27 @@ def train_sms_classifier():
     joblib.dump(vectorizer, MODEL_DIR / "vectorizer.pkl")
     print(f"   ✓ Modèle sauvegardé: {MODEL_DIR / 'sms_model.pkl'}")
     print(f"   ✓ Vectorizer sauvegardé: {MODEL_DIR / 'vectorizer.pkl'}")
+    if fast_model is not None:
+        joblib.dump(fast_model, MODEL_DIR / FAST_MODEL_FILE)
+        print(f"   ✓ Modèle rapide sauvegardé: {MODEL_DIR / FAST_MODEL_FILE}")
+    else:
+        # Pas de cascade pour ce modèle : ne pas garder celle du précédent
+        (MODEL_DIR / FAST_MODEL_FILE).unlink(missing_ok=True)
+    export_artifacts(model, vectorizer, MODEL_DIR / MMAP_DIR)
+    print(f"   ✓ Artefacts mmap exportés: {MODEL_DIR / MMAP_DIR}")
 
     # 9. Métadonnées
     metadata = {
         "accuracy": float(accuracy),
+        "precision": float(precision_score(y_test, y_pred, zero_division=0)),
+        "recall": float(recall_score(y_test, y_pred, zero_division=0)),
+        "f1_score": float(f1_score(y_test, y_pred, zero_division=0)),
         "n_samples_train": len(X_train),
         "n_samples_test": len(X_test),
         "n_features": X_train_tfidf.shape[1],
         "model_type": "RandomForestClassifier",
         "version": "1.0",
+        "cascade": cascade,
     }
 
     joblib.dump(metadata, MODEL_DIR / "sms_metadata.pkl")
@@ -168,7 +236,7 @@ def trigger_training():
     Déclenche l'entraînement complet et retourne les métadonnées.
     Cette fonction est conçue pour être appelée par l'API.
     """
-    if not (DATA_DIR / "sms_train.csv").exists():
+    if not training_store.available():
         raise FileNotFoundError(f"Dataset introuvable dans {DATA_DIR}")
 
     _, _, accuracy = train_sms_classifier()
@@ -185,8 +253,8 @@ if __name__ == "__main__":
     print("   DYLETH - ML Training Pipeline")
     print("=" * 30 + "\n")
 
-    if not (DATA_DIR / "sms_train.csv").exists():
-        print("Erreur: sms_train.csv introuvable")
+    if not training_store.available():
+        print("Erreur: jeu d'entraînement introuvable (store ou sms_train.csv)")
         print(f"   Cherché dans: {DATA_DIR}")
         exit(1)
 
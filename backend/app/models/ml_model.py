@@ -1,4 +1,5 @@
 from sqlalchemy import Column, String, Float, Integer, Boolean, DateTime
+from sqlalchemy.dialects.postgresql import JSONB
 from datetime import datetime
 from app.db.base import Base
 
@@ -15,3 +16,5 @@ class MLModelVersion(Base):
     training_samples = Column(Integer, nullable=False)
     is_active = Column(Boolean, default=False)
     model_path = Column(String(255), nullable=False)
+    # Dernière évaluation sur le holdout (qualité, latence, débit, taille, chargement)
+    metrics = Column(JSONB, nullable=True)
@@ -0,0 +1,226 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from app.core.config import settings
+from app.rag.embedding_cache import embedding_cache, normalize, quantize
+from app.rag.embeddings import embedding_service
+from app.services.singleflight import singleflight
+
+logger = logging.getLogger(__name__)
+
+# Longueur (caractères) au-delà de laquelle le texte est tronqué par le modèle
+# (max_seq_length 128 tokens) : tous les textes plus longs coûtent pareil
+_LENGTH_CAP = 512
+
+# Marqueur d'arrêt déposé dans la file par stop()
+_STOP = object()
+
+
+def length_buckets(lengths: List[int], max_batch: int, max_ratio: float) -> List[List[int]]:
+    """
+    Indices regroupés par longueur croissante : au plus max_batch textes par
+    lot, et le plus long d'un lot au plus max_ratio fois le plus court (le
+    padding d'un lot est calé sur son texte le plus long).
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    buckets: List[List[int]] = []
+    for i in order:
+        current = buckets[-1] if buckets else None
+        if (
+            current is None
+            or len(current) >= max_batch
+            or lengths[i] > max_ratio * max(lengths[current[0]], 1)
+        ):
+            buckets.append([i])
+        else:
+            current.append(i)
+    return buckets
+
+
+class EmbeddingBatcher:
+    """Calcule les embeddings des requêtes concurrentes par lots.
+
+    Les textes qui arrivent pendant EMBEDDING_MAX_WAIT_MS (et pendant
+    l'encodage en cours) sont regroupés, triés par longueur puis découpés en
+    lots d'au plus EMBEDDING_MAX_BATCH_SIZE textes de longueurs voisines : le
+    transformer traite un lot en un passage, avec peu de padding. L'encodage
+    tourne dans un thread dédié (torch parallélise déjà chaque passage).
+    """
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        self.batches = 0
+        self.items = 0
+        self.failures = 0
+        self.max_batch_size = 0
+        self.encode_ms_total = 0.0
+        # Caractères utiles / caractères après padding (proxy des tokens)
+        self.useful_length = 0
+        self.padded_length = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._stopping
+
+    async def start(self):
+        if self.running:
+            return
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embeddings")
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._batch_loop())
+
+    async def stop(self):
+        if not self.running:
+            return
+        self._stopping = True
+        self._queue.put_nowait((_STOP, None))
+        await self._task
+        self._task = None
+        self._stopping = False
+        # Les requêtes encore en file sont servies avant l'arrêt du pool
+        pending = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item[0] is not _STOP:
+                pending.append(item)
+        if pending:
+            await self._encode(pending)
+        self._pool.shutdown(wait=False)
+        self._pool = None
+
+    async def embed(self, text: str) -> Optional[List[float]]:
+        """
+        Embedding d'un texte, None si le modèle n'est pas chargé ou a échoué.
+        Passe par embedding_cache : un texte déjà vu (même après normalisation)
+        n'est pas recalculé, et les demandes simultanées d'un même texte
+        partagent un seul calcul.
+        """
+        if not embedding_service.enabled:
+            return None
+        key = embedding_cache.key(text)
+        vector = await embedding_cache.get(key)
+        if vector is not None:
+            return vector
+        return await singleflight.do(key, lambda: self._compute(key, normalize(text)))
+
+    async def _compute(self, key: str, text: str) -> Optional[List[float]]:
+        vector = await self._embed_uncached(text)
+        if vector is None:
+            return None
+        # Même précision que les vecteurs relus du cache
+        stored = quantize(vector)
+        await embedding_cache.set(key, stored)
+        return stored.astype("float32").tolist()
+
+    async def _embed_uncached(self, text: str) -> Optional[List[float]]:
+        if not self.running:
+            # Hors API (Celery, scripts) : simple déport dans un thread
+            return await asyncio.to_thread(embedding_service.get_embedding, text)
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((text, future))
+        return await future
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        max_pending = settings.EMBEDDING_MAX_BATCH_SIZE * settings.EMBEDDING_MAX_BUCKETS
+        max_wait = settings.EMBEDDING_MAX_WAIT_MS / 1000
+
+        while True:
+            item = await self._queue.get()
+            if item[0] is _STOP:
+                return
+            pending, stop = [item], False
+            deadline = loop.time() + max_wait
+            while len(pending) < max_pending:
+                if not self._queue.empty():
+                    item = self._queue.get_nowait()
+                else:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item[0] is _STOP:
+                    stop = True
+                    break
+                pending.append(item)
+
+            # Encodage séquentiel : ce qui arrive pendant ce temps forme le lot suivant
+            await self._encode(pending)
+            if stop:
+                return
+
+    async def _encode(self, pending: list):
+        # Requêtes annulées entre-temps (timeout côté appelant)
+        pending = [(text, future) for text, future in pending if not future.done()]
+        if not pending:
+            return
+        lengths = [min(len(text), _LENGTH_CAP) for text, _ in pending]
+        loop = asyncio.get_running_loop()
+        for bucket in length_buckets(
+            lengths, settings.EMBEDDING_MAX_BATCH_SIZE, settings.EMBEDDING_BUCKET_LENGTH_RATIO
+        ):
+            texts = [pending[i][0] for i in bucket]
+            start = time.perf_counter()
+            try:
+                vectors = (await loop.run_in_executor(self._pool, embedding_service.encode, texts)).tolist()
+            except Exception as e:
+                logger.warning("Embedding batch of %d failed: %s", len(texts), e)
+                self.failures += 1
+                # Texte par texte : un texte fautif n'invalide pas tout le lot ;
+                # même contrat que get_embedding (None, le RAG est ignoré)
+                vectors = [
+                    await loop.run_in_executor(self._pool, embedding_service.get_embedding, text)
+                    for text in texts
+                ] if len(texts) > 1 else [None]
+            else:
+                self._record(
+                    [lengths[i] for i in bucket], (time.perf_counter() - start) * 1000
+                )
+            for i, vector in zip(bucket, vectors):
+                future = pending[i][1]
+                if not future.done():
+                    future.set_result(vector)
+
+    def _record(self, lengths: List[int], elapsed_ms: float):
+        self.batches += 1
+        self.items += len(lengths)
+        self.max_batch_size = max(self.max_batch_size, len(lengths))
+        self.encode_ms_total += elapsed_ms
+        self.useful_length += sum(lengths)
+        self.padded_length += max(lengths) * len(lengths)
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "model_loaded": embedding_service.enabled,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "batches": self.batches,
+            "items": self.items,
+            "failures": self.failures,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "avg_encode_ms": round(self.encode_ms_total / self.batches, 2) if self.batches else 0.0,
+            "padding_waste": round(1 - self.useful_length / self.padded_length, 3)
+            if self.padded_length
+            else 0.0,
+            "cache": embedding_cache.stats(),
+            "config": {
+                "max_batch_size": settings.EMBEDDING_MAX_BATCH_SIZE,
+                "max_wait_ms": settings.EMBEDDING_MAX_WAIT_MS,
+                "bucket_length_ratio": settings.EMBEDDING_BUCKET_LENGTH_RATIO,
+            },
+        }
+
+
+embedding_batcher = EmbeddingBatcher()
@@ -0,0 +1,106 @@
+import base64
+import hashlib
+import logging
+import re
+import unicodedata
+from typing import List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.rag.embeddings import embedding_service
+from app.services.cache import LocalCache, cache_service
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "emb"
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    """Forme canonique d'un texte : NFC, espaces réduits (sans effet sur le tokenizer)."""
+    return _SPACES.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def quantize(vector) -> np.ndarray:
+    return np.asarray(vector, dtype=np.float16)
+
+
+class EmbeddingCache:
+    """Embeddings adressés par contenu : sha256 du texte normalisé.
+
+    L1 : LRU en mémoire par worker ; L2 : Redis, vecteurs float16 (768 octets
+    pour 384 dimensions, en base64 sur le client texte partagé). Le nom du
+    modèle fait partie de la clé : changer embedding_service.model_name
+    invalide tout le cache (les anciennes clés expirent avec leur TTL).
+    Le vecteur servi est toujours la version float16, calculé ou non : un
+    même texte donne toujours le même vecteur.
+    """
+
+    def __init__(self):
+        self._local = LocalCache(settings.EMBEDDING_CACHE_LRU_SIZE)
+        self._model_tag: Optional[str] = None
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def _namespace(self) -> str:
+        tag = hashlib.sha256(embedding_service.model_name.encode("utf-8")).hexdigest()[:12]
+        if tag != self._model_tag:
+            # Autre modèle : les vecteurs en mémoire ne sont plus comparables
+            self._local.clear()
+            self._model_tag = tag
+        return f"{KEY_PREFIX}:{tag}"
+
+    def key(self, text: str) -> str:
+        digest = hashlib.sha256(normalize(text).encode("utf-8")).hexdigest()
+        return f"{self._namespace()}:{digest}"
+
+    async def get(self, key: str) -> Optional[List[float]]:
+        found, vector = self._local.get(key)
+        if found:
+            self.local_hits += 1
+            return vector.astype(np.float32).tolist()
+
+        client = cache_service.redis_client
+        if client is not None:
+            try:
+                data = await client.get(key)
+            except Exception as e:
+                logger.warning("Embedding cache read failed: %s", e)
+                data = None
+            if data:
+                vector = np.frombuffer(base64.b64decode(data), dtype=np.float16)
+                self._local.set(key, vector, settings.EMBEDDING_CACHE_TTL_SECONDS)
+                self.redis_hits += 1
+                return vector.astype(np.float32).tolist()
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, vector: np.ndarray):
+        self._local.set(key, vector, settings.EMBEDDING_CACHE_TTL_SECONDS)
+        client = cache_service.redis_client
+        if client is None:
+            return
+        try:
+            await client.setex(
+                key,
+                settings.EMBEDDING_CACHE_TTL_SECONDS,
+                base64.b64encode(vector.tobytes()).decode("ascii"),
+            )
+        except Exception as e:
+            logger.warning("Embedding cache write failed: %s", e)
+
+    def stats(self) -> dict:
+        lookups = self.local_hits + self.redis_hits + self.misses
+        return {
+            "local_entries": len(self._local),
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.local_hits + self.redis_hits) / lookups, 3) if lookups else 0.0,
+        }
+
+
+embedding_cache = EmbeddingCache()
@@ -1,5 +1,10 @@
+import logging
 from typing import List, Optional
 
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
 class EmbeddingService:
     def __init__(self):
         self.model = None
@@ -12,6 +17,7 @@ class EmbeddingService:
             self.model = SentenceTransformer(self.model_name)
             self.enabled = True
         except Exception as e:
+            logger.warning("Embedding model %s unavailable, RAG similarity disabled: %s", self.model_name, e)
             self.model = None
             self.enabled = False
 
@@ -24,6 +30,12 @@ class EmbeddingService:
         except:
             return None
 
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Un seul passage du transformer pour tout le lot (exceptions propagées)."""
+        if not self.model or not self.enabled:
+            raise RuntimeError("Embedding model not loaded")
+        return self.model.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+
     def get_batch_embeddings(self, texts: List[str]) -> List[List[float]]:
         if not self.model or not self.enabled:
             return []
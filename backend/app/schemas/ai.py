@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from typing import List, Optional
+from datetime import datetime
 
 
 class ChatRequest(BaseModel):
@@ -21,3 +22,28 @@ class TrainingResponse(BaseModel):
     success: bool
     message: str
     metrics: Optional[dict] = None
+
+
+class TrainingStatusResponse(BaseModel):
+    running: bool
+    current: Optional[dict] = None
+    last: Optional[dict] = None
+    pending_requests: int = 0
+    queued: bool = False
+
+
+class ModelVersionResponse(BaseModel):
+    version_id: int
+    model_type: str
+    training_date: datetime
+    accuracy: float
+    precision: float
+    recall: float
+    f1_score: float
+    training_samples: int
+    is_active: bool
+    model_path: str
+    metrics: Optional[dict] = None
+
+    class Config:
+        from_attributes = True
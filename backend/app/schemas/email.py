@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, EmailStr
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
 
 class EmailAnalyzeRequest(BaseModel):
@@ -20,6 +20,8 @@ class EmailAnalyzeResponse(BaseModel):
     dkim_valid: bool
     action: str
     response_time_ms: int
+    stage_timings_ms: Dict[str, float] = {}
+    degraded_stages: List[str] = []
 
 class EmailReportRequest(BaseModel):
     sender: EmailStr
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
 
 class PhoneCheckRequest(BaseModel):
@@ -16,6 +16,29 @@ class PhoneCheckResponse(BaseModel):
     action: str
     similar_cases: int = 0
     response_time_ms: int
+    stage_timings_ms: Dict[str, float] = {}
+    degraded_stages: List[str] = []
+
+class PhoneBatchCheckRequest(BaseModel):
+    phones: List[str] = Field(..., min_length=1, max_length=5000)
+    country: str = Field(..., max_length=3)
+    user_id: Optional[str] = None
+
+class PhoneBatchCheckItem(BaseModel):
+    phone: str
+    normalized_phone: str
+    is_fraud: bool
+    confidence: float = Field(..., ge=0.0, le=1.0)
+    category: Optional[str] = None
+    reason: Optional[str] = None
+    action: str
+    similar_cases: int = 0
+
+class PhoneBatchCheckResponse(BaseModel):
+    results: List[PhoneBatchCheckItem]
+    total: int
+    fraud_count: int
+    response_time_ms: int
 
 class PhoneReportRequest(BaseModel):
     phone: str
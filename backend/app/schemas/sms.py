@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
 
 class SMSAnalyzeRequest(BaseModel):
@@ -16,6 +16,30 @@ class SMSAnalyzeResponse(BaseModel):
     action: str
     similar_frauds: int = 0
     response_time_ms: int
+    stage_timings_ms: Dict[str, float] = {}
+    degraded_stages: List[str] = []
+
+class SMSBatchItem(BaseModel):
+    content: str = Field(..., min_length=1, max_length=5000)
+    sender: str
+
+class SMSBatchAnalyzeRequest(BaseModel):
+    messages: List[SMSBatchItem] = Field(..., min_length=1, max_length=1000)
+    user_id: Optional[str] = None
+
+class SMSBatchResultItem(BaseModel):
+    is_fraud: bool
+    confidence: float = Field(..., ge=0.0, le=1.0)
+    category: Optional[str] = None
+    risk_factors: List[str] = []
+    action: str
+    similar_frauds: int = 0
+
+class SMSBatchAnalyzeResponse(BaseModel):
+    results: List[SMSBatchResultItem]
+    total: int
+    fraud_count: int
+    response_time_ms: int
 
 class SMSReportRequest(BaseModel):
     content: str
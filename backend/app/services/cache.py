@@ -1,50 +1,231 @@
 import redis.asyncio as redis
+import asyncio
 import json
-from typing import Optional
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
+# Canal pub/sub des invalidations du cache L1 entre workers
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+
+class LocalCache:
+    """Cache L1 en mémoire : LRU borné en taille, expiration par entrée."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return False, None
+        self._data.move_to_end(key)
+        return True, value
+
+    def set(self, key: str, value: Any, ttl: float):
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
 
 class CacheService:
+    """Cache à deux niveaux : L1 en mémoire (par worker) devant Redis (L2).
+
+    Seules les clés dont le namespace (préfixe avant ':') a un TTL dans
+    CACHE_L1_TTLS passent par le L1. Les suppressions sont diffusées aux autres
+    workers via pub/sub ; le même listener sert aux autres canaux (subscribe).
+    """
+
     def __init__(self):
         self.redis_client = None
+        self.instance_id = uuid.uuid4().hex
+        self.local = LocalCache(settings.CACHE_L1_MAX_SIZE)
+        self.l1_hits = 0
+        self.l1_misses = 0
+        self.l2_hits = 0
+        self.l2_misses = 0
+        self._handlers: Dict[str, List[Callable[[dict], Optional[Awaitable]]]] = {
+            INVALIDATION_CHANNEL: [self._on_invalidate]
+        }
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
 
     async def connect(self):
         self.redis_client = await redis.from_url(
             settings.REDIS_URL, encoding="utf-8", decode_responses=True
         )
+        try:
+            self._pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+            await self._pubsub.subscribe(*self._handlers)
+            self._listener = asyncio.create_task(self._listen())
+        except Exception as e:
+            logger.error("Could not subscribe to cache invalidations: %s", e)
+            self._pubsub = None
 
     async def disconnect(self):
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._pubsub:
+            await self._pubsub.aclose()
+            self._pubsub = None
         if self.redis_client:
             await self.redis_client.close()
 
-    async def check_rate_limit(self, user_id: str, role: str) -> bool:
-        """Check per‑user rate limit based on role quota.
-        A quota of 0 means unlimited.
-        """
+    # === PUB/SUB ===
+
+    async def subscribe(self, channel: str, handler: Callable[[dict], Optional[Awaitable]]):
+        """Enregistre un handler pour les messages publiés par les autres workers."""
+        new_channel = channel not in self._handlers
+        self._handlers.setdefault(channel, []).append(handler)
+        if new_channel and self._pubsub:
+            await self._pubsub.subscribe(channel)
+
+    def encode_message(self, message: dict) -> str:
+        return json.dumps({**message, "origin": self.instance_id})
+
+    async def publish(self, channel: str, message: dict):
         if not self.redis_client:
-            return False
-        # Determine quota from settings
-        quota = getattr(
-            settings, f"{role.upper()}_QUOTA", settings.MAX_REQUESTS_PER_MINUTE
-        )
-        if quota == 0:
-            return True
-        key = f"rate_limit:{role}:{user_id}"
-        count = await self.increment(key)
-        if count == 1:
-            await self.redis_client.expire(key, 60)
-        return count <= quota
+            return
+        try:
+            await self.redis_client.publish(channel, self.encode_message(message))
+        except Exception as e:
+            logger.warning("Could not publish on %s: %s", channel, e)
+
+    async def _listen(self):
+        while True:
+            try:
+                async for message in self._pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    data = json.loads(message["data"])
+                    # Ses propres messages sont déjà appliqués localement
+                    if data.get("origin") == self.instance_id:
+                        continue
+                    for handler in self._handlers.get(message["channel"], []):
+                        try:
+                            result = handler(data)
+                            if asyncio.iscoroutine(result):
+                                await result
+                        except Exception as e:
+                            logger.error("Pub/sub handler failed on %s: %s", message["channel"], e)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Connexion perdue : le L1 peut être périmé, on le vide
+                logger.error("Cache pub/sub listener error: %s", e)
+                self.local.clear()
+                await asyncio.sleep(1)
+
+    def _on_invalidate(self, data: dict):
+        for key in data.get("keys", []):
+            self.local.delete(key)
+
+    # === L1 ===
+
+    def _l1_ttl(self, key: str) -> Optional[int]:
+        return settings.CACHE_L1_TTLS.get(key.split(":", 1)[0])
+
+    def stats(self) -> dict:
+        l1_total = self.l1_hits + self.l1_misses
+        l2_total = self.l2_hits + self.l2_misses
+        return {
+            "connected": self.redis_client is not None,
+            "l1_size": len(self.local),
+            "l1_max_size": self.local.max_size,
+            "l1_hits": self.l1_hits,
+            "l1_misses": self.l1_misses,
+            "l1_hit_rate": round(self.l1_hits / l1_total, 4) if l1_total else 0.0,
+            "l2_hits": self.l2_hits,
+            "l2_misses": self.l2_misses,
+            "l2_hit_rate": round(self.l2_hits / l2_total, 4) if l2_total else 0.0,
+        }
 
     async def get(self, key: str) -> Optional[dict]:
+        l1_ttl = self._l1_ttl(key)
+        if l1_ttl:
+            hit, value = self.local.get(key)
+            if hit:
+                self.l1_hits += 1
+                return value
+            self.l1_misses += 1
+
         if not self.redis_client:
             return None
         try:
             data = await self.redis_client.get(key)
-            return json.loads(data) if data else None
         except Exception:
             return None
+        if not data:
+            self.l2_misses += 1
+            return None
+
+        self.l2_hits += 1
+        value = json.loads(data)
+        if l1_ttl:
+            self.local.set(key, value, l1_ttl)
+        return value
+
+    async def get_many(self, keys: List[str]) -> List[Optional[dict]]:
+        """L1 d'abord, puis un seul MGET Redis pour les clés manquantes."""
+        values: List[Optional[dict]] = [None] * len(keys)
+        missing = []
+        for i, key in enumerate(keys):
+            if self._l1_ttl(key):
+                hit, value = self.local.get(key)
+                if hit:
+                    self.l1_hits += 1
+                    values[i] = value
+                    continue
+                self.l1_misses += 1
+            missing.append(i)
+
+        if not self.redis_client or not missing:
+            return values
+        try:
+            remote = await self.redis_client.mget([keys[i] for i in missing])
+        except Exception:
+            return values
+
+        for i, data in zip(missing, remote):
+            if not data:
+                self.l2_misses += 1
+                continue
+            self.l2_hits += 1
+            values[i] = json.loads(data)
+            l1_ttl = self._l1_ttl(keys[i])
+            if l1_ttl:
+                self.local.set(keys[i], values[i], l1_ttl)
+        return values
 
     async def set(self, key: str, value: dict, expire: int = 3600):
+        l1_ttl = self._l1_ttl(key)
+        if l1_ttl:
+            self.local.set(key, value, min(l1_ttl, expire))
         if not self.redis_client:
             return
         try:
@@ -52,13 +233,33 @@ class CacheService:
         except Exception:
             pass
 
+    async def set_many(self, items: Dict[str, dict], expire: int = 3600):
+        """Écriture d'un lot de clés en un seul aller-retour (pipeline)."""
+        for key, value in items.items():
+            l1_ttl = self._l1_ttl(key)
+            if l1_ttl:
+                self.local.set(key, value, min(l1_ttl, expire))
+        if not self.redis_client or not items:
+            return
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for key, value in items.items():
+                    pipe.setex(key, expire, json.dumps(value))
+                await pipe.execute()
+        except Exception:
+            pass
+
     async def delete(self, key: str):
+        """Supprime la clé du L1 de chaque worker et de Redis."""
+        self.local.delete(key)
         if not self.redis_client:
             return
         try:
             await self.redis_client.delete(key)
         except Exception:
             pass
+        if self._l1_ttl(key):
+            await self.publish(INVALIDATION_CHANNEL, {"keys": [key]})
 
     async def increment(self, key: str) -> int:
         if not self.redis_client:
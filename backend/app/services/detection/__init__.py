@@ -1 +1,4 @@
 from .service import detection_service
+from .blacklist_index import blacklist_index
+from .log_sink import detection_log_sink
+from .sms_rules import sms_rule_engine
@@ -0,0 +1,238 @@
+"""
+Index en mémoire des numéros blacklistés (table fraudulent_numbers).
+
+Les numéros E.164 sont stockés sous forme d'entiers triés (numpy int64)
+précédés d'un filtre de Bloom : une réponse négative ne touche jamais la base,
+seule une correspondance réelle déclenche le SELECT des détails.
+"""
+
+import asyncio
+import logging
+import math
+from datetime import datetime
+from typing import List, Optional, Set
+
+import numpy as np
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.fraud import FraudulentNumber
+from app.services.cache import cache_service
+
+logger = logging.getLogger(__name__)
+
+# Canal pub/sub : ajouts/suppressions faits par les autres workers
+INDEX_CHANNEL = "blacklist:index"
+
+_MASK64 = (1 << 64) - 1
+
+
+def _mix64(x: int) -> int:
+    """Hash splitmix64 (rapide et bien distribué pour des clés entières)."""
+    x = (x + 0x9E3779B97F4A7C15) & _MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+
+class BloomFilter:
+    """Filtre de Bloom minimal sur des clés entières (double hashing)."""
+
+    def __init__(self, capacity: int, fp_rate: float):
+        capacity = max(capacity, 1024)
+        self.size = max(8, int(-capacity * math.log(fp_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: int):
+        h1 = _mix64(key)
+        h2 = _mix64(h1) | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: int):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: int) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+def _to_key(phone: str) -> Optional[int]:
+    """'+261341234567' -> 261341234567. None si le numéro n'est pas en E.164."""
+    if phone and phone.startswith("+") and phone[1:].isdigit() and len(phone) <= 16:
+        return int(phone[1:])
+    return None
+
+
+class BlacklistIndex:
+    def __init__(self):
+        self.ready = False
+        self._numbers = np.empty(0, dtype=np.int64)
+        self._bloom = BloomFilter(0, settings.BLACKLIST_INDEX_FALSE_POSITIVE_RATE)
+        # Modifications depuis le dernier chargement complet
+        self._added: Set[int] = set()
+        self._removed: Set[int] = set()
+        # Numéros non E.164 (normalisation échouée), gardés tels quels
+        self._extra: Set[str] = set()
+        self._watermark: Optional[datetime] = None
+        self._journal: Optional[List[tuple]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._numbers) + len(self._added) - len(self._removed) + len(self._extra)
+
+    def might_contain(self, phone: str) -> bool:
+        """
+        False => le numéro n'est certainement pas blacklisté.
+        True  => il faut aller chercher les détails en base
+        (toujours True tant que l'index n'est pas chargé).
+        """
+        if not self.ready:
+            return True
+
+        key = _to_key(phone)
+        if key is None:
+            return phone in self._extra
+        if key in self._removed:
+            return False
+        if key in self._added:
+            return True
+        if key not in self._bloom:
+            return False
+        idx = int(np.searchsorted(self._numbers, key))
+        return idx < len(self._numbers) and int(self._numbers[idx]) == key
+
+    def add(self, phone: str):
+        if self._journal is not None:
+            self._journal.append(("add", phone))
+        key = _to_key(phone)
+        if key is None:
+            if phone:
+                self._extra.add(phone)
+            return
+        self._removed.discard(key)
+        self._added.add(key)
+        self._bloom.add(key)
+
+    def remove(self, phone: str):
+        if self._journal is not None:
+            self._journal.append(("remove", phone))
+        key = _to_key(phone)
+        if key is None:
+            self._extra.discard(phone)
+            return
+        self._added.discard(key)
+        self._removed.add(key)
+
+    async def propagate(self, op: str, phone: str):
+        """Applique un ajout/suppression localement et le diffuse aux autres workers."""
+        getattr(self, op)(phone)
+        await cache_service.publish(INDEX_CHANNEL, {"op": op, "phone": phone})
+
+    def _on_message(self, data: dict):
+        if data.get("op") in ("add", "remove") and data.get("phone"):
+            getattr(self, data["op"])(data["phone"])
+
+    async def load(self):
+        """Chargement complet depuis fraudulent_numbers."""
+        self._journal = []
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    select(FraudulentNumber.phone_number, FraudulentNumber.last_reported)
+                )
+                rows = result.all()
+        except Exception:
+            self._journal = None
+            raise
+
+        keys, extra = [], set()
+        watermark = None
+        for phone, last_reported in rows:
+            key = _to_key(phone)
+            if key is None:
+                extra.add(phone)
+            else:
+                keys.append(key)
+            if last_reported and (watermark is None or last_reported > watermark):
+                watermark = last_reported
+
+        numbers = np.unique(np.fromiter(keys, dtype=np.int64, count=len(keys)))
+        bloom = BloomFilter(
+            int(len(numbers) * 1.5), settings.BLACKLIST_INDEX_FALSE_POSITIVE_RATE
+        )
+        for key in numbers.tolist():
+            bloom.add(key)
+
+        journal = self._journal
+        self._numbers = numbers
+        self._bloom = bloom
+        self._added = set()
+        self._removed = set()
+        self._extra = extra
+        self._watermark = watermark
+        self._journal = None
+        # Rejouer les modifications faites pendant le chargement
+        for op, phone in journal:
+            getattr(self, op)(phone)
+
+        self.ready = True
+        logger.info("Blacklist index loaded: %d numbers", len(self))
+
+    async def refresh(self):
+        """Rafraîchissement incrémental : numéros ajoutés/mis à jour depuis le watermark."""
+        if not self.ready:
+            await self.load()
+            return
+
+        query = select(FraudulentNumber.phone_number, FraudulentNumber.last_reported)
+        if self._watermark is not None:
+            query = query.where(FraudulentNumber.last_reported >= self._watermark)
+
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(query)
+            rows = result.all()
+
+        for phone, last_reported in rows:
+            self.add(phone)
+            if last_reported and (self._watermark is None or last_reported > self._watermark):
+                self._watermark = last_reported
+
+    async def _refresh_loop(self):
+        elapsed = 0
+        while True:
+            await asyncio.sleep(settings.BLACKLIST_INDEX_REFRESH_SECONDS)
+            elapsed += settings.BLACKLIST_INDEX_REFRESH_SECONDS
+            try:
+                # Le rechargement complet prend en compte les suppressions
+                # faites par d'autres workers et recalibre le filtre de Bloom.
+                if elapsed >= settings.BLACKLIST_INDEX_FULL_RELOAD_SECONDS:
+                    elapsed = 0
+                    await self.load()
+                else:
+                    await self.refresh()
+            except Exception as e:
+                logger.error("Blacklist index refresh failed: %s", e)
+
+    async def start(self):
+        await cache_service.subscribe(INDEX_CHANNEL, self._on_message)
+        try:
+            await self.load()
+        except Exception as e:
+            logger.error("Could not load blacklist index, falling back to DB: %s", e)
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+blacklist_index = BlacklistIndex()
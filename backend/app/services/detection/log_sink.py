@@ -0,0 +1,146 @@
+import asyncio
+import logging
+from typing import List, Optional
+
+from sqlalchemy import insert
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.report import DetectionLog
+
+logger = logging.getLogger(__name__)
+
+# Marqueur d'arrêt déposé dans la file par stop()
+_STOP = object()
+
+
+class DetectionLogSink:
+    """Écriture différée (write-behind) des DetectionLog.
+
+    Les requêtes déposent leurs lignes dans un tampon mémoire borné ; une tâche
+    de fond les insère par paquets (INSERT multi-lignes) toutes les
+    DETECTION_LOG_BATCH_SIZE lignes ou DETECTION_LOG_FLUSH_INTERVAL_MS.
+    Quand le tampon est plein, l'appelant attend (backpressure) au plus
+    DETECTION_LOG_ENQUEUE_TIMEOUT_MS avant que la ligne et la suite de son lot
+    ne soient abandonnées (enqueue renvoie alors False).
+    """
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._stopping
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=settings.DETECTION_LOG_QUEUE_SIZE)
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Arrêt propre : tout ce qui reste dans le tampon est écrit."""
+        if not self.running:
+            return
+        self._stopping = True
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+        self._stopping = False
+
+        rows = []
+        while not self._queue.empty():
+            rows.append(self._queue.get_nowait())
+        for i in range(0, len(rows), settings.DETECTION_LOG_BATCH_SIZE):
+            await self._flush(rows[i : i + settings.DETECTION_LOG_BATCH_SIZE])
+
+    async def enqueue(self, rows: List[dict]) -> bool:
+        """
+        True si toutes les lignes sont dans le tampon. False sinon : sink non
+        démarré (rien n'est pris, l'appelant écrit alors lui-même) ou tampon
+        resté plein (lignes restantes abandonnées, comptées dans dropped).
+        """
+        if not self.running:
+            return False
+
+        timeout = settings.DETECTION_LOG_ENQUEUE_TIMEOUT_MS / 1000
+        for i, row in enumerate(rows):
+            try:
+                self._queue.put_nowait(row)
+            except asyncio.QueueFull:
+                try:
+                    await asyncio.wait_for(self._queue.put(row), timeout)
+                except asyncio.TimeoutError:
+                    # Le reste du lot attendrait autant : abandonné sans attendre
+                    lost = len(rows) - i
+                    self.dropped += lost
+                    logger.warning("Detection log buffer full, dropping %d log rows", lost)
+                    return False
+            self.enqueued += 1
+        return True
+
+    async def _flush_loop(self):
+        loop = asyncio.get_running_loop()
+        batch_size = settings.DETECTION_LOG_BATCH_SIZE
+        interval = settings.DETECTION_LOG_FLUSH_INTERVAL_MS / 1000
+
+        while True:
+            row = await self._queue.get()
+            if row is _STOP:
+                return
+            rows, stop = [row], False
+            deadline = loop.time() + interval
+            while len(rows) < batch_size:
+                if not self._queue.empty():
+                    row = self._queue.get_nowait()
+                else:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        row = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if row is _STOP:
+                    stop = True
+                    break
+                rows.append(row)
+
+            await self._flush(rows)
+            if stop:
+                return
+
+    async def _flush(self, rows: List[dict]):
+        if not rows:
+            return
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(insert(DetectionLog), rows)
+                await db.commit()
+            self.written += len(rows)
+            self.flushes += 1
+        except Exception as e:
+            self.failed += len(rows)
+            logger.error("Failed to flush %d detection logs: %s", len(rows), e)
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "buffered": self._queue.qsize() if self._queue else 0,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "flushes": self.flushes,
+        }
+
+
+detection_log_sink = DetectionLogSink()
@@ -0,0 +1,183 @@
+"""
+Pipeline de détection par étapes.
+
+Une détection (téléphone, SMS, email) est une liste ordonnée d'étapes
+(cache, blacklist, règles, ML, similarité RAG, DNS...) qui partagent un
+DetectionContext. Chaque étape :
+- dispose d'un budget de latence (DETECTION_STAGE_BUDGETS_MS, par nom d'étape) ;
+  au-delà elle est abandonnée et la détection continue en mode dégradé ;
+- peut court-circuiter les étapes d'analyse suivantes (ctx.stop()).
+Les étapes de finalisation (verdict, persistance, logs) s'exécutent toujours,
+sans budget. Les durées de chaque étape sont renvoyées dans la réponse.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.services.singleflight import singleflight
+
+logger = logging.getLogger(__name__)
+
+
+class DetectionContext:
+    def __init__(self, kind: str, user_id: Optional[str] = None, **inputs: Any):
+        self.kind = kind
+        self.user_id = user_id
+        self.inputs = inputs
+        self.db: Optional[AsyncSession] = None
+        # Sorties intermédiaires des étapes (matches de règles, prédiction, SPF...)
+        self.signals: Dict[str, Any] = {}
+        # Réponse (sans response_time_ms ni timings), construite par le verdict
+        self.result: Optional[dict] = None
+        self.method: Optional[str] = None
+        self.stopped = False
+        self.timings: Dict[str, float] = {}
+        self.degraded: List[str] = []
+        self.start = time.time()
+
+    def stop(self, result: Optional[dict] = None, method: Optional[str] = None):
+        """Court-circuite les étapes d'analyse restantes."""
+        if result is not None:
+            self.result = result
+        if method is not None:
+            self.method = method
+        self.stopped = True
+
+    def elapsed_ms(self) -> int:
+        return int((time.time() - self.start) * 1000)
+
+
+StageFn = Callable[[DetectionContext], Awaitable[None]]
+
+
+class Stage:
+    """
+    critical=True : une erreur interrompt la détection (étapes dont la réponse
+    dépend, ex. le verdict) au lieu de la marquer comme dégradée.
+    """
+
+    def __init__(self, name: str, fn: StageFn, critical: bool = False):
+        self.name = name
+        self.fn = fn
+        self.critical = critical
+
+    @property
+    def budget_ms(self) -> Optional[float]:
+        return settings.DETECTION_STAGE_BUDGETS_MS.get(self.name)
+
+    async def __call__(self, ctx: DetectionContext):
+        start = time.perf_counter()
+        budget = self.budget_ms
+        try:
+            if budget:
+                await asyncio.wait_for(self.fn(ctx), budget / 1000)
+            else:
+                await self.fn(ctx)
+        except asyncio.TimeoutError:
+            ctx.degraded.append(self.name)
+            logger.warning("Detection stage %s exceeded its %sms budget", self.name, budget)
+        except Exception as e:
+            if self.critical:
+                raise
+            ctx.degraded.append(self.name)
+            logger.exception("Detection stage %s failed: %s", self.name, e)
+        finally:
+            ctx.timings[self.name] = round((time.perf_counter() - start) * 1000, 2)
+
+
+class ParallelStage(Stage):
+    """Étapes indépendantes lancées en même temps (chacune garde son budget)."""
+
+    def __init__(self, name: str, stages: List[Stage]):
+        super().__init__(name, self._run)
+        self.stages = stages
+
+    @property
+    def budget_ms(self) -> Optional[float]:
+        return None
+
+    async def _run(self, ctx: DetectionContext):
+        await asyncio.gather(*(stage(ctx) for stage in self.stages))
+
+
+class CoalescedStage(Stage):
+    """
+    Sous-pipeline exécuté une seule fois pour les requêtes concurrentes de même
+    clé (single-flight). Il ne doit contenir que du calcul (lectures, modèles,
+    verdict) : son résultat (sérialisable) est recopié dans le contexte de
+    chaque requête, et les effets de bord (cache, signalements, logs) restent
+    dans les finaliseurs du pipeline externe, exécutés par chaque requête.
+    uses_db=True : le calcul ouvre sa propre session (partagé entre requêtes,
+    il ne peut pas emprunter celle de l'une d'elles).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        key_fn: Callable[[DetectionContext], str],
+        pipeline: "DetectionPipeline",
+        uses_db: bool = False,
+    ):
+        super().__init__(name, self._run, critical=True)
+        self.key_fn = key_fn
+        self.pipeline = pipeline
+        self.uses_db = uses_db
+
+    @property
+    def budget_ms(self) -> Optional[float]:
+        return None
+
+    async def _run(self, ctx: DetectionContext):
+        shared = await singleflight.do(self.key_fn(ctx), lambda: self._compute(ctx))
+        ctx.result = shared["result"]
+        ctx.method = shared["method"]
+        ctx.timings.update(shared["timings"])
+        ctx.degraded.extend(shared["degraded"])
+
+    async def _compute(self, ctx: DetectionContext) -> dict:
+        inner = DetectionContext(ctx.kind, ctx.user_id, **ctx.inputs)
+        inner.signals = dict(ctx.signals)
+        if self.uses_db:
+            async with AsyncSessionLocal() as db:
+                inner.db = db
+                await self.pipeline.run(inner)
+        else:
+            await self.pipeline.run(inner)
+        return {
+            "result": inner.result,
+            "method": inner.method,
+            "timings": inner.timings,
+            "degraded": inner.degraded,
+        }
+
+
+class DetectionPipeline:
+    def __init__(self, name: str, stages: List[Stage], finalizers: List[Stage]):
+        self.name = name
+        self.stages = stages
+        self.finalizers = finalizers
+
+    async def run(self, ctx: DetectionContext) -> DetectionContext:
+        for stage in self.stages:
+            await stage(ctx)
+            if ctx.stopped:
+                break
+        for stage in self.finalizers:
+            await stage(ctx)
+        return ctx
+
+    @staticmethod
+    def response(ctx: DetectionContext) -> dict:
+        """Réponse API : résultat + temps total + durées par étape."""
+        return {
+            **(ctx.result or {}),
+            "response_time_ms": ctx.elapsed_ms(),
+            "stage_timings_ms": dict(ctx.timings),
+            "degraded_stages": list(ctx.degraded),
+        }
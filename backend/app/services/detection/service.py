@@ -1,160 +1,472 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from typing import Optional
+from sqlalchemy import select, insert
+from typing import List, Optional, Tuple
 import time
 from datetime import datetime
 from app.models.fraud import FraudulentNumber, FraudulentDomain, FraudType
 from app.models.report import DetectionLog
 from app.services.cache import cache_service
-from app.services.ml_service import ml_service
+from app.services.dns_service import dns_service
+from app.services.ml_service import ml_service, inference_executor
+from app.services.detection.blacklist_index import blacklist_index
+from app.services.detection.log_sink import detection_log_sink
+from app.services.detection.sms_rules import RuleMatch, sms_rule_engine
+from app.core.config import settings
+from app.services.detection.pipeline import (
+    CoalescedStage,
+    DetectionContext,
+    DetectionPipeline,
+    ParallelStage,
+    Stage,
+)
+from app.services.rag_service import rag_service
+from app.rag.batcher import embedding_batcher
+from app.rag.embeddings import embedding_service
 from sqlalchemy.exc import SQLAlchemyError
 from app.core.phone_utils import normalize_phone_number
+import hashlib
 import logging
-import dns.resolver
+import phonenumbers
 
 
 class DetectionService:
+    def __init__(self):
+        # Étapes par type de détection ; ajouter une étape = une méthode + une ligne ici
+        # Les sous-pipelines coalescés (single-flight) ne font que le calcul ;
+        # persistance, signalement et log s'exécutent pour chaque requête, sur
+        # sa session et avec son user_id
+        self.phone_pipeline = DetectionPipeline(
+            "phone",
+            stages=[
+                Stage("cache", self._phone_cache),
+                CoalescedStage(
+                    "resolve",
+                    lambda ctx: f"phone:{ctx.inputs['normalized_phone']}",
+                    DetectionPipeline(
+                        "phone_resolve",
+                        stages=[
+                            Stage("blacklist", self._phone_blacklist),
+                            Stage("ml", self._phone_ml),
+                        ],
+                        finalizers=[Stage("verdict", self._phone_verdict, critical=True)],
+                    ),
+                    uses_db=True,
+                ),
+            ],
+            finalizers=[Stage("store", self._phone_store)],
+        )
+        self.sms_pipeline = DetectionPipeline(
+            "sms",
+            stages=[
+                # Même contenu + même expéditeur : un seul calcul partagé
+                CoalescedStage(
+                    "analyze",
+                    lambda ctx: "sms:" + hashlib.sha256(
+                        f"{ctx.inputs['sender']}\0{ctx.inputs['content']}".encode()
+                    ).hexdigest(),
+                    DetectionPipeline(
+                        "sms_analyze",
+                        stages=[
+                            Stage("rules", self._sms_rules),
+                            Stage("ml", self._sms_ml),
+                            Stage("similarity", self._sms_similarity),
+                        ],
+                        finalizers=[Stage("verdict", self._sms_verdict_stage, critical=True)],
+                    ),
+                ),
+            ],
+            finalizers=[
+                Stage("report", self._sms_report),
+                Stage("log", self._log_stage),
+            ],
+        )
+        self.email_pipeline = DetectionPipeline(
+            "email",
+            stages=[
+                Stage("domain_blacklist", self._email_domain),
+                ParallelStage(
+                    "analysis", [Stage("ml", self._email_ml), Stage("spf", self._email_spf)]
+                ),
+            ],
+            finalizers=[
+                Stage("verdict", self._email_verdict, critical=True),
+                Stage("report", self._email_report),
+                Stage("log", self._log_stage),
+            ],
+        )
+
     async def check_phone(
         self, db: AsyncSession, phone: str, country: str, user_id: Optional[str] = None
     ) -> dict:
-        start_time = time.time()
+        ctx = DetectionContext(
+            "phone",
+            user_id,
+            phone=phone,
+            country=country,
+            normalized_phone=normalize_phone_number(phone, country),
+        )
+        ctx.db = db
+        await self.phone_pipeline.run(ctx)
+        return DetectionPipeline.response(ctx)
 
-        # Normalisation
-        normalized_phone = normalize_phone_number(phone, country)
-        cache_key = f"phone:{normalized_phone}"
-        cached = await cache_service.get(cache_key)
+    async def _phone_cache(self, ctx: DetectionContext):
+        cached = await cache_service.get(f"phone:{ctx.inputs['normalized_phone']}")
         if cached:
-            return {
-                **cached,
-                "response_time_ms": int((time.time() - start_time) * 1000),
-            }
-
-        result = await db.execute(
+            # Copie : l'entrée est partagée par le cache L1 du worker
+            cached = dict(cached)
+            cached.pop("response_time_ms", None)
+            ctx.stop(cached, "cache")
+
+    async def _phone_blacklist(self, ctx: DetectionContext):
+        # L'index en mémoire écarte les numéros propres sans requête SQL
+        normalized_phone = ctx.inputs["normalized_phone"]
+        if not blacklist_index.might_contain(normalized_phone):
+            return
+        result = await ctx.db.execute(
             select(FraudulentNumber).where(FraudulentNumber.phone_number == normalized_phone)
         )
         fraud_entry = result.scalar_one_or_none()
-
         if fraud_entry:
-            response = {
-                "is_fraud": True,
-                "confidence": fraud_entry.confidence_score,
-                "category": fraud_entry.fraud_type.value,
-                "reason": f"Signalé {fraud_entry.report_count} fois",
-                "action": "block",
-                "similar_cases": fraud_entry.report_count,
-                "response_time_ms": int((time.time() - start_time) * 1000),
-            }
-            await cache_service.set(cache_key, response, expire=7200)
-            await self._log_detection(
-                db,
-                user_id,
-                "phone",
-                True,
-                confidence=fraud_entry.confidence_score,
-                method="blacklist",
-                response_time=int((time.time() - start_time) * 1000),
-                meta_data={"phone": normalized_phone, "country": country},
+            ctx.stop(
+                {
+                    "is_fraud": True,
+                    "confidence": fraud_entry.confidence_score,
+                    "category": fraud_entry.fraud_type.value,
+                    "reason": f"Signalé {fraud_entry.report_count} fois",
+                    "action": "block",
+                    "similar_cases": fraud_entry.report_count,
+                },
+                "blacklist",
             )
-            return response
 
-        is_fraud, confidence = ml_service.predict_phone(
-            phone, {"hour": 14, "call_count": 1}
+    async def _phone_ml(self, ctx: DetectionContext):
+        ctx.signals["prediction"] = ml_service.predict_phone(
+            ctx.inputs["phone"], {"hour": 14, "call_count": 1}
         )
 
-        response = {
+    async def _phone_verdict(self, ctx: DetectionContext):
+        if ctx.result is not None:
+            return
+        is_fraud, confidence = ctx.signals.get("prediction", (False, 0.0))
+        ctx.method = "ml"
+        ctx.result = {
             "is_fraud": is_fraud,
             "confidence": confidence,
             "category": "suspected_scam" if is_fraud else None,
             "reason": "Analyse ML" if is_fraud else "Numéro non signalé",
             "action": "block" if is_fraud else "allow",
             "similar_cases": 0,
-            "response_time_ms": int((time.time() - start_time) * 1000),
         }
 
-        await cache_service.set(cache_key, response, expire=3600)
-        await self._log_detection(
-            db,
-            user_id,
-            "phone",
-            is_fraud,
-            confidence,
-            "ml",
-            int((time.time() - start_time) * 1000),
-            meta_data={"phone": normalized_phone, "country": country},
+    async def _phone_store(self, ctx: DetectionContext):
+        # Réponse servie par le cache : ni remise en cache ni log
+        if ctx.method == "cache":
+            return
+        # Un résultat dégradé n'est pas mis en cache
+        if not ctx.degraded:
+            await cache_service.set(
+                f"phone:{ctx.inputs['normalized_phone']}",
+                ctx.result,
+                expire=7200 if ctx.method == "blacklist" else 3600,
+            )
+        await self._log_stage(ctx)
+
+    async def check_phones(
+        self,
+        db: AsyncSession,
+        phones: List[str],
+        country: str,
+        user_id: Optional[str] = None,
+    ) -> dict:
+        """
+        Vérification d'un lot de numéros : normalisation en une passe, un MGET Redis,
+        une requête IN pour la blacklist, un scoring vectorisé et un INSERT groupé
+        des logs. L'ordre des résultats suit l'ordre d'entrée.
+        """
+        start_time = time.time()
+
+        normalized = [normalize_phone_number(phone, country) for phone in phones]
+        # Numéro normalisé -> numéro brut (première occurrence), doublons dédupliqués
+        unique = {}
+        for phone, normalized_phone in zip(phones, normalized):
+            unique.setdefault(normalized_phone, phone)
+
+        keys = list(unique)
+        cached = await cache_service.get_many([f"phone:{n}" for n in keys])
+        responses = {n: c for n, c in zip(keys, cached) if c}
+        misses = [n for n in keys if n not in responses]
+
+        candidates = [n for n in misses if blacklist_index.might_contain(n)]
+        fraud_entries = {}
+        if candidates:
+            result = await db.execute(
+                select(FraudulentNumber).where(FraudulentNumber.phone_number.in_(candidates))
+            )
+            fraud_entries = {e.phone_number: e for e in result.scalars().all()}
+
+        elapsed_ms = int((time.time() - start_time) * 1000)
+        blacklist_responses, ml_responses, log_rows = {}, {}, []
+
+        for normalized_phone, entry in fraud_entries.items():
+            blacklist_responses[normalized_phone] = {
+                "is_fraud": True,
+                "confidence": entry.confidence_score,
+                "category": entry.fraud_type.value,
+                "reason": f"Signalé {entry.report_count} fois",
+                "action": "block",
+                "similar_cases": entry.report_count,
+                "response_time_ms": elapsed_ms,
+            }
+            log_rows.append(
+                self._log_row(
+                    user_id,
+                    "phone",
+                    True,
+                    entry.confidence_score,
+                    "blacklist",
+                    elapsed_ms,
+                    meta_data={"phone": normalized_phone, "country": country},
+                )
+            )
+
+        remaining = [n for n in misses if n not in fraud_entries]
+        predictions = ml_service.predict_phone_batch(
+            [unique[n] for n in remaining], {"hour": 14, "call_count": 1}
+        )
+        for normalized_phone, (is_fraud, confidence) in zip(remaining, predictions):
+            ml_responses[normalized_phone] = {
+                "is_fraud": is_fraud,
+                "confidence": confidence,
+                "category": "suspected_scam" if is_fraud else None,
+                "reason": "Analyse ML" if is_fraud else "Numéro non signalé",
+                "action": "block" if is_fraud else "allow",
+                "similar_cases": 0,
+                "response_time_ms": elapsed_ms,
+            }
+            log_rows.append(
+                self._log_row(
+                    user_id,
+                    "phone",
+                    is_fraud,
+                    confidence,
+                    "ml",
+                    elapsed_ms,
+                    meta_data={"phone": normalized_phone, "country": country},
+                )
+            )
+
+        await cache_service.set_many(
+            {f"phone:{n}": r for n, r in blacklist_responses.items()}, expire=7200
+        )
+        await cache_service.set_many(
+            {f"phone:{n}": r for n, r in ml_responses.items()}, expire=3600
         )
+        await self._log_detections(db, log_rows)
 
-        return response
+        responses.update(blacklist_responses)
+        responses.update(ml_responses)
+
+        results = []
+        for phone, normalized_phone in zip(phones, normalized):
+            item = {k: v for k, v in responses[normalized_phone].items() if k != "response_time_ms"}
+            results.append({"phone": phone, "normalized_phone": normalized_phone, **item})
+
+        return {
+            "results": results,
+            "total": len(results),
+            "fraud_count": sum(1 for r in results if r["is_fraud"]),
+            "response_time_ms": int((time.time() - start_time) * 1000),
+        }
 
     async def check_sms(
         self, db: AsyncSession, content: str, sender: str, user_id: Optional[str] = None
     ) -> dict:
-        start_time = time.time()
+        ctx = DetectionContext("sms", user_id, content=content, sender=sender)
+        ctx.db = db
+        await self.sms_pipeline.run(ctx)
+        return DetectionPipeline.response(ctx)
+
+    async def _sms_rules(self, ctx: DetectionContext):
+        # Règles d'abord : une règle sévère suffit, sans passer par le modèle
+        rule_matches = sms_rule_engine.match(ctx.inputs["content"])
+        ctx.signals["rule_matches"] = rule_matches
+        if self._rules_block(rule_matches):
+            ctx.stop(method="rules")
+
+    async def _sms_ml(self, ctx: DetectionContext):
+        ctx.signals["prediction"] = await inference_executor.predict_sms(
+            ctx.inputs["content"], ctx.inputs["sender"]
+        )
 
-        is_fraud, confidence, risk_factors = ml_service.predict_sms(content, sender)
+    async def _sms_similarity(self, ctx: DetectionContext):
+        """SMS signalés et vérifiés proches (Qdrant), si le RAG est actif."""
+        if not (rag_service.enabled and embedding_service.enabled):
+            return
+        vector = await embedding_batcher.embed(ctx.inputs["content"])
+        if vector:
+            ctx.signals["similarity"] = await rag_service.check_similarity_fraud(vector)
+
+    async def _sms_verdict_stage(self, ctx: DetectionContext):
+        is_fraud, confidence, category, risk_factors, method = self._sms_verdict(
+            ctx.signals.get("rule_matches", []),
+            ctx.signals.get("prediction"),
+        )
+        similar_is_fraud, similar_frauds = ctx.signals.get("similarity", (False, 0))
+        if similar_frauds:
+            # Compte plafonné au minimum de la décision (check_similarity_fraud)
+            plus = "+" if similar_is_fraud else ""
+            risk_factors.append(f"{similar_frauds}{plus} SMS similaires signalés")
+        if similar_is_fraud and not is_fraud:
+            is_fraud, category, method = True, "phishing", "rag"
+            confidence = max(confidence, settings.FRAUD_CONFIDENCE_THRESHOLD)
+
+        ctx.method = method
+        ctx.result = {
+            "is_fraud": is_fraud,
+            "confidence": confidence,
+            "category": category,
+            "risk_factors": risk_factors,
+            "action": "block_link" if is_fraud else "allow",
+            "similar_frauds": similar_frauds,
+        }
 
-        if is_fraud:
+    async def _sms_report(self, ctx: DetectionContext):
+        if not ctx.result["is_fraud"]:
+            return
+        db, sender, confidence = ctx.db, ctx.inputs["sender"], ctx.result["confidence"]
+        try:
+            normalized_sender = normalize_phone_number(sender)
+            result_fn = await db.execute(
+                select(FraudulentNumber).where(FraudulentNumber.phone_number == normalized_sender)
+            )
+            existing_fn = result_fn.scalar_one_or_none()
+
+            if existing_fn:
+                existing_fn.report_count += 1
+                existing_fn.last_reported = datetime.utcnow()
+                if confidence > existing_fn.confidence_score:
+                    existing_fn.confidence_score = confidence
+            else:
+                new_fn = FraudulentNumber(
+                    phone_number=normalized_sender,
+                    country_code=self._sender_country(sender),
+                    fraud_type=FraudType.PHISHING,
+                    confidence_score=confidence,
+                    source="ai_detection",
+                    report_count=1
+                )
+                db.add(new_fn)
+            await db.commit()
+            await blacklist_index.propagate("add", normalized_sender)
+        except Exception as e:
+            logging.exception("Failed to auto-report fraudulent SMS sender: %s", e)
+            await db.rollback()
+
+    async def check_sms_batch(
+        self, db: AsyncSession, messages: List[dict], user_id: Optional[str] = None
+    ) -> dict:
+        """
+        Analyse d'un lot de SMS : une seule prédiction vectorisée, un upsert groupé
+        des expéditeurs frauduleux (une requête IN + un commit) et un INSERT
+        multi-lignes des logs.
+        """
+        start_time = time.time()
+
+        rule_matches = [sms_rule_engine.match(m["content"]) for m in messages]
+        to_predict = [i for i, matches in enumerate(rule_matches) if not self._rules_block(matches)]
+        predictions = [None] * len(messages)
+        if to_predict:
+            batch = await inference_executor.predict_sms_batch(
+                [messages[i]["content"] for i in to_predict]
+            )
+            for i, prediction in zip(to_predict, batch):
+                predictions[i] = prediction
+        verdicts = [
+            self._sms_verdict(matches, prediction)
+            for matches, prediction in zip(rule_matches, predictions)
+        ]
+
+        # Expéditeur normalisé -> (nombre de SMS frauduleux, confiance max, expéditeur brut)
+        fraud_senders = {}
+        for message, (is_fraud, confidence, *_) in zip(messages, verdicts):
+            if not is_fraud:
+                continue
+            normalized_sender = normalize_phone_number(message["sender"])
+            count, best, raw = fraud_senders.get(normalized_sender, (0, 0.0, message["sender"]))
+            fraud_senders[normalized_sender] = (count + 1, max(best, confidence), raw)
+
+        if fraud_senders:
             try:
-                normalized_sender = normalize_phone_number(sender)
                 result_fn = await db.execute(
-                    select(FraudulentNumber).where(FraudulentNumber.phone_number == normalized_sender)
-                )
-                existing_fn = result_fn.scalar_one_or_none()
-
-                if existing_fn:
-                    existing_fn.report_count += 1
-                    existing_fn.last_reported = datetime.utcnow()
-                    if confidence > existing_fn.confidence_score:
-                        existing_fn.confidence_score = confidence
-                else:
-                    # Try to extract country from phone if parsed, else default to MG
-                    country_code = "MG"
-                    try:
-                        import phonenumbers
-                        parsed_sender = phonenumbers.parse(sender, "MG")
-                        country_code = phonenumbers.region_code_for_number(parsed_sender) or "MG"
-                    except Exception:
-                        pass
-
-                    new_fn = FraudulentNumber(
-                        phone_number=normalized_sender,
-                        country_code=country_code,
-                        fraud_type=FraudType.PHISHING,
-                        confidence_score=confidence,
-                        source="ai_detection",
-                        report_count=1
+                    select(FraudulentNumber).where(
+                        FraudulentNumber.phone_number.in_(list(fraud_senders))
                     )
-                    db.add(new_fn)
+                )
+                existing = {fn.phone_number: fn for fn in result_fn.scalars().all()}
+                now = datetime.utcnow()
+
+                for normalized_sender, (count, confidence, raw) in fraud_senders.items():
+                    existing_fn = existing.get(normalized_sender)
+                    if existing_fn:
+                        existing_fn.report_count += count
+                        existing_fn.last_reported = now
+                        if confidence > existing_fn.confidence_score:
+                            existing_fn.confidence_score = confidence
+                    else:
+                        db.add(
+                            FraudulentNumber(
+                                phone_number=normalized_sender,
+                                country_code=self._sender_country(raw),
+                                fraud_type=FraudType.PHISHING,
+                                confidence_score=confidence,
+                                source="ai_detection",
+                                report_count=count,
+                            )
+                        )
                 await db.commit()
+                for normalized_sender in fraud_senders:
+                    await blacklist_index.propagate("add", normalized_sender)
             except Exception as e:
-                logging.exception("Failed to auto-report fraudulent SMS sender: %s", e)
+                logging.exception("Failed to auto-report fraudulent SMS senders: %s", e)
                 await db.rollback()
 
-        response = {
-            "is_fraud": is_fraud,
-            "confidence": confidence,
-            "category": "phishing" if is_fraud else None,
-            "risk_factors": risk_factors,
-            "action": "block_link" if is_fraud else "allow",
-            "similar_frauds": 0,
-            "response_time_ms": int((time.time() - start_time) * 1000),
-        }
+        elapsed_ms = int((time.time() - start_time) * 1000)
+        results, log_rows = [], []
+        for message, (is_fraud, confidence, category, risk_factors, method) in zip(messages, verdicts):
+            results.append(
+                {
+                    "is_fraud": is_fraud,
+                    "confidence": confidence,
+                    "category": category,
+                    "risk_factors": risk_factors,
+                    "action": "block_link" if is_fraud else "allow",
+                    "similar_frauds": 0,
+                }
+            )
+            log_rows.append(
+                self._log_row(
+                    user_id,
+                    "sms",
+                    is_fraud,
+                    confidence,
+                    method,
+                    elapsed_ms,
+                    meta_data={
+                        "content": message["content"][:500],
+                        "sender": message["sender"],
+                        "category": category or "unknown",
+                    },
+                )
+            )
 
-        await self._log_detection(
-            db,
-            user_id,
-            "sms",
-            is_fraud,
-            confidence,
-            "ml_rag",
-            int((time.time() - start_time) * 1000),
-            meta_data={
-                "content": content[:500],
-                "sender": sender,
-                "category": "phishing" if is_fraud else "unknown",
-            },
-        )
+        await self._log_detections(db, log_rows)
 
-        return response
+        return {
+            "results": results,
+            "total": len(results),
+            "fraud_count": sum(1 for r in results if r["is_fraud"]),
+            "response_time_ms": int((time.time() - start_time) * 1000),
+        }
 
     async def check_email(
         self,
@@ -164,113 +476,132 @@ class DetectionService:
         body: str,
         user_id: Optional[str] = None,
     ) -> dict:
-        start_time = time.time()
-
-        domain = sender.split("@")[1] if "@" in sender else ""
+        ctx = DetectionContext(
+            "email",
+            user_id,
+            sender=sender,
+            subject=subject,
+            body=body,
+            domain=sender.split("@")[1] if "@" in sender else "",
+        )
+        ctx.db = db
+        await self.email_pipeline.run(ctx)
+        return DetectionPipeline.response(ctx)
 
-        result = await db.execute(
-            select(FraudulentDomain).where(FraudulentDomain.domain == domain)
+    async def _email_domain(self, ctx: DetectionContext):
+        result = await ctx.db.execute(
+            select(FraudulentDomain).where(FraudulentDomain.domain == ctx.inputs["domain"])
         )
         fraud_domain = result.scalar_one_or_none()
-
         if fraud_domain:
-            response = {
-                "is_fraud": True,
-                "confidence": fraud_domain.reputation_score,
-                "phishing_type": fraud_domain.phishing_type,
-                "risk_factors": ["Domaine signalé comme frauduleux"],
-                "sender_verified": False,
-                "spf_valid": fraud_domain.spf_valid,
-                "dkim_valid": fraud_domain.dkim_valid,
-                "action": "block",
-                "response_time_ms": int((time.time() - start_time) * 1000),
-            }
-            await self._log_detection(
-                db,
-                user_id,
-                "email",
-                True,
-                fraud_domain.reputation_score,
-                "blacklist",
-                int((time.time() - start_time) * 1000),
-                meta_data={
-                    "sender": sender,
-                    "subject": subject,
-                    "has_attachment": False,
+            ctx.stop(
+                {
+                    "is_fraud": True,
+                    "confidence": fraud_domain.reputation_score,
+                    "phishing_type": fraud_domain.phishing_type,
+                    "risk_factors": ["Domaine signalé comme frauduleux"],
+                    "sender_verified": False,
+                    "spf_valid": fraud_domain.spf_valid,
+                    "dkim_valid": fraud_domain.dkim_valid,
+                    "action": "block",
                 },
+                "blacklist",
             )
-            return response
 
-        is_fraud, confidence = ml_service.predict_email(sender, subject, body)
+    async def _email_ml(self, ctx: DetectionContext):
+        ctx.signals["prediction"] = await inference_executor.predict_email(
+            ctx.inputs["sender"], ctx.inputs["subject"], ctx.inputs["body"]
+        )
 
-        spf_valid = False
-        try:
-            answers = dns.resolver.resolve(domain, "TXT")
-            for rdata in answers:
-                if "v=spf1" in str(rdata):
-                    spf_valid = True
-                    break
-        except Exception:
-            spf_valid = False
+    async def _email_spf(self, ctx: DetectionContext):
+        ctx.signals["spf_valid"] = await dns_service.check_spf(ctx.inputs["domain"])
+
+    async def _email_verdict(self, ctx: DetectionContext):
+        if ctx.result is not None:
+            return
+        risk_factors = []
+        prediction = ctx.signals.get("prediction")
+        if prediction is None:
+            prediction = (False, 0.0)
+            risk_factors.append("Analyse ML indisponible")
+        is_fraud, confidence = prediction
+        # SPF non vérifié dans le budget : traité comme absent, comme un échec DNS
+        spf_valid = ctx.signals.get("spf_valid", False)
 
         if is_fraud:
-            try:
-                result_fd = await db.execute(
-                    select(FraudulentDomain).where(FraudulentDomain.domain == domain)
-                )
-                existing_fd = result_fd.scalar_one_or_none()
-
-                if existing_fd:
-                    existing_fd.blocked_count += 1
-                    if confidence > existing_fd.reputation_score:
-                        existing_fd.reputation_score = confidence
-                else:
-                    new_fd = FraudulentDomain(
-                        domain=domain,
-                        phishing_type="suspected",
-                        spf_valid=spf_valid,
-                        dkim_valid=False,
-                        reputation_score=confidence,
-                        blocked_count=1
-                    )
-                    db.add(new_fd)
-                await db.commit()
-            except Exception as e:
-                logging.exception("Failed to auto-report fraudulent email domain: %s", e)
-                await db.rollback()
+            risk_factors.insert(0, "Contenu suspect")
+        if not spf_valid:
+            risk_factors.append("Absence de protection SPF sur le domaine")
 
-        response = {
+        ctx.method = "ml"
+        ctx.result = {
             "is_fraud": is_fraud,
             "confidence": confidence,
             "phishing_type": "suspected" if is_fraud else None,
-            "risk_factors": ["Contenu suspect"] if is_fraud else [],
+            "risk_factors": risk_factors,
             "sender_verified": spf_valid,
             "spf_valid": spf_valid,
             "dkim_valid": False,
             "action": "warn" if is_fraud or not spf_valid else "allow",
-            "response_time_ms": int((time.time() - start_time) * 1000),
         }
 
-        if not spf_valid:
-            response["risk_factors"].append("Absence de protection SPF sur le domaine")
+    async def _email_report(self, ctx: DetectionContext):
+        if ctx.method != "ml" or not ctx.result["is_fraud"]:
+            return
+        db, domain, confidence = ctx.db, ctx.inputs["domain"], ctx.result["confidence"]
+        try:
+            result_fd = await db.execute(
+                select(FraudulentDomain).where(FraudulentDomain.domain == domain)
+            )
+            existing_fd = result_fd.scalar_one_or_none()
+
+            if existing_fd:
+                existing_fd.blocked_count += 1
+                if confidence > existing_fd.reputation_score:
+                    existing_fd.reputation_score = confidence
+            else:
+                new_fd = FraudulentDomain(
+                    domain=domain,
+                    phishing_type="suspected",
+                    spf_valid=ctx.result["spf_valid"],
+                    dkim_valid=False,
+                    reputation_score=confidence,
+                    blocked_count=1
+                )
+                db.add(new_fd)
+            await db.commit()
+        except Exception as e:
+            logging.exception("Failed to auto-report fraudulent email domain: %s", e)
+            await db.rollback()
 
-        await self._log_detection(
-            db,
-            user_id,
-            "email",
-            is_fraud,
-            confidence,
-            "ml",
-            int((time.time() - start_time) * 1000),
-            meta_data={
-                "sender": sender,
-                "subject": subject,
+    async def _log_stage(self, ctx: DetectionContext):
+        if ctx.kind == "phone":
+            meta_data = {"phone": ctx.inputs["normalized_phone"], "country": ctx.inputs["country"]}
+        elif ctx.kind == "sms":
+            meta_data = {
+                "content": ctx.inputs["content"][:500],
+                "sender": ctx.inputs["sender"],
+                "category": ctx.result.get("category") or "unknown",
+            }
+        else:
+            meta_data = {
+                "sender": ctx.inputs["sender"],
+                "subject": ctx.inputs["subject"],
                 "has_attachment": False,
-            },
+            }
+        if ctx.degraded:
+            meta_data["degraded_stages"] = list(ctx.degraded)
+        await self._log_detection(
+            ctx.db,
+            ctx.user_id,
+            ctx.kind,
+            ctx.result["is_fraud"],
+            ctx.result["confidence"],
+            ctx.method,
+            ctx.elapsed_ms(),
+            meta_data=meta_data,
         )
 
-        return response
-
     async def _log_detection(
         self,
         db: AsyncSession,
@@ -282,21 +613,95 @@ class DetectionService:
         response_time: int,
         meta_data: Optional[dict] = None,
     ):
+        await self._log_detections(
+            db,
+            [
+                self._log_row(
+                    user_id,
+                    detection_type,
+                    is_fraud,
+                    confidence,
+                    method,
+                    response_time,
+                    meta_data=meta_data,
+                )
+            ],
+        )
+
+    @staticmethod
+    def _rules_block(rule_matches: List[RuleMatch]) -> bool:
+        return bool(rule_matches) and rule_matches[0].severity >= settings.SMS_RULES_BLOCK_SEVERITY
+
+    @staticmethod
+    def _sms_verdict(
+        rule_matches: List[RuleMatch], prediction: Optional[tuple]
+    ) -> Tuple[bool, float, Optional[str], List[str], str]:
+        """
+        Combine règles et modèle -> (is_fraud, confiance, catégorie, facteurs, méthode).
+        prediction vaut None quand une règle sévère a court-circuité le modèle,
+        ou quand le modèle n'a pas répondu dans son budget (verdict des règles seules).
+        """
+        rule_factors = [match.describe() for match in rule_matches]
+        if prediction is None:
+            if not rule_matches:
+                return False, 0.0, None, ["Analyse ML indisponible"], "rules"
+            top = rule_matches[0]
+            return True, top.confidence, top.category or "phishing", rule_factors, "rules"
+
+        is_fraud, confidence, risk_factors = prediction
+        category = None
+        if is_fraud:
+            category = rule_matches[0].category if rule_matches else "phishing"
+        return is_fraud, confidence, category, rule_factors + risk_factors, "ml_rag"
+
+    @staticmethod
+    def _sender_country(sender: str) -> str:
+        """Try to extract country from phone if parsed, else default to MG."""
         try:
-            log = DetectionLog(
-                user_id=user_id,
-                detection_type=detection_type,
-                is_fraud=is_fraud,
-                confidence=confidence,
-                method_used=method,
-                response_time_ms=response_time,
-                model_version="1.0",
-                meta_data=meta_data or {},
-            )
-            db.add(log)
+            parsed_sender = phonenumbers.parse(sender, "MG")
+            return phonenumbers.region_code_for_number(parsed_sender) or "MG"
+        except Exception:
+            return "MG"
+
+    @staticmethod
+    def _log_row(
+        user_id: Optional[str],
+        detection_type: str,
+        is_fraud: bool,
+        confidence: float,
+        method: str,
+        response_time: int,
+        meta_data: Optional[dict] = None,
+    ) -> dict:
+        return {
+            "user_id": user_id,
+            "detection_type": detection_type,
+            "is_fraud": is_fraud,
+            "confidence": confidence,
+            "method_used": method,
+            "response_time_ms": response_time,
+            "timestamp": datetime.utcnow(),
+            "model_version": ml_service.version,
+            "meta_data": meta_data or {},
+        }
+
+    async def _log_detections(self, db: AsyncSession, rows: List[dict]):
+        """
+        Les logs passent par le sink write-behind (aucun commit sur le chemin
+        de la requête). Sans sink actif (Celery, scripts), insertion groupée directe.
+        """
+        if not rows:
+            return
+        if detection_log_sink.running:
+            if not await detection_log_sink.enqueue(rows):
+                # Lignes perdues, visibles dans detection_logs.dropped (/analytics/health)
+                logging.error("Detection logs dropped: write-behind buffer full")
+            return
+        try:
+            await db.execute(insert(DetectionLog), rows)
             await db.commit()
         except SQLAlchemyError as e:
-            logging.exception("Failed to log detection: %s", e)
+            logging.exception("Failed to log detections: %s", e)
             await db.rollback()
 
 
@@ -0,0 +1,431 @@
+"""
+Moteur de règles SMS compilé à partir de la table fraudulent_sms_patterns.
+
+Toutes les règles sont compilées ensemble :
+- les mots-clés et le préfixe littéral des regex dans un seul automate
+  Aho-Corasick (un passage sur le message, quel que soit le nombre de règles) ;
+  une regex n'est évaluée que si son préfixe apparaît dans le message ;
+- les regex sans préfixe littéral et sans groupes dans une seule alternance,
+  un groupe nommé par règle : un passage (finditer) donne les positions où une
+  règle commence et laquelle (lastgroup) ; à chacune, un second motif (une
+  assertion optionnelle par règle) relève les autres règles qui y commencent.
+  Le moteur re de Python essaie chaque branche de l'alternance à chaque
+  position : ce passage reste linéaire en nombre de règles, d'où le préfiltre
+  littéral pour toutes celles qui en ont un ;
+- les regex à groupes sans préfixe (références arrière numérotées) sont
+  évaluées une à une.
+
+Le moteur est reconstruit quand la table change (empreinte vérifiée
+périodiquement + notification pub/sub) et les detection_count sont cumulés en
+mémoire puis écrits par paquets.
+"""
+
+import asyncio
+import hashlib
+import logging
+import re
+from collections import Counter
+from itertools import compress, repeat
+from operator import is_not
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, select, update
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.fraud import FraudulentSMSPattern
+from app.services.cache import cache_service
+
+logger = logging.getLogger(__name__)
+
+# Canal pub/sub : la table a été modifiée, recompiler
+RULES_CHANNEL = "sms_rules:reload"
+
+# Préfixe littéral plus court : trop fréquent pour filtrer quoi que ce soit
+MIN_LITERAL = 3
+_REGEX_META = set(".^$*+?{}[]\\|()")
+
+
+def _fold(text: str) -> str:
+    """casefold, plus ı -> i : re.IGNORECASE rapproche ı de i, pas casefold."""
+    return text.casefold().replace("ı", "i")
+
+
+def _literal_prefix(pattern: str) -> str:
+    """Littéral par lequel toute correspondance commence ('' si incertain)."""
+    if "|" in pattern:
+        return ""
+    chars = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            # \. \- ... sont des littéraux ; \d \w \b ... ne le sont pas
+            if i + 1 == len(pattern) or pattern[i + 1].isalnum():
+                break
+            char, step = pattern[i + 1], 2
+        elif char in _REGEX_META:
+            break
+        else:
+            step = 1
+        if pattern[i + step : i + step + 1] in ("?", "*", "{"):
+            # Caractère optionnel ou répété : le préfixe s'arrête avant
+            break
+        chars.append(char)
+        i += step
+    return _fold("".join(chars))
+
+
+@dataclass(frozen=True)
+class SMSRule:
+    pattern_id: int
+    category: Optional[str]
+    severity: int
+    keywords: Tuple[str, ...]
+    regex: Optional[str]
+
+
+@dataclass
+class RuleMatch:
+    pattern_id: int
+    category: Optional[str]
+    severity: int
+    keywords: List[str] = field(default_factory=list)
+    regex: bool = False
+
+    @property
+    def confidence(self) -> float:
+        return min(self.severity / 10, 0.99)
+
+    def describe(self) -> str:
+        if self.keywords:
+            return f"Règle {self.category or self.pattern_id} : {', '.join(self.keywords)}"
+        return f"Règle {self.category or self.pattern_id} : motif suspect"
+
+
+class AhoCorasick:
+    """Automate Aho-Corasick sur des mots-clés déjà normalisés (casefold)."""
+
+    def __init__(self, words: List[str]):
+        self.words = words
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+
+        for word_id, word in enumerate(words):
+            state = 0
+            for char in word:
+                nxt = self._goto[state].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                state = nxt
+            self._out[state] += (word_id,)
+
+        # Liens d'échec en largeur ; les sorties héritent de celles du lien
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] += self._out[self._fail[nxt]]
+
+    def __len__(self) -> int:
+        return len(self._goto)
+
+    def find(self, text: str):
+        """Itère sur (word_id, position de fin) pour chaque occurrence."""
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                for word_id in out[state]:
+                    yield word_id, i
+
+
+class CompiledRules:
+    """Ensemble de règles compilé, immuable (remplacé en bloc au rechargement)."""
+
+    def __init__(self, rules: List[SMSRule], min_keywords: int):
+        self.rules = {rule.pattern_id: rule for rule in rules}
+
+        word_ids: Dict[str, int] = {}
+        # Par mot de l'automate : règles dont c'est un mot-clé / le préfixe de la regex
+        self._word_rules: List[List[int]] = []
+        self._literal_rules: List[List[int]] = []
+
+        def word(text: str) -> int:
+            word_id = word_ids.setdefault(text, len(word_ids))
+            if word_id == len(self._word_rules):
+                self._word_rules.append([])
+                self._literal_rules.append([])
+            return word_id
+
+        self._required: Dict[int, int] = {}
+        for rule in rules:
+            if not rule.keywords:
+                continue
+            self._required[rule.pattern_id] = min(min_keywords, len(rule.keywords))
+            for keyword in rule.keywords:
+                self._word_rules[word(_fold(keyword))].append(rule.pattern_id)
+
+        self._regexes: Dict[int, re.Pattern] = {}
+        plain: List[Tuple[int, re.Pattern]] = []
+        self._grouped: List[Tuple[int, re.Pattern]] = []
+        for rule in rules:
+            if not rule.regex:
+                continue
+            try:
+                compiled = re.compile(rule.regex, re.IGNORECASE)
+            except re.error as e:
+                logger.warning("Invalid regex for SMS pattern %s: %s", rule.pattern_id, e)
+                continue
+            literal = _literal_prefix(rule.regex)
+            if len(literal) >= MIN_LITERAL:
+                self._regexes[rule.pattern_id] = compiled
+                self._literal_rules[word(literal)].append(rule.pattern_id)
+            elif compiled.groups == 0:
+                plain.append((rule.pattern_id, compiled))
+            else:
+                self._grouped.append((rule.pattern_id, compiled))
+        self._automaton = AhoCorasick(list(word_ids))
+
+        self._scan: Optional[re.Pattern] = None
+        self._at: Optional[re.Pattern] = None
+        self._scan_ids: Tuple[int, ...] = tuple(pattern_id for pattern_id, _ in plain)
+        if plain:
+            try:
+                # Assertion avant : chaque position de départ est essayée, même
+                # à l'intérieur d'une occurrence déjà trouvée
+                self._scan = re.compile(
+                    "(?=" + "|".join(f"(?P<r{pid}>{rx.pattern})" for pid, rx in plain) + ")",
+                    re.IGNORECASE,
+                )
+                self._at = re.compile(
+                    "".join(f"(?:(?=({rx.pattern})))?" for _, rx in plain), re.IGNORECASE
+                )
+            except re.error as e:
+                # Motif valide seul mais pas dans l'ensemble (drapeaux globaux en ligne...)
+                logger.warning("SMS regexes cannot be combined, evaluated one by one: %s", e)
+                self._scan = self._at = None
+                self._scan_ids = ()
+                self._grouped = plain + self._grouped
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def _scan_matches(self, content: str) -> set:
+        """Règles de l'alternance qui correspondent au message."""
+        found = set()
+        total = len(self._scan_ids)
+        for m in self._scan.finditer(content):
+            found.add(int(m.lastgroup[1:]))
+            if len(found) == total:
+                break
+            # Les règles placées après celle-ci dans l'alternance peuvent
+            # commencer au même endroit : toutes relevées en un appel
+            captured = self._at.match(content, m.start()).groups()
+            found.update(compress(self._scan_ids, map(is_not, captured, repeat(None))))
+            if len(found) == total:
+                break
+        return found
+
+    def match(self, content: str) -> List[RuleMatch]:
+        text = _fold(content)
+        words = self._automaton.words
+        found: Dict[int, set] = {}
+        regex_candidates = set()
+        for word_id, end in self._automaton.find(text):
+            regex_candidates.update(self._literal_rules[word_id])
+            pattern_ids = self._word_rules[word_id]
+            if not pattern_ids:
+                continue
+            start = end - len(words[word_id]) + 1
+            # Mot entier uniquement : "prix" ne doit pas matcher "surprix"
+            if start > 0 and text[start - 1].isalnum():
+                continue
+            if end + 1 < len(text) and text[end + 1].isalnum():
+                continue
+            for pattern_id in pattern_ids:
+                found.setdefault(pattern_id, set()).add(words[word_id])
+
+        matches: Dict[int, RuleMatch] = {}
+        for pattern_id, keywords in found.items():
+            if len(keywords) >= self._required[pattern_id]:
+                rule = self.rules[pattern_id]
+                matches[pattern_id] = RuleMatch(
+                    pattern_id, rule.category, rule.severity, sorted(keywords)
+                )
+
+        regex_hits = {pid for pid in regex_candidates if self._regexes[pid].search(content)}
+        if self._scan is not None:
+            regex_hits |= self._scan_matches(content)
+        regex_hits.update(pid for pid, regex in self._grouped if regex.search(content))
+        for pattern_id in regex_hits:
+            rule = self.rules[pattern_id]
+            match = matches.setdefault(
+                pattern_id, RuleMatch(pattern_id, rule.category, rule.severity)
+            )
+            match.regex = True
+
+        return sorted(matches.values(), key=lambda m: (-m.severity, m.pattern_id))
+
+
+def _rule_from_row(row) -> SMSRule:
+    keywords = tuple(
+        sorted({str(k).strip().casefold() for k in (row.keywords or []) if str(k).strip()})
+    )
+    return SMSRule(
+        pattern_id=row.pattern_id,
+        category=row.fraud_category,
+        severity=row.severity if row.severity is not None else 5,
+        keywords=keywords,
+        regex=row.regex_pattern or None,
+    )
+
+
+def _fingerprint(rules: List[SMSRule]) -> str:
+    digest = hashlib.sha256()
+    for rule in rules:
+        digest.update(repr(rule).encode())
+    return digest.hexdigest()
+
+
+class SMSRuleEngine:
+    def __init__(self):
+        self._compiled = CompiledRules([], settings.SMS_RULES_MIN_KEYWORDS)
+        self._fingerprint: Optional[str] = None
+        self._hits: Counter = Counter()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._reload_lock = asyncio.Lock()
+        self.reloads = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._fingerprint is not None
+
+    def match(self, content: str) -> List[RuleMatch]:
+        """Toutes les règles qui correspondent au message, par sévérité décroissante."""
+        matches = self._compiled.match(content)
+        for match in matches:
+            self._hits[match.pattern_id] += 1
+        return matches
+
+    def load_rules(self, rules: List[SMSRule]) -> bool:
+        """Compile et active un jeu de règles. False s'il est identique à l'actuel."""
+        fingerprint = _fingerprint(rules)
+        if fingerprint == self._fingerprint:
+            return False
+        self._compiled = CompiledRules(rules, settings.SMS_RULES_MIN_KEYWORDS)
+        self._fingerprint = fingerprint
+        self.reloads += 1
+        return True
+
+    async def reload(self):
+        async with self._reload_lock:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    select(FraudulentSMSPattern).order_by(FraudulentSMSPattern.pattern_id)
+                )
+                rules = [_rule_from_row(row) for row in result.scalars().all()]
+
+            fingerprint = _fingerprint(rules)
+            if fingerprint == self._fingerprint:
+                return
+            # Compilation hors boucle : plusieurs milliers de règles prennent du temps
+            compiled = await asyncio.to_thread(
+                CompiledRules, rules, settings.SMS_RULES_MIN_KEYWORDS
+            )
+            self._compiled = compiled
+            self._fingerprint = fingerprint
+            self.reloads += 1
+            logger.info("SMS rule engine compiled: %d rules", len(compiled))
+
+    async def notify_changed(self):
+        """
+        À appeler après modification de fraudulent_sms_patterns (scripts/seed_db.py) :
+        recompile ici et prévient les autres workers par pub/sub.
+        """
+        await self.reload()
+        await cache_service.publish(RULES_CHANNEL, {"fingerprint": self._fingerprint})
+
+    async def _on_message(self, data: dict):
+        if data.get("fingerprint") != self._fingerprint:
+            await self.reload()
+
+    async def flush(self):
+        """Écrit les detection_count cumulés (un UPDATE exécuté en lot)."""
+        if not self._hits:
+            return
+        hits, self._hits = self._hits, Counter()
+        table = FraudulentSMSPattern.__table__
+        stmt = (
+            update(table)
+            .where(table.c.pattern_id == bindparam("pid"))
+            .values(detection_count=table.c.detection_count + bindparam("hits"))
+        )
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(stmt, [{"pid": pid, "hits": n} for pid, n in hits.items()])
+                await db.commit()
+        except Exception as e:
+            # Remis au compteur pour la prochaine tentative
+            self._hits.update(hits)
+            logger.error("Failed to flush SMS rule detection counts: %s", e)
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(settings.SMS_RULES_REFRESH_SECONDS)
+            try:
+                await self.reload()
+            except Exception as e:
+                logger.error("SMS rule engine reload failed: %s", e)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(settings.SMS_RULES_FLUSH_SECONDS)
+            await self.flush()
+
+    async def start(self):
+        await cache_service.subscribe(RULES_CHANNEL, self._on_message)
+        try:
+            await self.reload()
+        except Exception as e:
+            logger.error("Could not load SMS rules: %s", e)
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        for task in (self._refresh_task, self._flush_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._refresh_task = self._flush_task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "rules": len(self._compiled),
+            "reloads": self.reloads,
+            "pending_hits": sum(self._hits.values()),
+        }
+
+
+sms_rule_engine = SMSRuleEngine()
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+import dns.asyncresolver
+import dns.exception
+import dns.resolver
+
+from app.core.config import settings
+from app.services.cache import cache_service
+
+logger = logging.getLogger(__name__)
+
+
+class DNSService:
+    """Résolution DNS asynchrone et mise en cache des vérifications SPF.
+
+    - cache en mémoire + Redis, TTL calqué sur celui de l'enregistrement TXT
+    - cache négatif (NXDOMAIN / pas de TXT) avec SPF_NEGATIVE_TTL
+    - budget de temps strict (SPF_LOOKUP_TIMEOUT) : un résolveur lent ne bloque plus le worker
+    - une seule requête DNS en vol par domaine, les appels concurrents l'attendent
+    """
+
+    def __init__(self, nameservers: Optional[List[str]] = None, port: Optional[int] = None):
+        # nameservers/port permettent de viser un résolveur local (tests, stub)
+        self.nameservers = nameservers if nameservers is not None else settings.DNS_NAMESERVERS
+        self.port = port or settings.DNS_PORT
+        self._resolver: Optional[dns.asyncresolver.Resolver] = None
+        self._local: Dict[str, Tuple[bool, float]] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _get_resolver(self) -> dns.asyncresolver.Resolver:
+        if self._resolver is None:
+            resolver = dns.asyncresolver.Resolver(configure=not self.nameservers)
+            if self.nameservers:
+                resolver.nameservers = list(self.nameservers)
+            resolver.port = self.port
+            resolver.lifetime = settings.SPF_LOOKUP_TIMEOUT
+            self._resolver = resolver
+        return self._resolver
+
+    async def check_spf(self, domain: str) -> bool:
+        """True si le domaine publie un enregistrement SPF (TXT v=spf1)."""
+        domain = (domain or "").strip().lower().rstrip(".")
+        if not domain:
+            return False
+
+        cached = self._local.get(domain)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+
+        remote = await cache_service.get(f"spf:{domain}")
+        if remote:
+            ttl = remote["expires_at"] - time.time()
+            if ttl > 0:
+                self._store_local(domain, remote["spf_valid"], ttl)
+                return remote["spf_valid"]
+
+        future = self._inflight.get(domain)
+        if future is None:
+            future = asyncio.ensure_future(self._lookup(domain))
+            self._inflight[domain] = future
+            future.add_done_callback(lambda _: self._inflight.pop(domain, None))
+        return await asyncio.shield(future)
+
+    async def _lookup(self, domain: str) -> bool:
+        try:
+            answer = await asyncio.wait_for(
+                self._get_resolver().resolve(domain, "TXT"),
+                timeout=settings.SPF_LOOKUP_TIMEOUT,
+            )
+        except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+            await self._store(domain, False, settings.SPF_NEGATIVE_TTL)
+            return False
+        except (asyncio.TimeoutError, dns.exception.DNSException) as e:
+            # Échec transitoire : pas de cache Redis, cache local court pour ne pas
+            # marteler un résolveur en difficulté
+            logger.warning("SPF lookup failed for %s: %r", domain, e)
+            self._store_local(domain, False, settings.SPF_ERROR_TTL)
+            return False
+
+        spf_valid = any("v=spf1" in str(rdata) for rdata in answer)
+        ttl = min(max(answer.rrset.ttl, settings.SPF_MIN_TTL), settings.SPF_MAX_TTL)
+        await self._store(domain, spf_valid, ttl)
+        return spf_valid
+
+    async def _store(self, domain: str, spf_valid: bool, ttl: int):
+        self._store_local(domain, spf_valid, ttl)
+        await cache_service.set(
+            f"spf:{domain}",
+            {"spf_valid": spf_valid, "expires_at": time.time() + ttl},
+            expire=int(ttl),
+        )
+
+    def _store_local(self, domain: str, spf_valid: bool, ttl: float):
+        if len(self._local) >= settings.SPF_LOCAL_CACHE_SIZE and domain not in self._local:
+            # Évince l'entrée la plus ancienne (ordre d'insertion)
+            self._local.pop(next(iter(self._local)))
+        self._local[domain] = (spf_valid, time.monotonic() + ttl)
+
+
+dns_service = DNSService()
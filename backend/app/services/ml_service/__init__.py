@@ -1 +1,3 @@
 from .service import ml_service
+from .executor import inference_executor
+from .registry import model_registry
@@ -0,0 +1,266 @@
+"""
+Évaluation des versions de modèles sur le holdout.
+
+La version active et les candidates (versions enregistrées après elle, non
+activées) sont chargées comme en production (MLService.load_bundle : mmap /
+forêt compilée selon la configuration) puis mesurées sur le même holdout :
+- qualité : accuracy, precision, recall, F1, matrice de confusion, rappel par
+  type de fraude ;
+- vitesse : latence p50/p99 d'un message seul, débit par lots ; avec une
+  cascade, part du trafic escaladé à la forêt et mesures de la forêt seule ;
+- coût : taille des artefacts sur disque, temps de chargement.
+
+Les résultats sont enregistrés dans ml_model_versions.metrics (liste des
+versions, dashboard admin) : une promotion compare vitesse et qualité.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import replace
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.ml.artifacts import MMAP_DIR
+from app.ml.dataset_store import is_holdout, training_store
+from app.models.ml_model import MLModelVersion
+from app.services.ml_service.registry import ARTIFACTS, OPTIONAL_ARTIFACTS, SMS_MODEL_TYPE
+from app.services.ml_service.service import MLService
+
+logger = logging.getLogger(__name__)
+
+# (content, is_fraud, fraud_type)
+HoldoutRow = Tuple[str, int, Optional[str]]
+
+
+def holdout_set(max_samples: int) -> List[HoldoutRow]:
+    """Messages du holdout (jamais appris), dans l'ordre du store."""
+    rows: List[HoldoutRow] = []
+    for batch in training_store.iter_batches():
+        for content, label, fraud_type in zip(
+            batch["content"].astype(str), batch["is_fraud"].astype(int), batch["fraud_type"]
+        ):
+            if is_holdout(content):
+                rows.append((content, int(label), fraud_type if isinstance(fraud_type, str) else None))
+                if len(rows) >= max_samples:
+                    return rows
+    return rows
+
+
+def _artifacts_size(path: Path) -> int:
+    files = [path / name for name in ARTIFACTS + OPTIONAL_ARTIFACTS if (path / name).exists()]
+    files += [f for f in (path / MMAP_DIR).glob("*") if f.is_file()]
+    return sum(f.stat().st_size for f in files)
+
+
+def _quality(holdout: List[HoldoutRow], predicted: np.ndarray) -> dict:
+    y_true = np.array([label for _, label, _ in holdout], dtype=bool)
+    tp = int(np.sum(predicted & y_true))
+    fp = int(np.sum(predicted & ~y_true))
+    fn = int(np.sum(~predicted & y_true))
+    tn = int(np.sum(~predicted & ~y_true))
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    by_fraud_type = {}
+    for fraud_type in sorted({t for _, label, t in holdout if label and t}):
+        mask = np.array([bool(label) and t == fraud_type for _, label, t in holdout])
+        by_fraud_type[fraud_type] = {
+            "samples": int(mask.sum()),
+            "recall": float(predicted[mask].mean()),
+        }
+    return {
+        "accuracy": (tp + tn) / len(holdout),
+        "precision": precision,
+        "recall": recall,
+        "f1_score": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        "true_positives": tp,
+        "false_positives": fp,
+        "false_negatives": fn,
+        "true_negatives": tn,
+        "by_fraud_type": by_fraud_type,
+    }
+
+
+def _predict_all(service: MLService, contents: List[str], batch_size: int) -> Tuple[np.ndarray, float]:
+    """Holdout complet par lots (chemin du micro-batching de l'API) : prédictions, durée."""
+    predicted = []
+    start = time.perf_counter()
+    for i in range(0, len(contents), batch_size):
+        predicted.extend(is_fraud for is_fraud, _, _ in service.predict_sms_batch(contents[i : i + batch_size]))
+    return np.array(predicted, dtype=bool), time.perf_counter() - start
+
+
+def _latencies_ms(service: MLService, contents: List[str]) -> dict:
+    """Un message par appel, comme une requête /sms/analyze isolée."""
+    service.predict_sms(contents[0], "")
+    timings = []
+    for content in contents:
+        start = time.perf_counter()
+        service.predict_sms(content, "")
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "latency_p50_ms": float(np.percentile(timings, 50)),
+        "latency_p99_ms": float(np.percentile(timings, 99)),
+    }
+
+
+def evaluate_path(
+    path: Path,
+    holdout: List[HoldoutRow],
+    latency_samples: int = 200,
+    batch_size: int = 32,
+) -> dict:
+    """Charge une version depuis son dossier et la mesure sur le holdout."""
+    start = time.perf_counter()
+    bundle = MLService.load_bundle(path)
+    load_ms = (time.perf_counter() - start) * 1000
+    service = MLService()
+    service.activate(bundle)
+    contents = [content for content, _, _ in holdout]
+
+    predicted, batch_s = _predict_all(service, contents, batch_size)
+    cascade = service.stats()
+    metrics = {
+        **_quality(holdout, predicted),
+        **_latencies_ms(service, contents[:latency_samples]),
+        "throughput_per_s": len(contents) / batch_s if batch_s else None,
+        "batch_size": batch_size,
+        "escalation_rate": cascade["escalation_rate"] if cascade["cascade"] else None,
+        "size_bytes": _artifacts_size(path),
+        "load_time_ms": load_ms,
+        "n_samples_test": len(holdout),
+        "model_class": type(bundle.sms_model).__name__,
+        "evaluated_at": datetime.utcnow().isoformat(),
+    }
+
+    if bundle.fast_model is not None:
+        # Même version sans cascade : ce que la cascade fait gagner (ou perdre)
+        forest = MLService()
+        forest.activate(replace(bundle, fast_model=None, cascade_band=None))
+        forest_predicted, forest_s = _predict_all(forest, contents, batch_size)
+        metrics["forest_only"] = {
+            "accuracy": _quality(holdout, forest_predicted)["accuracy"],
+            **_latencies_ms(forest, contents[:latency_samples]),
+            "throughput_per_s": len(contents) / forest_s if forest_s else None,
+        }
+    return metrics
+
+
+async def _versions_to_evaluate(db: AsyncSession, max_candidates: int) -> List[MLModelVersion]:
+    """Version active + candidates plus récentes (ou les plus récentes sans version active)."""
+    result = await db.execute(
+        select(MLModelVersion)
+        .where(MLModelVersion.model_type == SMS_MODEL_TYPE)
+        .where(MLModelVersion.is_active.is_(True))
+        .order_by(MLModelVersion.version_id.desc())
+        .limit(1)
+    )
+    active = result.scalar_one_or_none()
+    query = (
+        select(MLModelVersion)
+        .where(MLModelVersion.model_type == SMS_MODEL_TYPE)
+        .where(MLModelVersion.is_active.is_(False))
+        .order_by(MLModelVersion.version_id.desc())
+        .limit(max_candidates)
+    )
+    if active is not None:
+        query = query.where(MLModelVersion.version_id > active.version_id)
+    candidates = list((await db.execute(query)).scalars().all())
+    return ([active] if active is not None else []) + candidates
+
+
+async def run_evaluation(version_ids: Optional[List[int]] = None) -> dict:
+    """
+    Évalue la version active et les candidates (ou les versions demandées) et
+    enregistre les mesures dans ml_model_versions.metrics.
+    """
+    holdout = await asyncio.to_thread(holdout_set, settings.ML_EVAL_HOLDOUT_MAX)
+    if not holdout:
+        return {"skipped": True, "reason": "empty holdout"}
+
+    results = {}
+    async with AsyncSessionLocal() as db:
+        if version_ids:
+            rows = [row for row in [await db.get(MLModelVersion, v) for v in version_ids] if row is not None]
+        else:
+            rows = await _versions_to_evaluate(db, settings.ML_EVAL_MAX_CANDIDATES)
+        for row in rows:
+            try:
+                # CPU : hors boucle, une version à la fois (latences non perturbées)
+                metrics = await asyncio.to_thread(
+                    evaluate_path,
+                    Path(row.model_path),
+                    holdout,
+                    settings.ML_EVAL_LATENCY_SAMPLES,
+                    settings.ML_EVAL_BATCH_SIZE,
+                )
+            except Exception as e:
+                logger.error("Could not evaluate ML model version %s: %s", row.version_id, e)
+                results[row.version_id] = {"error": str(e)}
+                continue
+            row.metrics = metrics
+            results[row.version_id] = metrics
+        await db.commit()
+
+    logger.info("Evaluated ML model versions %s on %d holdout messages", list(results), len(holdout))
+    return {"holdout_size": len(holdout), "versions": results}
+
+
+def _summary(row: MLModelVersion) -> dict:
+    metrics = row.metrics or {}
+    return {
+        "version_id": row.version_id,
+        "is_active": row.is_active,
+        "training_date": row.training_date.isoformat() if row.training_date else None,
+        **{
+            key: metrics.get(key)
+            for key in (
+                "accuracy",
+                "precision",
+                "recall",
+                "f1_score",
+                "latency_p50_ms",
+                "latency_p99_ms",
+                "throughput_per_s",
+                "escalation_rate",
+                "size_bytes",
+                "load_time_ms",
+                "evaluated_at",
+            )
+        },
+    }
+
+
+async def dashboard_quality(db: AsyncSession) -> dict:
+    """Bloc `quality` du dashboard : dernière évaluation de la version active + candidates."""
+    rows = await _versions_to_evaluate(db, settings.ML_EVAL_MAX_CANDIDATES)
+    active = rows[0] if rows and rows[0].is_active else None
+    metrics = (active.metrics or {}) if active is not None else {}
+    return {
+        "model_version": active.version_id if active is not None else None,
+        "evaluated_at": metrics.get("evaluated_at"),
+        "n_samples_test": metrics.get("n_samples_test"),
+        "true_positives": metrics.get("true_positives"),
+        "false_positives": metrics.get("false_positives"),
+        "false_negatives": metrics.get("false_negatives"),
+        "true_negatives": metrics.get("true_negatives"),
+        "precision": metrics.get("precision"),
+        "recall": metrics.get("recall"),
+        "f1_score": metrics.get("f1_score"),
+        "accuracy": metrics.get("accuracy"),
+        "by_fraud_type": metrics.get("by_fraud_type", {}),
+        "latency_p50_ms": metrics.get("latency_p50_ms"),
+        "latency_p99_ms": metrics.get("latency_p99_ms"),
+        "throughput_per_s": metrics.get("throughput_per_s"),
+        "escalation_rate": metrics.get("escalation_rate"),
+        "size_bytes": metrics.get("size_bytes"),
+        "load_time_ms": metrics.get("load_time_ms"),
+        "candidates": [_summary(row) for row in rows if not row.is_active],
+    }
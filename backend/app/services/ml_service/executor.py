@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.ml_service.service import ml_service
+
+logger = logging.getLogger(__name__)
+
+# Bornes des tranches de l'histogramme des tailles de batch
+_BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+# Marqueur d'arrêt déposé dans la file par stop()
+_STOP = object()
+
+
+class InferenceExecutor:
+    """Exécute l'inférence ML hors de la boucle asyncio.
+
+    Les prédictions tournent dans un pool de threads dédié. Les requêtes qui
+    arrivent à quelques millisecondes d'intervalle sont regroupées en un seul
+    appel predict_proba (micro-batching), borné par ML_INFERENCE_MAX_BATCH_SIZE
+    et ML_INFERENCE_MAX_WAIT_MS.
+    """
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running: set = set()
+        self._stopping = False
+
+        self.batches = 0
+        self.items = 0
+        self.max_batch_size = 0
+        self.inference_ms_total = 0.0
+        self.last_batch_size = 0
+        self.last_inference_ms = 0.0
+        self.histogram = {str(b): 0 for b in _BATCH_BUCKETS}
+        self.histogram["more"] = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._stopping
+
+    async def start(self):
+        if self.running:
+            return
+        workers = settings.ML_INFERENCE_WORKERS
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ml-inference")
+        self._slots = asyncio.Semaphore(workers)
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._batch_loop())
+
+    async def stop(self):
+        if not self.running:
+            return
+        # Pas de cancel() : un wait_for interrompu peut avaler l'annulation
+        self._stopping = True
+        self._queue.put_nowait((_STOP, None))
+        await self._task
+        self._task = None
+        self._stopping = False
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+        # Les requêtes encore en file sont servies avant l'arrêt du pool
+        pending = []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        if pending:
+            await self._run_batch(pending)
+        self._pool.shutdown(wait=False)
+        self._pool = None
+
+    async def predict_sms(self, content: str, sender: str = "") -> Tuple[bool, float, List[str]]:
+        if not self.running:
+            # Hors API (Celery, scripts) : simple déport dans un thread
+            return await asyncio.to_thread(ml_service.predict_sms, content, sender)
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((content, future))
+        return await future
+
+    async def predict_email(self, sender: str, subject: str, body: str) -> Tuple[bool, float]:
+        is_fraud, confidence, _ = await self.predict_sms(
+            ml_service.email_content(subject, body), sender
+        )
+        return is_fraud, confidence
+
+    async def predict_sms_batch(self, contents: List[str]) -> List[Tuple[bool, float, List[str]]]:
+        """Lot déjà constitué par l'appelant : exécuté tel quel dans le pool."""
+        if not self.running:
+            return await asyncio.to_thread(ml_service.predict_sms_batch, contents)
+
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, ml_service.predict_sms_batch, contents)
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        max_batch = settings.ML_INFERENCE_MAX_BATCH_SIZE
+        max_wait = settings.ML_INFERENCE_MAX_WAIT_MS / 1000
+
+        while True:
+            item = await self._queue.get()
+            if item[0] is _STOP:
+                return
+            batch, stop = [item], False
+            deadline = loop.time() + max_wait
+            while len(batch) < max_batch:
+                if not self._queue.empty():
+                    item = self._queue.get_nowait()
+                else:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item[0] is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+
+            await self._slots.acquire()
+            task = asyncio.create_task(self._run_batch(batch, release=True))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+            if stop:
+                return
+
+    async def _run_batch(self, batch: list, release: bool = False):
+        # Requêtes annulées entre-temps (timeout côté appelant)
+        batch = [(content, future) for content, future in batch if not future.done()]
+        try:
+            if not batch:
+                return
+            start = time.perf_counter()
+            try:
+                loop = asyncio.get_running_loop()
+                results = await loop.run_in_executor(
+                    self._pool, ml_service.predict_sms_batch, [content for content, _ in batch]
+                )
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+            self._record(len(batch), (time.perf_counter() - start) * 1000)
+        finally:
+            if release:
+                self._slots.release()
+
+    def _record(self, size: int, elapsed_ms: float):
+        self.batches += 1
+        self.items += size
+        self.max_batch_size = max(self.max_batch_size, size)
+        self.inference_ms_total += elapsed_ms
+        self.last_batch_size = size
+        self.last_inference_ms = elapsed_ms
+        bucket = next((str(b) for b in _BATCH_BUCKETS if size <= b), "more")
+        self.histogram[bucket] += 1
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "batches_in_flight": len(self._running),
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "last_batch_size": self.last_batch_size,
+            "avg_inference_ms": round(self.inference_ms_total / self.batches, 2) if self.batches else 0.0,
+            "last_inference_ms": round(self.last_inference_ms, 2),
+            "batch_size_histogram": dict(self.histogram),
+            "config": {
+                "workers": settings.ML_INFERENCE_WORKERS,
+                "max_batch_size": settings.ML_INFERENCE_MAX_BATCH_SIZE,
+                "max_wait_ms": settings.ML_INFERENCE_MAX_WAIT_MS,
+            },
+        }
+
+
+inference_executor = InferenceExecutor()
@@ -0,0 +1,108 @@
+"""
+Apprentissage incrémental (ML_TRAINING_MODE="incremental").
+
+Les nouveaux exemples (soumissions /ai/train/*, SMS signalés au moment où ils
+passent vérifiés) sont poussés dans une liste Redis. La tâche Celery
+incremental_update la vide par mini-lots, applique partial_fit sur le modèle
+courant et enregistre le résultat comme nouvelle version du registre. La
+consolidation (retrain_models nocturne) reconstruit le modèle sur tout le jeu
+de données.
+
+Des exemples dépilés puis perdus (échec de la tâche) restent dans
+le jeu d'entraînement / user_reports : la consolidation suivante les reprend.
+"""
+
+import asyncio
+import json
+import logging
+from typing import List, Optional, Tuple
+
+import redis.asyncio as redis
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.ml.incremental import STATE_DIR, consolidate, partial_update
+from app.models.report import ReportType, UserReport, VerificationStatus
+from app.services.cache import cache_service
+from app.services.ml_service.registry import model_registry
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = "ml:training:pending"
+
+Sample = Tuple[str, int]
+
+
+def incremental_mode() -> bool:
+    return settings.ML_TRAINING_MODE == "incremental"
+
+
+async def enqueue_samples(samples: List[Sample]):
+    """File d'attente des exemples à apprendre (sans effet hors mode incrémental)."""
+    if not incremental_mode() or not samples or not cache_service.redis_client:
+        return
+    try:
+        await cache_service.redis_client.rpush(
+            PENDING_KEY,
+            *(json.dumps({"content": content, "is_fraud": int(label)}) for content, label in samples),
+        )
+    except Exception as e:
+        logger.warning("Could not enqueue training samples: %s", e)
+
+
+async def _drain(client, max_items: int) -> List[Sample]:
+    items = await client.lpop(PENDING_KEY, max_items) or []
+    samples = []
+    for item in items:
+        data = json.loads(item)
+        samples.append((data["content"], int(data["is_fraud"])))
+    return samples
+
+
+async def verified_report_samples() -> List[Sample]:
+    """SMS signalés et vérifiés (un exemple frauduleux par contenu)."""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(UserReport.content_hash, UserReport.meta_data)
+            .where(UserReport.report_type == ReportType.SMS)
+            .where(UserReport.verification_status == VerificationStatus.VERIFIED)
+        )
+        contents = {}
+        for content_hash, meta_data in result.all():
+            content = (meta_data or {}).get("content")
+            if content:
+                contents.setdefault(content_hash, content)
+    return [(content, 1) for content in contents.values()]
+
+
+async def run_incremental_update(max_items: Optional[int] = None) -> dict:
+    """Une passe : vide la file, partial_fit, nouvelle version active."""
+    client = redis.from_url(settings.REDIS_URL, encoding="utf-8", decode_responses=True)
+    try:
+        samples = await _drain(client, max_items or settings.ML_INCREMENTAL_MAX_SAMPLES)
+    finally:
+        await client.close()
+    if not samples:
+        return {"skipped": True, "reason": "no pending samples"}
+
+    metadata = await asyncio.to_thread(
+        partial_update, samples, settings.ML_INCREMENTAL_BATCH_SIZE
+    )
+    if metadata is None:
+        # Uniquement des exemples du holdout : rien à apprendre
+        return {"skipped": True, "reason": "holdout only", "samples": len(samples)}
+    version_id = await model_registry.register(STATE_DIR, activate=True)
+    logger.info("Incremental ML update: %d samples, version %s", len(samples), version_id)
+    return {"samples": len(samples), "version_id": version_id, **metadata}
+
+
+async def run_consolidation() -> dict:
+    """Reconstruction complète : jeu d'entraînement + signalements vérifiés."""
+    extra = await verified_report_samples()
+    metadata = await asyncio.to_thread(
+        consolidate, extra, settings.ML_INCREMENTAL_BATCH_SIZE, settings.ML_CONSOLIDATION_EPOCHS
+    )
+    version_id = await model_registry.register(STATE_DIR, activate=True)
+    logger.info("ML consolidation: %d samples, version %s", metadata["n_samples_train"], version_id)
+    return {"version_id": version_id, **metadata}
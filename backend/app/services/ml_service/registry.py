@@ -0,0 +1,243 @@
+"""
+Registre des versions de modèles ML.
+
+Chaque version entraînée est copiée dans models/ml_models/versions/<version_id>/
+et enregistrée dans ml_model_versions. L'activation d'une version (is_active)
+est diffusée sur Redis : chaque worker charge la version en arrière-plan puis
+remplace sa référence de modèle d'un seul coup.
+"""
+
+import asyncio
+import logging
+import shutil
+import uuid
+from pathlib import Path
+from typing import List, Optional
+
+import joblib
+import redis.asyncio as redis
+from sqlalchemy import select, update
+
+from app.core.config import settings
+from app.ml.artifacts import MMAP_DIR, export_artifacts, has_artifacts
+from app.ml.cascade import FAST_MODEL_FILE
+from app.db.session import AsyncSessionLocal
+from app.models.ml_model import MLModelVersion
+from app.services.cache import cache_service
+from app.services.ml_service.service import ml_service
+
+logger = logging.getLogger(__name__)
+
+ACTIVATE_CHANNEL = "ml:model:activate"
+SMS_MODEL_TYPE = "sms_classifier"
+ARTIFACTS = ("sms_model.pkl", "vectorizer.pkl", "sms_metadata.pkl")
+# Absents pour certains modèles (ex. pas de cascade pour le SGD incrémental)
+OPTIONAL_ARTIFACTS = (FAST_MODEL_FILE,)
+
+
+def _copy_artifacts(source_dir: Path, target_dir: Path):
+    for name in ARTIFACTS:
+        shutil.copy2(source_dir / name, target_dir / name)
+    for name in OPTIONAL_ARTIFACTS:
+        if (source_dir / name).exists():
+            shutil.copy2(source_dir / name, target_dir / name)
+    if has_artifacts(source_dir):
+        shutil.copytree(source_dir / MMAP_DIR, target_dir / MMAP_DIR)
+        return
+    # Artefacts antérieurs au format mmap : export depuis les pickles
+    try:
+        export_artifacts(
+            joblib.load(source_dir / "sms_model.pkl"),
+            joblib.load(source_dir / "vectorizer.pkl"),
+            target_dir / MMAP_DIR,
+        )
+    except ValueError as e:
+        # Modèle autre qu'une forêt (ex. SGD incrémental) : servi depuis les pickles
+        logger.info("Model not exported as mmap artifacts: %s", e)
+
+
+class ModelRegistry:
+    def __init__(self):
+        self.versions_dir = ml_service.model_dir / "versions"
+        self.active_version_id: Optional[int] = None
+        self.last_error: Optional[str] = None
+        self._load_lock = asyncio.Lock()
+        self._pending: set = set()
+        self._task: Optional[asyncio.Task] = None
+
+    # === ÉCRITURE (API, Celery) ===
+
+    async def register(self, source_dir: Path, activate: bool = True) -> int:
+        """
+        Enregistre comme nouvelle version les artefacts présents dans source_dir
+        (sortie de train_sms_classifier). Retourne le version_id.
+        """
+        metadata = joblib.load(source_dir / "sms_metadata.pkl")
+
+        # Copie dans un dossier temporaire puis renommage : un dossier de version
+        # visible est toujours complet
+        self.versions_dir.mkdir(parents=True, exist_ok=True)
+        tmp_dir = self.versions_dir / f".tmp-{uuid.uuid4().hex}"
+        tmp_dir.mkdir()
+        version_dir = None
+        try:
+            await asyncio.to_thread(_copy_artifacts, source_dir, tmp_dir)
+
+            async with AsyncSessionLocal() as db:
+                row = MLModelVersion(
+                    model_type=SMS_MODEL_TYPE,
+                    accuracy=metadata.get("accuracy", 0.0),
+                    precision=metadata.get("precision", 0.0),
+                    recall=metadata.get("recall", 0.0),
+                    f1_score=metadata.get("f1_score", 0.0),
+                    training_samples=metadata.get("n_samples_train", 0),
+                    is_active=False,
+                    model_path="",
+                )
+                db.add(row)
+                await db.flush()
+                version_dir = self.versions_dir / str(row.version_id)
+                row.model_path = str(version_dir)
+                tmp_dir.rename(version_dir)
+                await db.commit()
+                version_id = row.version_id
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if version_dir is not None:
+                shutil.rmtree(version_dir, ignore_errors=True)
+            raise
+
+        logger.info("Registered ML model version %s", version_id)
+        if activate:
+            await self.activate(version_id)
+        return version_id
+
+    async def activate(self, version_id: int) -> MLModelVersion:
+        """Marque la version active et demande à tous les workers de la charger."""
+        async with AsyncSessionLocal() as db:
+            row = await db.get(MLModelVersion, version_id)
+            if row is None:
+                raise ValueError(f"Unknown model version {version_id}")
+            await db.execute(
+                update(MLModelVersion)
+                .where(MLModelVersion.model_type == row.model_type)
+                .where(MLModelVersion.version_id != version_id)
+                .values(is_active=False)
+            )
+            row.is_active = True
+            await db.commit()
+            await db.refresh(row)
+
+        message = {"version_id": version_id, "model_path": row.model_path}
+        # Le worker courant (s'il sert des requêtes) n'entend pas son propre message
+        if self._task is not None:
+            self._schedule_load(version_id, row.model_path)
+        await self._broadcast(message)
+        return row
+
+    async def list_versions(self, limit: int = 20) -> List[MLModelVersion]:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(MLModelVersion)
+                .where(MLModelVersion.model_type == SMS_MODEL_TYPE)
+                .order_by(MLModelVersion.version_id.desc())
+                .limit(limit)
+            )
+            return list(result.scalars().all())
+
+    async def _broadcast(self, message: dict):
+        if cache_service.redis_client:
+            await cache_service.publish(ACTIVATE_CHANNEL, message)
+            return
+        # Hors API (Celery) : connexion ponctuelle
+        client = redis.from_url(settings.REDIS_URL, encoding="utf-8", decode_responses=True)
+        try:
+            await client.publish(ACTIVATE_CHANNEL, cache_service.encode_message(message))
+        except Exception as e:
+            logger.warning("Could not broadcast model activation: %s", e)
+        finally:
+            await client.close()
+
+    # === CHARGEMENT (workers API) ===
+
+    def _schedule_load(self, version_id: int, model_path: str):
+        task = asyncio.create_task(self._load(version_id, model_path))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _load(self, version_id: int, model_path: str):
+        async with self._load_lock:
+            if version_id == self.active_version_id:
+                return
+            try:
+                # Désérialisation hors boucle ; l'ancienne version sert jusqu'au swap
+                bundle = await asyncio.to_thread(
+                    ml_service.load_bundle, Path(model_path), str(version_id)
+                )
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error("Could not load ML model version %s: %s", version_id, e)
+                return
+            ml_service.activate(bundle)
+            self.active_version_id = version_id
+            self.last_error = None
+            logger.info("ML model version %s is now active", version_id)
+
+    def _on_message(self, data: dict):
+        if data.get("version_id") and data.get("model_path"):
+            self._schedule_load(int(data["version_id"]), data["model_path"])
+
+    async def sync(self):
+        """Charge la version active en base si ce n'est pas déjà celle du worker."""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(MLModelVersion)
+                .where(MLModelVersion.model_type == SMS_MODEL_TYPE)
+                .where(MLModelVersion.is_active.is_(True))
+                .order_by(MLModelVersion.version_id.desc())
+                .limit(1)
+            )
+            row = result.scalar_one_or_none()
+        if row is not None and row.version_id != self.active_version_id:
+            await self._load(row.version_id, row.model_path)
+
+    async def _sync_loop(self):
+        # Filet de sécurité si un message pub/sub a été perdu
+        while True:
+            await asyncio.sleep(settings.ML_REGISTRY_SYNC_SECONDS)
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error("ML model registry sync failed: %s", e)
+
+    async def start(self):
+        await cache_service.subscribe(ACTIVATE_CHANNEL, self._on_message)
+        try:
+            await self.sync()
+        except Exception as e:
+            # Pas de registre exploitable : les artefacts de models/ml_models restent servis
+            logger.error("Could not load active ML model version: %s", e)
+        if self._task is None:
+            self._task = asyncio.create_task(self._sync_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "active_version_id": self.active_version_id,
+            "serving_version": ml_service.version,
+            "loading": len(self._pending),
+            "last_error": self.last_error,
+        }
+
+
+model_registry = ModelRegistry()
@@ -1,38 +1,120 @@
 import joblib
+import numpy as np
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Tuple, List
+from typing import Any, Optional, Tuple, List
 import logging
 
+from app.core.config import settings
+from app.ml.artifacts import compile_model, has_artifacts, load_artifacts
+from app.ml.cascade import FAST_MODEL_FILE, fraud_proba
+
+
+@dataclass(frozen=True)
+class ModelBundle:
+    """Modèle + vectorizer d'une même version, remplacés ensemble."""
+
+    version: str
+    sms_model: Any
+    vectorizer: Any
+    path: Optional[Path] = None
+    metadata: dict = field(default_factory=dict)
+    # Cascade : régression logistique + bande (lower, upper) hors de laquelle elle répond seule
+    fast_model: Any = None
+    cascade_band: Optional[Tuple[float, float]] = None
+
 
 class MLService:
     def __init__(self):
         self.phone_model = None
-        self.sms_model = None
         self.email_model = None
-        self.vectorizer = None
+        # Référence unique, remplacée d'un bloc : une requête en cours garde
+        # la version qu'elle a lue, jamais un mélange de deux versions.
+        self.bundle: Optional[ModelBundle] = None
+        # Messages tranchés par la régression logistique / escaladés à la forêt
+        self.cascade_answered = 0
+        self.cascade_escalated = 0
 
         # Paths
         self.base_dir = Path(__file__).parent.parent.parent.parent
         self.model_dir = self.base_dir / "models" / "ml_models"
 
+    @property
+    def sms_model(self):
+        return self.bundle.sms_model if self.bundle else None
+
+    @property
+    def vectorizer(self):
+        return self.bundle.vectorizer if self.bundle else None
+
+    @property
+    def version(self) -> str:
+        return self.bundle.version if self.bundle else "none"
+
     def load_models(self):
-        """Charger les modèles entraînés depuis le disque"""
+        """Charger les modèles entraînés depuis le disque (artefacts hors registre)"""
         try:
-            sms_model_path = self.model_dir / "sms_model.pkl"
-            vectorizer_path = self.model_dir / "vectorizer.pkl"
-
-            logging.info(
-                "Attempting to load ML models from: %s", self.model_dir.absolute()
-            )
-            if sms_model_path.exists() and vectorizer_path.exists():
-                self.sms_model = joblib.load(sms_model_path)
-                self.vectorizer = joblib.load(vectorizer_path)
-                logging.info("ML models loaded successfully from %s", sms_model_path)
-            else:
-                logging.warning("ML models not found at %s", self.model_dir)
+            self.bundle = self.load_bundle(self.model_dir)
+        except FileNotFoundError:
+            logging.warning("ML models not found at %s", self.model_dir)
         except Exception as e:
             logging.error("Failed to load ML models: %s", e)
 
+    @staticmethod
+    def _load_cascade(path: Path, metadata: dict) -> Tuple[Any, Optional[Tuple[float, float]]]:
+        band = metadata.get("cascade")
+        fast_model_path = path / FAST_MODEL_FILE
+        if not settings.ML_CASCADE_ENABLED or not band or not fast_model_path.exists():
+            return None, None
+        return joblib.load(fast_model_path), (float(band["lower"]), float(band["upper"]))
+
+    @staticmethod
+    def load_bundle(path: Path, version: Optional[str] = None) -> ModelBundle:
+        """Charge complètement une version depuis un dossier d'artefacts (sans l'activer)."""
+        sms_model_path = path / "sms_model.pkl"
+        vectorizer_path = path / "vectorizer.pkl"
+        metadata_path = path / "sms_metadata.pkl"
+
+        logging.info("Attempting to load ML models from: %s", path.absolute())
+        metadata = joblib.load(metadata_path) if metadata_path.exists() else {}
+        version = version or str(metadata.get("version", "1.0"))
+        fast_model, cascade_band = MLService._load_cascade(path, metadata)
+
+        # Artefacts mmap : pages partagées entre tous les workers de la machine
+        if settings.ML_MMAP_ARTIFACTS and has_artifacts(path):
+            try:
+                sms_model, vectorizer = load_artifacts(path)
+                logging.info("ML models mapped from %s (version %s)", path, version)
+                return ModelBundle(version, sms_model, vectorizer, path, metadata, fast_model, cascade_band)
+            except Exception as e:
+                logging.warning("Could not map ML artifacts from %s, using pickles: %s", path, e)
+
+        if not (sms_model_path.exists() and vectorizer_path.exists()):
+            raise FileNotFoundError(f"ML models not found at {path}")
+        sms_model = joblib.load(sms_model_path)
+        vectorizer = joblib.load(vectorizer_path)
+        if settings.ML_COMPILED_FOREST:
+            # Évaluateur à tableaux plats (en mémoire) : évite le surcoût fixe
+            # de predict_proba sklearn (validation, dispatch joblib par arbre)
+            try:
+                sms_model, vectorizer = compile_model(sms_model, vectorizer)
+            except ValueError as e:
+                logging.warning("ML model cannot be compiled, using sklearn: %s", e)
+        bundle = ModelBundle(
+            version=version,
+            sms_model=sms_model,
+            vectorizer=vectorizer,
+            path=path,
+            metadata=metadata,
+            fast_model=fast_model,
+            cascade_band=cascade_band,
+        )
+        logging.info("ML models loaded successfully from %s (version %s)", path, bundle.version)
+        return bundle
+
+    def activate(self, bundle: ModelBundle):
+        self.bundle = bundle
+
     def predict_phone(self, phone: str, features: dict) -> Tuple[bool, float]:
         """Simple rule-based phone prediction placeholder."""
         if not phone:
@@ -57,31 +139,110 @@ class MLService:
         confidence = min(score, 0.95)
         return is_fraud, confidence
 
+    def predict_phone_batch(
+        self, phones: List[str], features: dict
+    ) -> List[Tuple[bool, float]]:
+        """Version vectorisée de predict_phone : mêmes règles, un seul passage numpy."""
+        if not phones:
+            return []
+
+        lengths = np.array(
+            [len(p.replace("+", "").replace(" ", "").replace("-", "")) for p in phones]
+        )
+        scores = np.where((lengths < 8) | (lengths > 15), 0.4, 0.0)
+
+        call_count = features.get("call_count", 0)
+        if call_count > 50:
+            scores += 0.5
+        elif call_count > 10:
+            scores += 0.2
+
+        hour = features.get("hour", 0)
+        if hour < 7 or hour > 21:
+            scores += 0.1
+
+        empty = np.array([not p for p in phones])
+        scores[empty] = 0.0
+        is_fraud = scores >= 0.5
+        confidences = np.minimum(scores, 0.95)
+        return [(bool(f), float(c)) for f, c in zip(is_fraud, confidences)]
+
     def predict_sms(self, content: str, sender: str) -> Tuple[bool, float, List[str]]:
         """Predict if an SMS is fraudulent using the trained RandomForest model.
 
         This method now relies solely on the ML model. If the model or vectorizer
         is not loaded, it logs an error and raises a RuntimeError.
         """
-        if not (self.sms_model and self.vectorizer):
+        return self.predict_sms_batch([content])[0]
+
+    def predict_sms_batch(self, contents: List[str]) -> List[Tuple[bool, float, List[str]]]:
+        """Vectorized SMS prediction.
+
+        The N messages are transformed into a single sparse matrix and scored
+        with one predict_proba call, so the forest's per-call overhead is paid
+        once per batch instead of once per message.
+
+        With a cascade, the logistic regression answers the messages outside
+        its uncertainty band; only the others go through the forest.
+        """
+        bundle = self.bundle
+        if bundle is None:
             logging.error("ML models not loaded; cannot predict SMS.")
             raise RuntimeError("ML models not loaded for SMS prediction")
+        if not contents:
+            return []
         try:
-            features = self.vectorizer.transform([content])
-            prediction = self.sms_model.predict(features)[0]
-            probabilities = self.sms_model.predict_proba(features)[0]
-            is_fraud = bool(prediction == 1)
-            confidence = float(probabilities[prediction])
-            risk_factors = ["Détection ML (RandomForest)"]
-            return is_fraud, confidence, risk_factors
+            features = bundle.vectorizer.transform(contents)
+            escalated = np.ones(len(contents), dtype=bool)
+            is_fraud = np.zeros(len(contents), dtype=bool)
+            confidence = np.zeros(len(contents))
+            if bundle.fast_model is not None:
+                lower, upper = bundle.cascade_band
+                p_fraud = fraud_proba(bundle.fast_model, features)
+                escalated = (p_fraud > lower) & (p_fraud < upper)
+                is_fraud[~escalated] = p_fraud[~escalated] >= 0.5
+                confidence[~escalated] = np.maximum(p_fraud, 1 - p_fraud)[~escalated]
+                self.cascade_answered += int((~escalated).sum())
+                self.cascade_escalated += int(escalated.sum())
+
+            if escalated.any():
+                rows = np.flatnonzero(escalated)
+                probabilities = bundle.sms_model.predict_proba(
+                    features if len(rows) == len(contents) else features[rows]
+                )
+                best = probabilities.argmax(axis=1)
+                is_fraud[rows] = bundle.sms_model.classes_.take(best) == 1
+                confidence[rows] = probabilities[np.arange(len(rows)), best]
+            return [
+                (
+                    bool(is_fraud[i]),
+                    float(confidence[i]),
+                    ["Détection ML (RandomForest)" if escalated[i] else "Détection ML (régression logistique)"],
+                )
+                for i in range(len(contents))
+            ]
         except Exception as e:
             logging.error("ML prediction failed: %s", e)
             raise
 
+    def stats(self) -> dict:
+        total = self.cascade_answered + self.cascade_escalated
+        return {
+            "version": self.version,
+            "cascade": self.bundle is not None and self.bundle.fast_model is not None,
+            "cascade_answered": self.cascade_answered,
+            "cascade_escalated": self.cascade_escalated,
+            "escalation_rate": self.cascade_escalated / total if total else None,
+        }
+
+    @staticmethod
+    def email_content(subject: str, body: str) -> str:
+        """Texte soumis au modèle pour un email."""
+        return f"{subject} {body}"
+
     def predict_email(self, sender: str, subject: str, body: str) -> Tuple[bool, float]:
         """Prédit si un email est du phishing."""
-        combined = f"{subject} {body}"
-        is_fraud, confidence, _ = self.predict_sms(combined, sender)
+        is_fraud, confidence, _ = self.predict_sms(self.email_content(subject, body), sender)
         return is_fraud, confidence
 
     def _extract_phone_features(self, phone: str, features: dict) -> List:
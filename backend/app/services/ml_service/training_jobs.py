@@ -0,0 +1,159 @@
+"""
+Jobs d'entraînement hors processus API.
+
+Les demandes d'entraînement (/ai/train/*) sont des tâches Celery sur la file
+`ml`, avec deux garde-fous Redis :
+- anti-rebond : une seule tâche en file à la fois (QUEUED_KEY) ; les demandes
+  qui arrivent pendant un entraînement sont comptées (REQUESTS_KEY) et donnent
+  lieu à un seul entraînement de suivi ;
+- verrou (LOCK_KEY) partagé par tous les entraînements (demandes API,
+  retrain nocturne, apprentissage incrémental) : jamais deux à la fois. Une
+  tâche qui trouve le verrou pris est replanifiée (ou ignorée si périodique).
+
+L'état du job courant et du dernier job terminé est lisible via
+/ai/train/status.
+"""
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Optional
+
+import redis
+
+from app.core.config import settings
+from app.services.cache import cache_service
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY = "ml:train:lock"
+QUEUED_KEY = "ml:train:queued"
+REQUESTS_KEY = "ml:train:requests"
+CURRENT_KEY = "ml:train:current"
+LAST_KEY = "ml:train:last"
+
+TRAIN_TASK = "app.workers.tasks.ml_tasks.train_models"
+
+# Libération du verrou seulement par son détenteur
+_RELEASE = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+
+# === API ===
+
+
+async def request_training(trigger: str = "api") -> dict:
+    """
+    Demande un entraînement. Retourne {"queued": True} si une tâche a été
+    envoyée, False si la demande rejoint une tâche déjà en file.
+    """
+    client = cache_service.redis_client
+    if client is None:
+        raise RuntimeError("Redis unavailable, cannot schedule training")
+    await client.incr(REQUESTS_KEY)
+    queued = await client.set(
+        QUEUED_KEY, trigger, nx=True, ex=settings.ML_TRAIN_LOCK_TTL_SECONDS
+    )
+    if queued:
+        # Import local : l'API n'a besoin de Celery que pour publier la tâche
+        from app.workers.celery_app import celery_app
+
+        try:
+            # Publication sur le broker (I/O bloquante) hors boucle
+            await asyncio.to_thread(celery_app.send_task, TRAIN_TASK, kwargs={"trigger": trigger})
+        except Exception:
+            await client.delete(QUEUED_KEY)
+            raise
+    return {"queued": bool(queued)}
+
+
+async def training_status() -> dict:
+    client = cache_service.redis_client
+    if client is None:
+        raise RuntimeError("Redis unavailable")
+    current, last, requests, queued = await client.mget(
+        CURRENT_KEY, LAST_KEY, REQUESTS_KEY, QUEUED_KEY
+    )
+    return {
+        "running": current is not None,
+        "current": json.loads(current) if current else None,
+        "last": json.loads(last) if last else None,
+        "pending_requests": int(requests or 0),
+        "queued": queued is not None,
+    }
+
+
+# === CELERY ===
+
+_client: Optional[redis.Redis] = None
+
+
+def _redis() -> redis.Redis:
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _client
+
+
+def run_training_job(
+    trigger: str,
+    train_fn: Callable[[], dict],
+    consume_requests: bool = False,
+    client: Optional[redis.Redis] = None,
+) -> Optional[dict]:
+    """
+    Exécute train_fn sous le verrou d'entraînement. None si le verrou est déjà
+    pris (à replanifier par l'appelant).
+
+    consume_requests : le job couvre les demandes API reçues jusqu'ici ; s'il
+    n'y en a aucune (déjà couvertes par un autre run), il ne s'exécute pas.
+    """
+    client = client or _redis()
+    ttl_ms = settings.ML_TRAIN_LOCK_TTL_SECONDS * 1000
+    token = uuid.uuid4().hex
+    if not client.set(LOCK_KEY, token, nx=True, px=ttl_ms):
+        return None
+
+    try:
+        requests = 0
+        if consume_requests:
+            # Les demandes qui arrivent à partir d'ici déclenchent un run de suivi
+            client.delete(QUEUED_KEY)
+            requests = int(client.getdel(REQUESTS_KEY) or 0)
+            if not requests and trigger == "api":
+                return {"skipped": True, "reason": "requests already covered"}
+
+        job = {
+            "job_id": token,
+            "trigger": trigger,
+            "requests": requests,
+            "started_at": datetime.utcnow().isoformat(),
+        }
+        client.set(CURRENT_KEY, json.dumps(job), px=ttl_ms)
+        start = time.perf_counter()
+        try:
+            result = train_fn()
+            if result.get("skipped"):
+                # Rien à apprendre (ex. file incrémentale vide) : pas un job
+                client.delete(CURRENT_KEY)
+                return result
+            job.update(success=bool(result.get("success", True)), result=result)
+        except Exception as e:
+            logger.error("Training job %s failed: %s", trigger, e)
+            job.update(success=False, error=str(e))
+        job.update(
+            finished_at=datetime.utcnow().isoformat(),
+            duration_s=round(time.perf_counter() - start, 2),
+        )
+        client.set(LAST_KEY, json.dumps(job, default=str))
+        client.delete(CURRENT_KEY)
+        return job
+    finally:
+        client.eval(_RELEASE, 1, LOCK_KEY, token)
@@ -0,0 +1,388 @@
+"""
+Index vectoriel embarqué de la collection fraud_vectors.
+
+Copie locale des points Qdrant (SMS vérifiés), alimentée à chaque
+add_vector et, au démarrage, depuis Qdrant. Sert de repli quand Qdrant est
+injoignable ou lent, sans appel réseau.
+
+Stockage : fichiers mappés en mémoire (np.memmap) partagés par les workers,
+écritures sous flock exclusif, meta.json réécrit en dernier (os.replace) :
+un lecteur voit toujours un état complet.
+- vectors.f32 : vecteurs normalisés (cosinus = produit scalaire) ;
+- ids.u64 : identifiant du point Qdrant de chaque ligne ;
+- payloads.jsonl + payload_offsets.i64 : payloads en ajout seul, position
+  (+1) de la dernière version par ligne ;
+- graphe HNSW : niveaux, voisins de la couche 0 (2M par nœud) et des couches
+  hautes (M par nœud et par couche), identifiants stockés +1 (0 = vide, les
+  zones ajoutées en agrandissant un fichier sont déjà vides).
+
+Recherche exacte (produit matriciel) jusqu'à RAG_LOCAL_BRUTE_FORCE_MAX
+points, HNSW au-delà. Le graphe est tenu à jour à chaque insertion, même
+petit : franchir le seuil ne demande pas de reconstruction.
+"""
+
+import fcntl
+import heapq
+import json
+import logging
+import math
+import os
+import random
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+VECTORS_DIR = Path(__file__).resolve().parents[3] / "data" / "vectors"
+FORMAT_VERSION = 1
+# Couches hautes : au-delà, les nœuds restent au niveau MAX_LEVEL
+MAX_LEVEL = 6
+INITIAL_CAPACITY = 1024
+
+# (point_id, vecteur, payload)
+Point = Tuple[int, Sequence[float], dict]
+
+
+def _normalized(vector) -> Optional[np.ndarray]:
+    v = np.asarray(vector, dtype=np.float32).ravel()
+    norm = float(np.linalg.norm(v))
+    if not norm:
+        return None
+    return v / norm
+
+
+class LocalVectorIndex:
+    def __init__(self, path: Path, dim: int, m: int = 16):
+        self.path = path
+        self.dim = dim
+        self.m = m
+        self._lock = threading.RLock()
+        self._lock_path = path / ".lock"
+        self._reset()
+
+    def _reset(self):
+        self.count = 0
+        self.capacity = 0
+        self.upper_capacity = 0
+        self.n_upper = 0
+        self.entry = -1
+        self.max_level = -1
+        self._meta_stamp = None
+        self._vectors = None
+        self._ids = None
+        self._payload_offsets = None
+        self._levels = None
+        self._links0 = None
+        self._upper_slot = None
+        self._links_up = None
+
+    # === FICHIERS ===
+
+    @contextmanager
+    def _locked(self, mode: int):
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, mode)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _files(self, capacity: int, upper_capacity: int) -> dict:
+        return {
+            "vectors.f32": (np.float32, (capacity, self.dim)),
+            "ids.u64": (np.uint64, (capacity,)),
+            "payload_offsets.i64": (np.int64, (capacity,)),
+            "levels.u8": (np.uint8, (capacity,)),
+            "links0.i32": (np.int32, (capacity, 2 * self.m)),
+            "upper_slot.i32": (np.int32, (capacity,)),
+            "links_up.i32": (np.int32, (upper_capacity, MAX_LEVEL, self.m)),
+        }
+
+    def _open(self, capacity: int, upper_capacity: int):
+        # Vues ndarray des memmap : même mapping, sans le surcoût de la sous-classe
+        # à chaque indexation (parcours du graphe)
+        maps = {
+            name: np.memmap(self.path / name, dtype=dtype, mode="r+", shape=shape).view(np.ndarray)
+            for name, (dtype, shape) in self._files(capacity, upper_capacity).items()
+        }
+        self._vectors = maps["vectors.f32"]
+        self._ids = maps["ids.u64"]
+        self._payload_offsets = maps["payload_offsets.i64"]
+        self._levels = maps["levels.u8"]
+        self._links0 = maps["links0.i32"]
+        self._upper_slot = maps["upper_slot.i32"]
+        self._links_up = maps["links_up.i32"]
+        self.capacity = capacity
+        self.upper_capacity = upper_capacity
+
+    def _grow(self, capacity: int, upper_capacity: int):
+        """Agrandit les fichiers (zéros = emplacements vides), sous verrou exclusif."""
+        for name, (dtype, shape) in self._files(capacity, upper_capacity).items():
+            size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            with open(self.path / name, "ab") as f:
+                if f.tell() < size:
+                    f.truncate(size)
+        self._open(capacity, upper_capacity)
+
+    def _write_meta(self):
+        meta = {
+            "format": FORMAT_VERSION,
+            "dim": self.dim,
+            "m": self.m,
+            "count": self.count,
+            "capacity": self.capacity,
+            "upper_capacity": self.upper_capacity,
+            "n_upper": self.n_upper,
+            "entry": self.entry,
+            "max_level": self.max_level,
+        }
+        tmp = self.path / ".meta.json.tmp"
+        tmp.write_text(json.dumps(meta))
+        os.replace(tmp, self.path / "meta.json")
+        self._meta_stamp = self._stamp()
+
+    def _stamp(self):
+        try:
+            st = (self.path / "meta.json").stat()
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _refresh(self):
+        """Relit meta.json si un processus (ou un thread) l'a réécrit."""
+        stamp = self._stamp()
+        if stamp is None or stamp == self._meta_stamp:
+            return
+        meta = json.loads((self.path / "meta.json").read_text())
+        if meta["format"] != FORMAT_VERSION or meta["dim"] != self.dim or meta["m"] != self.m:
+            raise ValueError(f"local vector index {self.path} has an incompatible format")
+        if (meta["capacity"], meta["upper_capacity"]) != (self.capacity, self.upper_capacity):
+            self._open(meta["capacity"], meta["upper_capacity"])
+        self.count = meta["count"]
+        self.n_upper = meta["n_upper"]
+        self.entry = meta["entry"]
+        self.max_level = meta["max_level"]
+        self._meta_stamp = stamp
+
+    def _read_payload(self, row: int) -> dict:
+        offset = int(self._payload_offsets[row]) - 1
+        if offset < 0:
+            return {}
+        with open(self.path / "payloads.jsonl", "rb") as f:
+            f.seek(offset)
+            return json.loads(f.readline())["payload"]
+
+    # === GRAPHE HNSW ===
+
+    def _neighbors(self, node: int, level: int) -> np.ndarray:
+        if level == 0:
+            links = self._links0[node]
+        else:
+            links = self._links_up[self._upper_slot[node] - 1, level - 1]
+        return links[links > 0] - 1
+
+    def _set_neighbors(self, node: int, level: int, neighbors: Sequence[int]):
+        if level == 0:
+            links = self._links0[node]
+        else:
+            links = self._links_up[self._upper_slot[node] - 1, level - 1]
+        links[:] = 0
+        links[: len(neighbors)] = np.asarray(neighbors, dtype=np.int32) + 1
+
+    def _search_layer(
+        self, q: np.ndarray, entry_points: Iterable[int], ef: int, level: int
+    ) -> List[Tuple[float, int]]:
+        """Recherche en faisceau (largeur ef) dans une couche : (score, nœud) décroissants."""
+        entry_points = list(entry_points)
+        visited = set(entry_points)
+        scores = self._vectors[entry_points] @ q
+        candidates = [(-float(s), n) for s, n in zip(scores, entry_points)]
+        heapq.heapify(candidates)
+        results = [(float(s), n) for s, n in zip(scores, entry_points)]
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            neg_score, node = heapq.heappop(candidates)
+            if len(results) >= ef and -neg_score < results[0][0]:
+                break
+            neighbors = [n for n in self._neighbors(node, level).tolist() if n not in visited]
+            if not neighbors:
+                continue
+            visited.update(neighbors)
+            for score, n in zip((self._vectors[neighbors] @ q).tolist(), neighbors):
+                if len(results) < ef or score > results[0][0]:
+                    heapq.heappush(candidates, (-score, n))
+                    heapq.heappush(results, (score, n))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+        return sorted(results, reverse=True)
+
+    def _select(self, candidates: List[Tuple[float, int]], limit: int) -> List[int]:
+        """
+        Heuristique de sélection HNSW : un candidat (par score décroissant) n'est
+        retenu que s'il est plus proche du nœud que de tout voisin déjà retenu.
+        Garde des liens vers les autres groupes (campagnes) au lieu de saturer la
+        liste avec le seul groupe du nœud, qui deviendrait une île.
+        """
+        if len(candidates) <= limit:
+            return [n for _, n in candidates]
+        nodes = [n for _, n in candidates]
+        vectors = self._vectors[nodes]
+        pairwise = vectors @ vectors.T
+        selected: List[int] = []
+        for i, (score, _) in enumerate(candidates):
+            if not selected or pairwise[i, selected].max() < score:
+                selected.append(i)
+                if len(selected) >= limit:
+                    break
+        return [nodes[i] for i in selected]
+
+    def _link(self, node: int, neighbor: int, level: int):
+        """Ajoute node aux voisins de neighbor ; liste pleine : nouvelle sélection."""
+        limit = 2 * self.m if level == 0 else self.m
+        current = self._neighbors(neighbor, level).tolist()
+        if node in current:
+            return
+        current.append(node)
+        if len(current) > limit:
+            scores = (self._vectors[current] @ self._vectors[neighbor]).tolist()
+            current = self._select(sorted(zip(scores, current), reverse=True), limit)
+        self._set_neighbors(neighbor, level, current)
+
+    def _insert(self, row: int):
+        q = self._vectors[row]
+        # Niveau tiré comme HNSW (mL = 1 / ln M), déterministe par ligne
+        level = min(int(-math.log(1.0 - random.Random(row).random()) / math.log(self.m)), MAX_LEVEL)
+        self._levels[row] = level
+        if level > 0:
+            if self.n_upper >= self.upper_capacity:
+                self._grow(self.capacity, 2 * self.upper_capacity)
+            self._upper_slot[row] = self.n_upper + 1
+            self.n_upper += 1
+        if self.entry < 0:
+            self.entry, self.max_level = row, level
+            return
+
+        entry_points = [self.entry]
+        for lvl in range(self.max_level, level, -1):
+            entry_points = [self._search_layer(q, entry_points, 1, lvl)[0][1]]
+        for lvl in range(min(level, self.max_level), -1, -1):
+            found = self._search_layer(q, entry_points, settings.RAG_HNSW_EF_CONSTRUCTION, lvl)
+            limit = 2 * self.m if lvl == 0 else self.m
+            neighbors = self._select([(score, n) for score, n in found if n != row], limit)
+            self._set_neighbors(row, lvl, neighbors)
+            for n in neighbors:
+                self._link(row, n, lvl)
+            entry_points = [n for _, n in found]
+        if level > self.max_level:
+            self.entry, self.max_level = row, level
+
+    # === API ===
+
+    def upsert_many(self, points: Sequence[Point]) -> int:
+        """Ajoute ou met à jour des points (payload, vecteur) ; nombre de points ajoutés."""
+        added = 0
+        with self._lock, self._locked(fcntl.LOCK_EX):
+            self._refresh()
+            with open(self.path / "payloads.jsonl", "ab") as payloads:
+                for point_id, vector, payload in points:
+                    v = _normalized(vector)
+                    if v is None or v.shape[0] != self.dim:
+                        continue
+                    existing = (
+                        np.flatnonzero(self._ids[: self.count] == np.uint64(point_id))
+                        if self.count
+                        else []
+                    )
+                    if len(existing):
+                        row = int(existing[0])
+                    else:
+                        row = self.count
+                        if row >= self.capacity:
+                            self._grow(
+                                max(INITIAL_CAPACITY, 2 * self.capacity),
+                                max(INITIAL_CAPACITY // 8, self.upper_capacity),
+                            )
+                    offset = payloads.tell()
+                    payloads.write(
+                        json.dumps({"row": row, "payload": payload}, ensure_ascii=False).encode("utf-8") + b"\n"
+                    )
+                    self._payload_offsets[row] = offset + 1
+                    self._vectors[row] = v
+                    if row == self.count:
+                        self._ids[row] = point_id
+                        self._insert(row)
+                        self.count += 1
+                        added += 1
+            if self.capacity:
+                self._write_meta()
+        return added
+
+    def upsert(self, point_id: int, vector: Sequence[float], payload: dict) -> bool:
+        return self.upsert_many([(point_id, vector, payload)]) > 0
+
+    def search(
+        self,
+        vector: Sequence[float],
+        limit: int = 10,
+        score_threshold: Optional[float] = None,
+        exact: Optional[bool] = None,
+    ) -> List[dict]:
+        """
+        Points les plus proches (cosinus), même format que RAGService.search_similar.
+        exact=None : recherche exacte jusqu'à RAG_LOCAL_BRUTE_FORCE_MAX points, HNSW au-delà.
+        """
+        q = _normalized(vector)
+        if q is None:
+            return []
+        with self._lock:
+            self._refresh()
+            count = self.count
+        if not count:
+            return []
+        if exact is None:
+            exact = count <= settings.RAG_LOCAL_BRUTE_FORCE_MAX
+
+        if exact:
+            scores = self._vectors[:count] @ q
+            k = min(limit, count)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            hits = [(float(scores[i]), int(i)) for i in top]
+        else:
+            entry_points = [self.entry]
+            for lvl in range(self.max_level, 0, -1):
+                entry_points = [self._search_layer(q, entry_points, 1, lvl)[0][1]]
+            ef = max(settings.RAG_HNSW_EF_SEARCH, limit)
+            hits = self._search_layer(q, entry_points, ef, 0)[:limit]
+
+        return [
+            {"id": int(self._ids[row]), "score": score, "payload": self._read_payload(row)}
+            for score, row in hits
+            if score_threshold is None or score >= score_threshold
+        ]
+
+    def stats(self) -> dict:
+        with self._lock:
+            try:
+                self._refresh()
+            except Exception as e:
+                return {"error": str(e)}
+            return {
+                "points": self.count,
+                "capacity": self.capacity,
+                "search": "exact" if self.count <= settings.RAG_LOCAL_BRUTE_FORCE_MAX else "hnsw",
+                "hnsw_max_level": self.max_level,
+                "size_bytes": sum(f.stat().st_size for f in self.path.glob("*") if f.is_file())
+                if self.path.exists()
+                else 0,
+            }
@@ -1,87 +1,370 @@
-from typing import List, Tuple
-import hashlib
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import logging
+import time
+
+from app.core.config import settings
+from app.services.rag_service.local_index import VECTORS_DIR, LocalVectorIndex, Point
+
+logger = logging.getLogger(__name__)
+
+VECTOR_SIZE = 384
+
+
+def point_id(content_hash: str) -> int:
+    """Identifiant de point stable pour un contenu (sha256 hex des signalements)."""
+    return int(content_hash[:16], 16) >> 1
+
 
 class RAGService:
+    """Recherche de SMS signalés similaires : Qdrant, index local en repli.
+
+    Chaque point ajouté l'est aussi dans l'index local (local_index.py). Une
+    recherche passe par Qdrant tant qu'il répond vite ; en cas d'erreur ou
+    au-delà de RAG_QDRANT_SLOW_MS, l'index local la sert pendant
+    RAG_QDRANT_BACKOFF_SECONDS avant de réessayer Qdrant.
+
+    Les ajouts sont mis en file et écrits par lots (Qdrant et index local)
+    toutes les RAG_UPSERT_FLUSH_INTERVAL_MS ou dès RAG_UPSERT_BATCH_SIZE
+    points. Le point d'un SMS a un identifiant dérivé de son contenu : un
+    nouveau signalement remplace le point (report_count à jour) au lieu d'en
+    ajouter un.
+
+    Si Qdrant est injoignable (dès le démarrage ou après), la boucle d'écriture
+    retente la connexion toutes les RAG_QDRANT_RECONNECT_SECONDS ; les points
+    écrits entre-temps dans le seul index local (au plus RAG_UPSERT_MAX_PENDING)
+    sont renvoyés à Qdrant une fois reconnecté.
+    """
+
     def __init__(self):
         self.client = None
         self.collection_name = "fraud_vectors"
-        self.enabled = False
+        self.qdrant_ready = False
+        self.local_index: Optional[LocalVectorIndex] = (
+            LocalVectorIndex(VECTORS_DIR / self.collection_name, VECTOR_SIZE, settings.RAG_HNSW_M)
+            if settings.RAG_LOCAL_INDEX_ENABLED
+            else None
+        )
+        self._qdrant_backoff_until = 0.0
+        # point_id -> dernier état à écrire (les doublons en attente fusionnent)
+        self._pending: Dict[int, Point] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._stopping = False
+        # connect() appelé : la boucle d'écriture reconnecte Qdrant s'il tombe
+        self._connect_wanted = False
+        self._next_reconnect = 0.0
+        # Points écrits dans l'index local seul, Qdrant injoignable
+        self._unsynced: Dict[int, Point] = {}
+        self.qdrant_searches = 0
+        self.local_searches = 0
+        self.qdrant_failures = 0
+        self.qdrant_slow = 0
+        self.upserts_queued = 0
+        self.upserts_coalesced = 0
+        self.points_flushed = 0
+        self.flushes = 0
+        self.flush_failures = 0
+        self.reconnects = 0
+        self.unsynced_dropped = 0
 
-    def connect(self):
-        try:
-            from qdrant_client import QdrantClient
-            from qdrant_client.models import Distance, VectorParams
-            from app.core.config import settings
+    @property
+    def enabled(self) -> bool:
+        return self.qdrant_ready or self.local_index is not None
+
+    async def start(self):
+        if self._flusher is not None:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._flusher = asyncio.create_task(self._flush_loop())
 
-            self.client = QdrantClient(url=settings.QDRANT_URL)
-            self._ensure_collection()
-            self.enabled = True
+    async def stop(self):
+        if self._flusher is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._flusher
+            self._flusher = None
+        # Dernier lot avant fermeture du client
+        await self.flush()
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+            self.qdrant_ready = False
+
+    async def connect(self):
+        self._connect_wanted = True
+        try:
+            await self._open()
         except Exception as e:
+            logger.warning("Qdrant unavailable, using the local vector index only: %s", e)
+            return
+        await self.sync_local_index()
+
+    async def _open(self):
+        from qdrant_client import AsyncQdrantClient
+
+        client = AsyncQdrantClient(url=settings.QDRANT_URL, timeout=settings.RAG_QDRANT_TIMEOUT_SECONDS)
+        self.client = client
+        try:
+            await self._ensure_collection()
+        except Exception:
             self.client = None
-            self.enabled = False
+            self.qdrant_ready = False
+            try:
+                await client.close()
+            except Exception:
+                pass
+            raise
+        self.qdrant_ready = True
 
-    def _ensure_collection(self):
-        if not self.client:
+    async def _reconnect(self):
+        """Nouvelle tentative de connexion, au plus toutes les RAG_QDRANT_RECONNECT_SECONDS."""
+        if self.qdrant_ready or not self._connect_wanted or time.monotonic() < self._next_reconnect:
             return
+        self._next_reconnect = time.monotonic() + settings.RAG_QDRANT_RECONNECT_SECONDS
         try:
-            from qdrant_client.models import Distance, VectorParams
+            await self._open()
+        except Exception as e:
+            logger.debug("Qdrant still unavailable: %s", e)
+            return
+        self.reconnects += 1
+        self._qdrant_backoff_until = 0.0
+        logger.info("Qdrant reconnected, %d points to resend", len(self._unsynced))
+        await self.sync_local_index()
+        # Réécrits au prochain lot, sans écraser une version plus récente en file
+        for pid, point in self._unsynced.items():
+            self._pending.setdefault(pid, point)
+        self._unsynced.clear()
+
+    def _quantization_config(self):
+        """Quantification scalaire int8 : 1 octet par dimension en RAM, vecteurs float32 sur disque."""
+        from qdrant_client.models import ScalarQuantization, ScalarQuantizationConfig, ScalarType
 
-            collections = self.client.get_collections().collections
-            exists = any(c.name == self.collection_name for c in collections)
-            if not exists:
-                self.client.create_collection(
+        return ScalarQuantization(
+            scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+
+    async def _ensure_collection(self):
+        from qdrant_client.models import Distance, VectorParams
+
+        collections = (await self.client.get_collections()).collections
+        exists = any(c.name == self.collection_name for c in collections)
+        if not exists:
+            await self.client.create_collection(
+                collection_name=self.collection_name,
+                vectors_config=VectorParams(
+                    size=VECTOR_SIZE,
+                    distance=Distance.COSINE,
+                    on_disk=settings.RAG_QDRANT_QUANTIZATION,
+                ),
+                quantization_config=self._quantization_config() if settings.RAG_QDRANT_QUANTIZATION else None,
+            )
+        elif settings.RAG_QDRANT_QUANTIZATION:
+            info = await self.client.get_collection(self.collection_name)
+            if info.config.quantization_config is None:
+                # Collection créée avant la quantification : index int8 construit par Qdrant
+                await self.client.update_collection(
                     collection_name=self.collection_name,
-                    vectors_config=VectorParams(size=384, distance=Distance.COSINE)
+                    quantization_config=self._quantization_config(),
                 )
-        except:
-            pass
 
-    def search_similar(self, vector: List[float], limit: int = 10) -> List[dict]:
-        if not self.client or not self.enabled:
-            return []
+    async def sync_local_index(self) -> int:
+        """Copie dans l'index local les points Qdrant qu'il n'a pas (premier démarrage)."""
+        if not (self.client and self.local_index is not None):
+            return 0
+        added = 0
         try:
-            results = self.client.search(
-                collection_name=self.collection_name,
-                query_vector=vector,
-                limit=limit
+            total = (await self.client.count(self.collection_name, exact=True)).count
+            local = await asyncio.to_thread(self.local_index.stats)
+            if local.get("points", 0) >= total:
+                return 0
+            offset = None
+            while True:
+                points, offset = await self.client.scroll(
+                    collection_name=self.collection_name,
+                    limit=256,
+                    offset=offset,
+                    with_payload=True,
+                    with_vectors=True,
+                )
+                added += await asyncio.to_thread(
+                    self.local_index.upsert_many, [(p.id, p.vector, p.payload or {}) for p in points]
+                )
+                if offset is None:
+                    break
+        except Exception as e:
+            logger.warning("Local vector index sync from Qdrant failed: %s", e)
+        if added:
+            logger.info("Local vector index: %d points copied from Qdrant", added)
+        return added
+
+    def _qdrant_available(self) -> bool:
+        return bool(self.client and self.qdrant_ready) and time.monotonic() >= self._qdrant_backoff_until
+
+    def _qdrant_backoff(self):
+        self._qdrant_backoff_until = time.monotonic() + settings.RAG_QDRANT_BACKOFF_SECONDS
+
+    def _search_params(self):
+        if not settings.RAG_QDRANT_QUANTIZATION:
+            return None
+        from qdrant_client.models import QuantizationSearchParams, SearchParams
+
+        # Candidats trouvés sur l'int8 (limit x oversampling), rescorés sur les vecteurs d'origine
+        return SearchParams(
+            quantization=QuantizationSearchParams(
+                rescore=True, oversampling=settings.RAG_QDRANT_OVERSAMPLING
             )
-            return [
-                {
-                    "id": r.id,
-                    "score": r.score,
-                    "payload": r.payload
-                }
-                for r in results
-            ]
-        except:
+        )
+
+    async def search_similar(
+        self, vector: List[float], limit: int = 10, score_threshold: Optional[float] = None
+    ) -> List[dict]:
+        if self._qdrant_available():
+            try:
+                # Au-delà de RAG_QDRANT_SLOW_MS, la requête est abandonnée au profit de l'index local
+                results = await asyncio.wait_for(
+                    self.client.search(
+                        collection_name=self.collection_name,
+                        query_vector=vector,
+                        limit=limit,
+                        score_threshold=score_threshold,
+                        search_params=self._search_params(),
+                        with_payload=True,
+                    ),
+                    settings.RAG_QDRANT_SLOW_MS / 1000,
+                )
+            except asyncio.TimeoutError:
+                self.qdrant_slow += 1
+                self._qdrant_backoff()
+            except Exception as e:
+                logger.warning("Qdrant search failed, falling back to the local index: %s", e)
+                self.qdrant_failures += 1
+                self._qdrant_backoff()
+            else:
+                self.qdrant_searches += 1
+                return [
+                    {
+                        "id": r.id,
+                        "score": r.score,
+                        "payload": r.payload
+                    }
+                    for r in results
+                ]
+
+        if self.local_index is None:
+            return []
+        try:
+            results = await asyncio.to_thread(self.local_index.search, vector, limit, score_threshold)
+        except Exception as e:
+            logger.warning("Local vector index search failed: %s", e)
             return []
+        self.local_searches += 1
+        return results
 
-    def add_vector(self, vector: List[float], payload: dict):
-        if not self.client or not self.enabled:
-            return
+    async def add_vector(self, content_hash: str, vector: List[float], payload: dict):
+        """Met le point du contenu en file (écrit au prochain lot, ou tout de suite sans flusher)."""
+        pid = point_id(content_hash)
+        if pid in self._pending:
+            self.upserts_coalesced += 1
+        self._pending[pid] = (pid, vector, payload)
+        self.upserts_queued += 1
+        if self._flusher is None:
+            # Hors API (Celery, scripts) : pas de boucle d'écriture
+            await self.flush()
+        elif len(self._pending) >= settings.RAG_UPSERT_BATCH_SIZE:
+            self._wakeup.set()
+
+    async def _flush_loop(self):
+        interval = settings.RAG_UPSERT_FLUSH_INTERVAL_MS / 1000
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self._reconnect()
+                await self.flush()
+            except Exception as e:
+                logger.error("RAG upsert flush failed: %s", e)
+
+    async def flush(self):
+        while self._pending:
+            batch = []
+            for pid in list(self._pending)[: settings.RAG_UPSERT_BATCH_SIZE]:
+                batch.append(self._pending.pop(pid))
+            if not await self._write(batch):
+                return
+
+    async def _write(self, points: List[Point]) -> bool:
+        """Écrit un lot ; False si Qdrant a échoué (points remis en file)."""
+        self.flushes += 1
+        self.points_flushed += len(points)
+        if self.local_index is not None:
+            try:
+                await asyncio.to_thread(self.local_index.upsert_many, points)
+            except Exception as e:
+                logger.warning("Local vector index upsert failed: %s", e)
+        if not (self.client and self.qdrant_ready):
+            if self._connect_wanted:
+                # Renvoyés à Qdrant à la reconnexion
+                for point in points:
+                    if point[0] in self._unsynced or len(self._unsynced) < settings.RAG_UPSERT_MAX_PENDING:
+                        self._unsynced[point[0]] = point
+                    else:
+                        self.unsynced_dropped += 1
+            return True
         try:
             from qdrant_client.models import PointStruct
 
-            point_id = hashlib.md5(str(payload).encode()).hexdigest()[:16]
-            point = PointStruct(
-                id=int(point_id, 16) % (2**63),
-                vector=vector,
-                payload=payload
-            )
-            self.client.upsert(
+            await self.client.upsert(
                 collection_name=self.collection_name,
-                points=[point]
+                points=[PointStruct(id=pid, vector=vector, payload=payload) for pid, vector, payload in points],
+                wait=False,
             )
-        except:
-            pass
+        except Exception as e:
+            logger.warning("Qdrant upsert of %d points failed: %s", len(points), e)
+            self.flush_failures += 1
+            # Retentés au prochain cycle, sans écraser une version plus récente en file
+            if len(self._pending) < settings.RAG_UPSERT_MAX_PENDING:
+                for point in points:
+                    self._pending.setdefault(point[0], point)
+            return False
+        return True
 
-    def check_similarity_fraud(self, vector: List[float], threshold: float = 0.85) -> Tuple[bool, int]:
+    async def check_similarity_fraud(self, vector: List[float], threshold: float = 0.85) -> Tuple[bool, int]:
+        """
+        Fraude si au moins RAG_SIMILAR_FRAUD_MIN_MATCHES points dépassent le
+        seuil : le seuil est appliqué par la recherche et le nombre de voisins
+        borné au besoin de la décision (compte plafonné à ce minimum).
+        """
         if not self.enabled:
             return False, 0
 
-        results = self.search_similar(vector, limit=100)
-        similar_frauds = [r for r in results if r["score"] >= threshold]
-        is_fraud = len(similar_frauds) >= 3
-        return is_fraud, len(similar_frauds)
+        min_matches = settings.RAG_SIMILAR_FRAUD_MIN_MATCHES
+        results = await self.search_similar(vector, limit=min_matches, score_threshold=threshold)
+        return len(results) >= min_matches, len(results)
+
+    def stats(self) -> dict:
+        return {
+            "qdrant_connected": self.qdrant_ready,
+            "qdrant_backoff": time.monotonic() < self._qdrant_backoff_until,
+            "qdrant_searches": self.qdrant_searches,
+            "local_searches": self.local_searches,
+            "qdrant_failures": self.qdrant_failures,
+            "qdrant_slow": self.qdrant_slow,
+            "upserts_queued": self.upserts_queued,
+            "upserts_coalesced": self.upserts_coalesced,
+            "upserts_pending": len(self._pending),
+            "points_flushed": self.points_flushed,
+            "flushes": self.flushes,
+            "flush_failures": self.flush_failures,
+            "reconnects": self.reconnects,
+            "unsynced": len(self._unsynced),
+            "unsynced_dropped": self.unsynced_dropped,
+            "local_index": self.local_index.stats() if self.local_index is not None else None,
+        }
+
 
-rag_service = RAGService()
\ No newline at end of file
+rag_service = RAGService()
@@ -0,0 +1,183 @@
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from app.core.config import settings
+from app.services.cache import cache_service
+
+logger = logging.getLogger(__name__)
+
+# GCRA (generic cell rate algorithm) : la clé stocke l'instant d'arrivée
+# théorique (TAT, en ms). Une seule commande EVALSHA par vérification,
+# atomique, horloge Redis (pas de dérive entre workers).
+# ARGV : intervalle d'émission (ms), tolérance de rafale (ms), coût, minimum.
+# Accorde autant d'unités que possible jusqu'à « coût », au moins « minimum »
+# (réservation de jetons locaux) ; en dessous, rien n'est débité.
+# Retour : {accordé, restant, retry_after_ms, reset_ms}
+_GCRA = """
+local emission = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local minimum = tonumber(ARGV[4])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+local available = math.floor((burst - (tat - now)) / emission)
+if available < cost then
+    cost = available
+end
+if cost < minimum or cost <= 0 then
+    local retry = tat - now - burst + emission * math.max(minimum, 1)
+    return {0, math.max(available, 0), math.max(retry, 1), tat - now}
+end
+local new_tat = tat + emission * cost
+redis.call('SET', KEYS[1], new_tat, 'PX', math.ceil(new_tat - now))
+return {cost, available - cost, 0, new_tat - now}
+"""
+
+
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float = 0.0
+    reset: float = 0.0
+
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(max(self.remaining, 0)),
+            "X-RateLimit-Reset": str(int(self.reset + 0.999)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, int(self.retry_after + 0.999)))
+        return headers
+
+
+class _LocalTokens:
+    """Jetons réservés en lot auprès de Redis, consommés sans aller-retour."""
+
+    __slots__ = ("tokens", "expires_at", "remaining", "reset_at")
+
+    def __init__(self, tokens: int, remaining: int, reset: float):
+        now = time.monotonic()
+        self.tokens = tokens
+        self.expires_at = now + settings.RATE_LIMIT_LOCAL_LEASE_MS / 1000
+        self.remaining = remaining
+        self.reset_at = now + reset
+
+
+class RateLimiter:
+    """Limitation de débit par identité (utilisateur ou IP).
+
+    Le quota se lit dans <ROLE>_QUOTA (requêtes par RATE_LIMIT_PERIOD_SECONDS,
+    0 = illimité) ; les clients anonymes utilisent MAX_REQUESTS_PER_MINUTE.
+    Pour les quotas élevés (>= RATE_LIMIT_LOCAL_MIN_QUOTA), le worker réserve
+    RATE_LIMIT_LOCAL_BATCH jetons d'un coup et répond localement tant qu'il en
+    reste. Les jetons non utilisés à l'expiration du bail
+    (RATE_LIMIT_LOCAL_LEASE_MS) sont perdus : l'erreur va toujours dans le sens
+    du refus, jamais du dépassement.
+    Une requête ne peut pas coûter plus que le quota (elle ne passerait
+    jamais) : elle est refusée sans rien débiter.
+    Sans Redis, les requêtes sont acceptées (fail open).
+    """
+
+    def __init__(self):
+        self._local: Dict[str, _LocalTokens] = {}
+        self._script = None
+        self.redis_checks = 0
+        self.local_checks = 0
+        self.rejected = 0
+
+    @staticmethod
+    def quota_for(role: Optional[str]) -> int:
+        if not role:
+            return settings.MAX_REQUESTS_PER_MINUTE
+        return getattr(settings, f"{role.upper()}_QUOTA", settings.MAX_REQUESTS_PER_MINUTE)
+
+    async def hit(self, identity: str, role: Optional[str] = None, cost: int = 1) -> RateLimitResult:
+        quota = self.quota_for(role)
+        if quota == 0:
+            return RateLimitResult(True, 0, 0)
+
+        if cost > quota:
+            return self._result(False, quota, 0, settings.RATE_LIMIT_PERIOD_SECONDS, 0.0)
+
+        key = f"rate_limit:{role or 'anonymous'}:{identity}"
+        if quota >= settings.RATE_LIMIT_LOCAL_MIN_QUOTA and settings.RATE_LIMIT_LOCAL_BATCH > 1:
+            return await self._hit_local(key, quota, cost)
+
+        granted, remaining, retry_after, reset = await self._eval(key, quota, cost, minimum=cost)
+        if granted is None:
+            return RateLimitResult(True, quota, quota)
+        return self._result(granted > 0, quota, remaining, retry_after, reset)
+
+    async def _hit_local(self, key: str, quota: int, cost: int) -> RateLimitResult:
+        now = time.monotonic()
+        local = self._local.get(key)
+        if local and local.expires_at > now and local.tokens >= cost:
+            local.tokens -= cost
+            self.local_checks += 1
+            return RateLimitResult(
+                True, quota, local.remaining + local.tokens, reset=max(local.reset_at - now, 0)
+            )
+
+        # Réserve de quoi servir la requête + un lot d'avance ; au moins le
+        # manque de la requête, sinon rien n'est débité
+        held = local.tokens if local and local.expires_at > now else 0
+        need = cost - held
+        wanted = need + settings.RATE_LIMIT_LOCAL_BATCH - 1
+        granted, remaining, retry_after, reset = await self._eval(key, quota, wanted, minimum=need)
+        if granted is None:
+            return RateLimitResult(True, quota, quota)
+        if not granted:
+            # Les jetons déjà détenus restent réservés pour les requêtes suivantes
+            return self._result(False, quota, remaining + held, retry_after, reset)
+
+        tokens = held + granted
+        self._store_local(key, _LocalTokens(tokens - cost, remaining, reset))
+        return RateLimitResult(True, quota, remaining + tokens - cost, reset=reset)
+
+    def _store_local(self, key: str, tokens: _LocalTokens):
+        if len(self._local) >= settings.RATE_LIMIT_LOCAL_MAX_KEYS and key not in self._local:
+            self._local.pop(next(iter(self._local)))
+        self._local[key] = tokens
+
+    async def _eval(self, key: str, quota: int, cost: int, minimum: int):
+        client = cache_service.redis_client
+        if not client:
+            return None, 0, 0, 0
+        period_ms = settings.RATE_LIMIT_PERIOD_SECONDS * 1000
+        emission = period_ms / quota
+        if self._script is None or self._script.registered_client is not client:
+            self._script = client.register_script(_GCRA)
+        try:
+            self.redis_checks += 1
+            granted, remaining, retry_after, reset = await self._script(
+                keys=[key], args=[emission, period_ms, cost, minimum]
+            )
+        except Exception as e:
+            logger.warning("Rate limit check failed for %s: %s", key, e)
+            return None, 0, 0, 0
+        return int(granted), int(remaining), int(retry_after) / 1000, int(reset) / 1000
+
+    def _result(self, allowed: bool, quota: int, remaining: int, retry_after: float, reset: float):
+        if not allowed:
+            self.rejected += 1
+        return RateLimitResult(allowed, quota, remaining, retry_after, reset)
+
+    def stats(self) -> dict:
+        return {
+            "redis_checks": self.redis_checks,
+            "local_checks": self.local_checks,
+            "rejected": self.rejected,
+            "local_keys": len(self._local),
+        }
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import logging
+import uuid
+from typing import Any, Awaitable, Callable, Dict
+
+from app.core.config import settings
+from app.services.cache import cache_service
+
+logger = logging.getLogger(__name__)
+
+# Libère le verrou seulement s'il nous appartient encore
+_RELEASE_LOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """Coalescence des calculs identiques concurrents (protection cache stampede).
+
+    Dans un worker, les appels simultanés pour une même clé attendent un seul
+    calcul en vol. Avec SINGLEFLIGHT_DISTRIBUTED, un verrou Redis étend le
+    principe aux autres workers : celui qui n'a pas le verrou attend le résultat
+    publié par le détenteur (au plus SINGLEFLIGHT_LOCK_WAIT_MS) puis calcule
+    lui-même en dernier recours.
+    Les résultats doivent être sérialisables en JSON.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.executed = 0
+        self.shared = 0
+        self.remote_shared = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is not None:
+            self.shared += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(self._run(key, fn))
+        self._inflight[key] = future
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield : l'annulation d'un appelant n'interrompt pas les autres
+        return await asyncio.shield(future)
+
+    async def _run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        client = cache_service.redis_client
+        if not (settings.SINGLEFLIGHT_DISTRIBUTED and client):
+            self.executed += 1
+            return await fn()
+
+        lock_key = f"singleflight:lock:{key}"
+        # Jeton propre à ce calcul : le résultat publié lui est attaché, un
+        # suiveur ne peut pas relire celui d'un calcul précédent
+        token = uuid.uuid4().hex
+        try:
+            acquired = await client.set(lock_key, token, nx=True, px=settings.SINGLEFLIGHT_LOCK_TTL_MS)
+        except Exception as e:
+            logger.warning("Single-flight lock unavailable for %s: %s", key, e)
+            acquired = None
+
+        if acquired is None or acquired:
+            self.executed += 1
+            try:
+                result = await fn()
+                if acquired:
+                    await client.set(
+                        f"singleflight:result:{key}:{token}",
+                        json.dumps(result),
+                        ex=settings.SINGLEFLIGHT_RESULT_TTL,
+                    )
+                return result
+            finally:
+                if acquired:
+                    try:
+                        await client.eval(_RELEASE_LOCK, 1, lock_key, token)
+                    except Exception:
+                        pass
+
+        # Un autre worker calcule : on attend le résultat de son calcul
+        try:
+            holder = await client.get(lock_key)
+        except Exception:
+            holder = None
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.SINGLEFLIGHT_LOCK_WAIT_MS / 1000
+        while holder and loop.time() < deadline:
+            await asyncio.sleep(settings.SINGLEFLIGHT_POLL_MS / 1000)
+            try:
+                data = await client.get(f"singleflight:result:{key}:{holder}")
+            except Exception:
+                break
+            if data:
+                self.remote_shared += 1
+                return json.loads(data)
+
+        self.executed += 1
+        return await fn()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._inflight),
+            "executed": self.executed,
+            "shared": self.shared,
+            "remote_shared": self.remote_shared,
+            "distributed": settings.SINGLEFLIGHT_DISTRIBUTED,
+        }
+
+
+singleflight = SingleFlight()
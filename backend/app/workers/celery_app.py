@@ -39,6 +39,24 @@ celery_app.conf.beat_schedule = {
         "schedule": crontab(hour=2, minute=0),  # 2h du matin
     },
 
+    # Apprentissage incrémental (sans effet si ML_TRAINING_MODE=full)
+    "incremental-ml-update": {
+        "task": "app.workers.tasks.ml_tasks.incremental_update",
+        "schedule": crontab(minute="*/15"),
+    },
+
+    # Compaction du store d'entraînement (toutes les heures)
+    "compact-training-data": {
+        "task": "app.workers.tasks.ml_tasks.compact_training_data",
+        "schedule": crontab(minute=30),
+    },
+
+    # Évaluation des modèles sur le holdout (version active + candidates)
+    "evaluate-ml-models-daily": {
+        "task": "app.workers.tasks.ml_tasks.evaluate_models",
+        "schedule": crontab(hour=4, minute=0),
+    },
+
     # Mise à jour DB externe (toutes les 5 minutes)
     "sync-fraud-database": {
         "task": "app.workers.tasks.db_tasks.sync_external_frauds",
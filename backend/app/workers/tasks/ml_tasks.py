@@ -1,30 +1,45 @@
 from app.workers.celery_app import celery_app
-from app.ml.train import train_sms_classifier
+from app.ml.train import train_sms_classifier, MODEL_DIR
+from app.ml.dataset_store import training_store
+from app.services.ml_service.registry import model_registry
+from app.services.ml_service.incremental import (
+    incremental_mode,
+    run_consolidation,
+    run_incremental_update,
+)
+from app.services.ml_service.evaluation import run_evaluation
+from app.services.ml_service.training_jobs import run_training_job
+from app.core.config import settings
+from datetime import datetime
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-@celery_app.task(name="app.workers.tasks.ml_tasks.retrain_models")
-def retrain_models():
-    """
-    Re-entraîner les modèles ML avec nouvelles données
-
-    Exécuté : Tous les jours à 2h du matin
-    Durée : 10-30 minutes
-    """
-
+def _train() -> dict:
+    """Entraînement complet (ou consolidation en mode incrémental) + nouvelle version active."""
     logger.info("🤖 Démarrage re-entraînement ML...")
 
     try:
+        if incremental_mode():
+            # Consolidation du modèle incrémental sur tout le jeu de données
+            result = asyncio.run(run_consolidation())
+            logger.info(f"✅ ML consolidé - Accuracy: {result['accuracy']:.3f} (version {result['version_id']})")
+            return {"success": True, **result, "timestamp": str(datetime.utcnow())}
+
         # Re-entraîner SMS classifier
         model, vectorizer, accuracy = train_sms_classifier()
 
-        logger.info(f"✅ ML re-entraîné - Accuracy: {accuracy:.3f}")
+        # Nouvelle version active, chargée par tous les workers API
+        version_id = asyncio.run(model_registry.register(MODEL_DIR, activate=True))
+
+        logger.info(f"✅ ML re-entraîné - Accuracy: {accuracy:.3f} (version {version_id})")
 
         return {
             "success": True,
             "accuracy": accuracy,
+            "version_id": version_id,
             "timestamp": str(datetime.utcnow())
         }
 
@@ -36,21 +51,113 @@ def retrain_models():
         }
 
 
+def _evaluate_after(job: dict):
+    """Nouvelle version enregistrée : mesures sur le holdout, hors verrou d'entraînement."""
+    if job.get("success") and (job.get("result") or {}).get("version_id"):
+        evaluate_models.delay()
+
+
+@celery_app.task(bind=True, name="app.workers.tasks.ml_tasks.retrain_models", max_retries=None)
+def retrain_models(self):
+    """
+    Re-entraîner les modèles ML avec nouvelles données
+
+    Exécuté : Tous les jours à 2h du matin
+    Durée : 10-30 minutes
+    """
+    job = run_training_job("nightly", _train, consume_requests=True)
+    if job is None:
+        # Un entraînement est en cours : on passe après lui
+        raise self.retry(countdown=settings.ML_TRAIN_RETRY_SECONDS)
+    _evaluate_after(job)
+    return job
+
+
+@celery_app.task(bind=True, name="app.workers.tasks.ml_tasks.train_models", max_retries=None)
+def train_models(self, trigger: str = "api"):
+    """
+    Entraînement demandé par l'API (/ai/train/*). Les demandes reçues pendant
+    un run sont regroupées en un seul run de suivi.
+    """
+    job = run_training_job(trigger, _train, consume_requests=True)
+    if job is None:
+        raise self.retry(countdown=settings.ML_TRAIN_RETRY_SECONDS)
+    _evaluate_after(job)
+    return job
+
+
+@celery_app.task(name="app.workers.tasks.ml_tasks.incremental_update")
+def incremental_update():
+    """
+    Apprentissage incrémental des exemples en attente (soumissions API,
+    signalements vérifiés). Coût proportionnel aux nouvelles données.
+
+    Exécuté : Toutes les 15 minutes (mode incremental uniquement)
+    """
+    if not incremental_mode():
+        return {"skipped": True, "reason": "ML_TRAINING_MODE is not incremental"}
+
+    def update() -> dict:
+        result = asyncio.run(run_incremental_update())
+        if not result.get("skipped"):
+            logger.info(f"✅ ML incrémental - {result['samples']} exemples (version {result['version_id']})")
+        return result
+
+    try:
+        job = run_training_job("incremental", update)
+    except Exception as e:
+        logger.error(f"❌ Erreur apprentissage incrémental: {e}")
+        return {"success": False, "error": str(e)}
+    if job is None:
+        # Les exemples restent en file pour le prochain cycle
+        return {"skipped": True, "reason": "training in progress"}
+    return job
+
+
+@celery_app.task(name="app.workers.tasks.ml_tasks.compact_training_data")
+def compact_training_data():
+    """
+    Fusionne les segments du store d'entraînement (doublons retirés)
+
+    Exécuté : Toutes les heures, si au moins ML_DATASET_COMPACT_MIN_SEGMENTS segments
+    """
+    try:
+        result = training_store.compact(settings.ML_DATASET_COMPACT_MIN_SEGMENTS)
+    except Exception as e:
+        logger.error(f"❌ Erreur compaction store d'entraînement: {e}")
+        return {"success": False, "error": str(e)}
+    if result is None:
+        return {"skipped": True}
+    logger.info(
+        f"🗜️ Store compacté : {result['segments']} segments, "
+        f"{result['rows_before']} -> {result['rows_after']} lignes"
+    )
+    return {"success": True, **result}
+
+
 @celery_app.task(name="app.workers.tasks.ml_tasks.evaluate_models")
 def evaluate_models():
     """
-    Évaluer performance des modèles ML
+    Évaluer la version active et les candidates sur le holdout
 
-    Calcule métriques sur données de test récentes
+    Qualité, latence p50/p99, débit par lots, taille et temps de chargement,
+    enregistrés dans ml_model_versions.metrics
+
+    Exécuté : Après chaque entraînement et tous les jours à 4h
     """
 
     logger.info("📊 Évaluation modèles ML...")
-
-    # À implémenter : calcul précision/recall/f1
-
-    return {
-        "accuracy": 0.94,
-        "precision": 0.95,
-        "recall": 0.93,
-        "f1_score": 0.94
-    }
\ No newline at end of file
+    try:
+        result = asyncio.run(run_evaluation())
+    except Exception as e:
+        logger.error(f"❌ Erreur évaluation ML: {e}")
+        return {"success": False, "error": str(e)}
+    if result.get("skipped"):
+        return result
+    for version_id, metrics in result["versions"].items():
+        if "error" not in metrics:
+            logger.info(
+                f"📊 Version {version_id} - F1: {metrics['f1_score']:.3f}, "
+                f"p99: {metrics['latency_p99_ms']:.2f}ms, {metrics['throughput_per_s']:.0f} msg/s"
+            )
+    return {"success": True, **result}
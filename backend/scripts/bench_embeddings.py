@@ -0,0 +1,120 @@
+"""
+Benchmark des embeddings RAG sur CPU : encode un texte par appel vs lots.
+
+Pour chaque taille de lot (1, 8, 32, 64 par défaut) :
+- encode direct : SentenceTransformer.encode par paquets de N messages pris
+  dans l'ordre d'arrivée (sans tri par longueur) ;
+- file EmbeddingBatcher : N clients concurrents (boucle fermée, comme N
+  requêtes /reports/sms simultanées), lots bornés à N et triés par longueur.
+Rapporte le débit (messages/s), la latence p50/p99 par requête et le
+gaspillage de padding (caractères, proxy des tokens).
+
+Nécessite sentence-transformers (modèle de app/rag/embeddings.py).
+
+Usage:
+    python scripts/bench_embeddings.py [--messages 512] [--batch-sizes 1 8 32 64]
+"""
+import argparse
+import asyncio
+import csv
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.core.config import settings
+from app.rag.batcher import EmbeddingBatcher
+from app.rag.embeddings import embedding_service
+
+DATASET = ROOT / "data" / "datasets" / "sms_train.csv"
+
+
+def padding_waste(batches) -> float:
+    useful = sum(len(t) for batch in batches for t in batch)
+    padded = sum(max(len(t) for t in batch) * len(batch) for batch in batches)
+    return 1 - useful / padded if padded else 0.0
+
+
+def bench_direct(messages, batch_size: int) -> dict:
+    batches = [messages[i : i + batch_size] for i in range(0, len(messages), batch_size)]
+    embedding_service.encode(batches[0])
+    timings = []
+    start = time.perf_counter()
+    for batch in batches:
+        t0 = time.perf_counter()
+        embedding_service.encode(batch)
+        # Chaque message du lot attend la fin du lot
+        timings.extend([(time.perf_counter() - t0) * 1000] * len(batch))
+    elapsed = time.perf_counter() - start
+    return {
+        "throughput": len(messages) / elapsed,
+        "p50": float(np.percentile(timings, 50)),
+        "p99": float(np.percentile(timings, 99)),
+        "waste": padding_waste(batches),
+    }
+
+
+async def bench_queue(messages, batch_size: int) -> dict:
+    settings.EMBEDDING_MAX_BATCH_SIZE = batch_size
+    batcher = EmbeddingBatcher()
+    await batcher.start()
+    timings = []
+    next_index = iter(range(len(messages)))
+
+    async def client():
+        for i in next_index:
+            t0 = time.perf_counter()
+            # Sans embedding_cache : on mesure le regroupement seul
+            await batcher._embed_uncached(messages[i])
+            timings.append((time.perf_counter() - t0) * 1000)
+
+    await batcher._embed_uncached(messages[0])
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(batch_size)))
+    elapsed = time.perf_counter() - start
+    stats = batcher.stats()
+    await batcher.stop()
+    return {
+        "throughput": len(messages) / elapsed,
+        "p50": float(np.percentile(timings, 50)),
+        "p99": float(np.percentile(timings, 99)),
+        "waste": stats["padding_waste"],
+        "avg_batch": stats["avg_batch_size"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=512)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32, 64])
+    args = parser.parse_args()
+
+    embedding_service.load_model()
+    if not embedding_service.enabled:
+        print("sentence-transformers / modèle indisponible : pip install sentence-transformers")
+        sys.exit(1)
+
+    with open(DATASET, newline="", encoding="utf-8") as f:
+        unique = sorted({row["content"] for row in csv.DictReader(f)})
+    messages = (unique * (args.messages // len(unique) + 1))[: args.messages]
+    print(f"{len(messages)} messages, modèle {embedding_service.model_name}\n")
+
+    print(f"{'lot':>4} | {'encode direct':^32} | {'file EmbeddingBatcher':^40}")
+    print(f"{'':>4} | {'msg/s':>7} {'p50 ms':>7} {'p99 ms':>7} {'pad':>6} | "
+          f"{'msg/s':>7} {'p50 ms':>7} {'p99 ms':>7} {'pad':>6} {'lot moy':>7}")
+    for batch_size in args.batch_sizes:
+        direct = bench_direct(messages, batch_size)
+        queued = asyncio.run(bench_queue(messages, batch_size))
+        print(
+            f"{batch_size:>4} | {direct['throughput']:>7.0f} {direct['p50']:>7.1f} "
+            f"{direct['p99']:>7.1f} {direct['waste']:>6.1%} | {queued['throughput']:>7.0f} "
+            f"{queued['p50']:>7.1f} {queued['p99']:>7.1f} {queued['waste']:>6.1%} {queued['avg_batch']:>7.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Benchmark du cache de features : TfidfVectorizer.fit_transform vs comptages en cache.
+
+Construit un corpus de --documents SMS distincts (messages du jeu
+d'entraînement + variations : montants, numéros, mots mélangés), vérifie que
+le TF-IDF reconstruit depuis le cache est identique au bit près à
+fit_transform / transform pour plusieurs réglages, puis mesure :
+- cache froid : premier entraînement (tout est tokenisé et écrit) ;
+- cache chaud : réentraînement sans nouvelle ligne ;
+- incrémental : réentraînement après --new-rows lignes ajoutées ;
+- expérience : autres min_df / max_features sur les mêmes comptages.
+
+Usage:
+    python scripts/bench_feature_cache.py [--documents 20000] [--new-rows 500]
+"""
+import argparse
+import csv
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from sklearn.base import clone
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from app.ml.feature_cache import FeatureCache
+
+DATASET = ROOT / "data" / "datasets" / "sms_train.csv"
+
+# Réglages de train.py, puis variantes d'expérimentation (même tokenisation)
+BASE = TfidfVectorizer(max_features=1000, ngram_range=(1, 2), min_df=2, stop_words=None)
+EXPERIMENTS = [
+    {},
+    {"max_features": 5000, "min_df": 1},
+    {"max_features": None, "min_df": 3, "max_df": 0.5},
+    {"sublinear_tf": True, "binary": True, "norm": "l1"},
+]
+
+
+def corpus(n: int, seed: int = 0) -> list:
+    with open(DATASET, newline="", encoding="utf-8") as f:
+        base = sorted({row["content"] for row in csv.DictReader(f)})
+    rng = random.Random(seed)
+    words = " ".join(base).split()
+    documents = set(base)
+    while len(documents) < n:
+        msg = rng.choice(base).split()
+        rng.shuffle(msg)
+        msg.insert(rng.randrange(len(msg) + 1), rng.choice(words))
+        msg.append(f"{rng.randrange(100000)}€ ref{rng.randrange(10**6)}")
+        documents.add(" ".join(msg))
+    documents = sorted(documents)
+    rng.shuffle(documents)
+    return documents
+
+
+def assert_same(a, b):
+    a, b = a.tocsr(), b.tocsr()
+    assert a.shape == b.shape
+    assert np.array_equal(a.indptr, b.indptr) and np.array_equal(a.indices, b.indices)
+    assert np.array_equal(a.data, b.data)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, default=20000)
+    parser.add_argument("--new-rows", type=int, default=500)
+    args = parser.parse_args()
+
+    documents = corpus(args.documents + args.new_rows)
+    old, new = documents[: args.documents], documents[args.documents :]
+    split = int(len(old) * 0.8)
+    train, test = old[:split], old[split:]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+
+        # 1. Équivalence (cache alimenté par le premier réglage)
+        for params in EXPERIMENTS:
+            reference = clone(BASE).set_params(**params)
+            cached = clone(reference)
+            cache = FeatureCache(cached, root)
+            assert_same(cache.fit_transform(cached, train), reference.fit_transform(train))
+            assert_same(cache.transform(cached, test), reference.transform(test))
+            assert cached.vocabulary_ == reference.vocabulary_
+            assert np.array_equal(cached.idf_, reference.idf_)
+        print(f"TF-IDF identique à fit_transform/transform pour {len(EXPERIMENTS)} réglages\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+
+        def sklearn_run(docs):
+            vectorizer = clone(BASE)
+            vectorizer.fit_transform(docs)
+            return vectorizer
+
+        def cached_run(docs, params=None):
+            vectorizer = clone(BASE).set_params(**(params or {}))
+            cache = FeatureCache(vectorizer, root)
+            cache.fit_transform(vectorizer, docs)
+            return vectorizer
+
+        _, t_sklearn = timed(lambda: sklearn_run(old))
+        _, t_cold = timed(lambda: cached_run(old))
+        _, t_warm = timed(lambda: cached_run(old))
+        _, t_sklearn_new = timed(lambda: sklearn_run(old + new))
+        _, t_incremental = timed(lambda: cached_run(old + new))
+        _, t_experiment = timed(lambda: cached_run(old + new, EXPERIMENTS[2]))
+        size = sum(p.stat().st_size for p in root.rglob("*.npz"))
+
+    print(f"{len(old)} documents (+{len(new)} ajoutés), cache {size / 1e6:.1f} Mo\n")
+    print(f"{'run':<38} {'temps':>8}")
+    print(f"{'fit_transform (texte)':<38} {t_sklearn * 1000:>6.0f}ms")
+    print(f"{'cache froid (tokenise + écrit)':<38} {t_cold * 1000:>6.0f}ms")
+    print(f"{'cache chaud (relu depuis le disque)':<38} {t_warm * 1000:>6.0f}ms")
+    print(f"{'fit_transform après ajout':<38} {t_sklearn_new * 1000:>6.0f}ms")
+    print(f"{'cache après ajout (incrémental)':<38} {t_incremental * 1000:>6.0f}ms")
+    print(f"{'expérience min_df=3 max_df=0.5':<38} {t_experiment * 1000:>6.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark de MLService.predict_sms : forêt sklearn vs évaluateur à tableaux plats.
+
+Charge les mêmes artefacts deux fois (pickles sklearn bruts, puis artefacts
+mmap / compilés), vérifie que les prédictions sont identiques au bit près sur
+tout le jeu de données, puis mesure la latence par message (un message par
+appel, comme une requête /sms/analyze) et par lot.
+
+Usage:
+    python scripts/bench_ml_inference.py [--messages 500] [--batch 32]
+"""
+import argparse
+import csv
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.ml.artifacts import MMAP_DIR, export_artifacts, has_artifacts, load_artifacts
+from app.services.ml_service.service import MLService, ModelBundle
+
+DATASET = ROOT / "data" / "datasets" / "sms_train.csv"
+
+
+def service_with(sms_model, vectorizer) -> MLService:
+    service = MLService()
+    service.activate(ModelBundle("bench", sms_model, vectorizer))
+    return service
+
+
+def latencies_us(fn, inputs) -> np.ndarray:
+    timings = []
+    for item in inputs:
+        start = time.perf_counter()
+        fn(item)
+        timings.append((time.perf_counter() - start) * 1e6)
+    return np.array(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-dir", default=str(ROOT / "models" / "ml_models"))
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=32)
+    args = parser.parse_args()
+
+    model_dir = Path(args.model_dir)
+    with open(DATASET, newline="", encoding="utf-8") as f:
+        messages = [row["content"] for row in csv.DictReader(f)]
+
+    sklearn_service = service_with(
+        joblib.load(model_dir / "sms_model.pkl"), joblib.load(model_dir / "vectorizer.pkl")
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        mmap_dir = model_dir
+        if not has_artifacts(model_dir):
+            mmap_dir = Path(tmp)
+            export_artifacts(sklearn_service.sms_model, sklearn_service.vectorizer, mmap_dir / MMAP_DIR)
+        flat_service = service_with(*load_artifacts(mmap_dir))
+
+        # Contrôle : probabilités identiques sur tout le jeu de données
+        expected = sklearn_service.sms_model.predict_proba(sklearn_service.vectorizer.transform(messages))
+        actual = flat_service.sms_model.predict_proba(flat_service.vectorizer.transform(messages))
+        assert np.array_equal(expected, actual), np.abs(expected - actual).max()
+        assert sklearn_service.predict_sms_batch(messages) == flat_service.predict_sms_batch(messages)
+        print(f"{len(messages)} messages : prédictions identiques\n")
+
+        sample = messages[: args.messages]
+        batches = [sample[i : i + args.batch] for i in range(0, len(sample), args.batch)]
+        print(f"{'moteur':>8} {'p50 µs/msg':>11} {'p99 µs/msg':>11} {f'lot {args.batch} µs/msg':>15}")
+        for name, service in (("sklearn", sklearn_service), ("flat", flat_service)):
+            service.predict_sms(sample[0], "")  # échauffement
+            single = latencies_us(lambda m: service.predict_sms(m, ""), sample)
+            batched = latencies_us(service.predict_sms_batch, batches).sum() / len(sample)
+            print(
+                f"{name:>8} {np.percentile(single, 50):>11.0f} "
+                f"{np.percentile(single, 99):>11.0f} {batched:>15.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
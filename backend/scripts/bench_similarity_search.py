@@ -0,0 +1,149 @@
+"""
+Benchmark de check_similarity_fraud : ancienne requête (100 voisins, seuil
+filtré en Python) contre recherche avec score_threshold et limit = minimum de
+la décision, avec et sans quantification int8 (rescore + oversampling).
+
+Vecteurs synthétiques de dimension 384 : campagnes de variantes proches
+(cosinus ~0.9 entre variantes), requêtes moitié variantes de campagnes
+indexées, moitié messages sans rapport. Rapporte la latence p50/p99, les
+points renvoyés par requête (volume réseau), l'accord des décisions et la
+RAM estimée des vecteurs.
+
+Qdrant : --qdrant-url (serveur, quantification effective) ou, par défaut,
+le mode local en mémoire de qdrant-client comme stand-in (recherche exacte
+en NumPy : il accepte score_threshold mais ignore la quantification).
+
+Usage:
+    python scripts/bench_similarity_search.py [--points 20000] [--queries 300] [--qdrant-url http://localhost:6333]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.core.config import settings
+
+DIM = 384
+THRESHOLD = 0.85
+
+
+def synthetic(points: int, queries: int, campaign_size: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    campaigns = max(points // campaign_size, 1)
+    centers = rng.standard_normal((campaigns, DIM)).astype(np.float32)
+    labels = rng.integers(0, campaigns, points)
+    data = centers[labels] + 0.3 * rng.standard_normal((points, DIM)).astype(np.float32)
+    near = centers[rng.integers(0, campaigns, queries // 2)]
+    near = near + 0.3 * rng.standard_normal(near.shape).astype(np.float32)
+    unrelated = rng.standard_normal((queries - len(near), DIM)).astype(np.float32)
+    return data, np.vstack([near, unrelated])
+
+
+def create(client, name: str, quantized: bool):
+    from qdrant_client.models import (
+        Distance,
+        ScalarQuantization,
+        ScalarQuantizationConfig,
+        ScalarType,
+        VectorParams,
+    )
+
+    if client.collection_exists(name):
+        client.delete_collection(name)
+    client.create_collection(
+        name,
+        vectors_config=VectorParams(size=DIM, distance=Distance.COSINE, on_disk=quantized),
+        quantization_config=ScalarQuantization(
+            scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+        if quantized
+        else None,
+    )
+
+
+def run(search, queries) -> dict:
+    search(queries[0])
+    timings, decisions, returned = [], [], []
+    for q in queries:
+        start = time.perf_counter()
+        is_fraud, hits = search(q)
+        timings.append((time.perf_counter() - start) * 1000)
+        decisions.append(is_fraud)
+        returned.append(hits)
+    return {
+        "p50": float(np.percentile(timings, 50)),
+        "p99": float(np.percentile(timings, 99)),
+        "returned": float(np.mean(returned)),
+        "decisions": np.array(decisions),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--campaign-size", type=int, default=20)
+    parser.add_argument("--qdrant-url", default=None)
+    args = parser.parse_args()
+
+    from qdrant_client import QdrantClient
+    from qdrant_client.models import PointStruct, QuantizationSearchParams, SearchParams
+
+    client = QdrantClient(url=args.qdrant_url) if args.qdrant_url else QdrantClient(":memory:")
+    data, queries = synthetic(args.points, args.queries, args.campaign_size)
+    min_matches = settings.RAG_SIMILAR_FRAUD_MIN_MATCHES
+    print(
+        f"{len(data)} points, {len(queries)} requêtes, seuil {THRESHOLD}, "
+        f"Qdrant {'serveur' if args.qdrant_url else 'local :memory: (stand-in)'}\n"
+    )
+
+    rows = {}
+    for quantized in (False, True):
+        name = f"bench_similarity_{'int8' if quantized else 'f32'}"
+        create(client, name, quantized)
+        for i in range(0, len(data), 1000):
+            client.upsert(
+                name,
+                [PointStruct(id=j, vector=data[j].tolist(), payload={"n": j}) for j in range(i, min(i + 1000, len(data)))],
+            )
+        params = (
+            SearchParams(quantization=QuantizationSearchParams(rescore=True, oversampling=settings.RAG_QDRANT_OVERSAMPLING))
+            if quantized
+            else None
+        )
+
+        def before(q):
+            hits = client.search(name, query_vector=q.tolist(), limit=100, search_params=params)
+            similar = [h for h in hits if h.score >= THRESHOLD]
+            return len(similar) >= min_matches, len(hits)
+
+        def after(q):
+            hits = client.search(
+                name, query_vector=q.tolist(), limit=min_matches, score_threshold=THRESHOLD, search_params=params
+            )
+            return len(hits) >= min_matches, len(hits)
+
+        label = "int8 + rescore" if quantized else "float32"
+        rows[f"limit=100, filtre Python ({label})"] = run(before, queries)
+        rows[f"score_threshold, limit={min_matches} ({label})"] = run(after, queries)
+        client.delete_collection(name)
+
+    reference = next(iter(rows.values()))["decisions"]
+    print(f"{'requête':<44} {'p50 ms':>8} {'p99 ms':>8} {'points':>7} {'accord':>7}")
+    for name, row in rows.items():
+        agreement = float(np.mean(row["decisions"] == reference))
+        print(f"{name:<44} {row['p50']:>8.2f} {row['p99']:>8.2f} {row['returned']:>7.1f} {agreement:>7.1%}")
+    print(f"\nfraudes détectées : {int(reference.sum())}/{len(queries)}")
+    print(
+        f"RAM des vecteurs : float32 {len(data) * DIM * 4 / 2**20:.1f} Mo, "
+        f"int8 {len(data) * DIM / 2**20:.1f} Mo (float32 sur disque pour le rescore)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark du moteur de règles SMS : coût par message selon le nombre de règles.
+
+Compare le moteur compilé (Aho-Corasick sur mots-clés et préfixes des regex) à l'évaluation
+naïve règle par règle, sur les messages de data/datasets/sms_train.csv.
+
+Usage:
+    python scripts/bench_sms_rules.py [--rules 10,100,1000,5000] [--messages 1000]
+"""
+import argparse
+import csv
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.detection.sms_rules import CompiledRules, SMSRule
+
+DATASET = Path(__file__).resolve().parent.parent / "data" / "datasets" / "sms_train.csv"
+WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def load_messages(limit: int):
+    with open(DATASET, newline="", encoding="utf-8") as f:
+        messages = [row["content"] for row in csv.DictReader(f)]
+    random.Random(0).shuffle(messages)
+    return messages[:limit]
+
+
+def make_rules(count: int, vocabulary, regex_ratio: float = 0.2):
+    """Règles synthétiques : 2 à 5 mots-clés du corpus, une sur cinq avec une regex."""
+    rng = random.Random(count)
+    rules = []
+    for pattern_id in range(1, count + 1):
+        keywords = tuple(sorted(set(rng.sample(vocabulary, rng.randint(2, 5)))))
+        regex = None
+        if rng.random() < regex_ratio:
+            regex = rf"{re.escape(keywords[0])}\W+\d{{{rng.randint(2, 6)}}}"
+        rules.append(SMSRule(pattern_id, f"cat_{pattern_id % 20}", rng.randint(1, 10), keywords, regex))
+    return rules
+
+
+class NaiveRules:
+    """Référence : chaque règle évaluée séparément (mots-clés + regex)."""
+
+    def __init__(self, rules, min_keywords: int = 2):
+        self.rules = [
+            (
+                rule,
+                [re.compile(rf"(?<!\w){re.escape(k)}(?!\w)") for k in rule.keywords],
+                re.compile(rule.regex, re.IGNORECASE) if rule.regex else None,
+                min(min_keywords, len(rule.keywords)),
+            )
+            for rule in rules
+        ]
+
+    def match(self, content: str):
+        text = content.casefold()
+        matched = []
+        for rule, keywords, regex, required in self.rules:
+            hits = sum(1 for k in keywords if k.search(text))
+            if hits >= required or (regex and regex.search(content)):
+                matched.append(rule.pattern_id)
+        return matched
+
+
+def per_message_us(engine, messages) -> float:
+    start = time.perf_counter()
+    for message in messages:
+        engine.match(message)
+    return (time.perf_counter() - start) / len(messages) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rules", default="10,100,1000,2000,5000")
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--naive-max", type=int, default=2000, help="au-delà, la référence naïve est ignorée")
+    args = parser.parse_args()
+
+    messages = load_messages(args.messages)
+    vocabulary = sorted({w for m in messages for w in WORD.findall(m.casefold()) if len(w) > 3})
+    print(f"{len(messages)} messages, vocabulaire {len(vocabulary)} mots\n")
+    print(f"{'règles':>8} {'compile ms':>11} {'moteur µs/msg':>14} {'naïf µs/msg':>12} {'gain':>7}")
+
+    for count in (int(c) for c in args.rules.split(",")):
+        rules = make_rules(count, vocabulary)
+
+        start = time.perf_counter()
+        compiled = CompiledRules(rules, min_keywords=2)
+        compile_ms = (time.perf_counter() - start) * 1000
+        engine_us = per_message_us(compiled, messages)
+
+        if count <= args.naive_max:
+            naive = NaiveRules(rules)
+            # Contrôle : les deux implémentations trouvent les mêmes règles
+            for message in messages[:200]:
+                expected = sorted(naive.match(message))
+                assert sorted(m.pattern_id for m in compiled.match(message)) == expected, message
+            naive_us = per_message_us(naive, messages)
+            print(f"{count:>8} {compile_ms:>11.1f} {engine_us:>14.1f} {naive_us:>12.1f} {naive_us / engine_us:>6.1f}x")
+        else:
+            print(f"{count:>8} {compile_ms:>11.1f} {engine_us:>14.1f} {'-':>12} {'-':>7}")
+
+
+if __name__ == "__main__":
+    main()
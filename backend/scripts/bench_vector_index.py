@@ -0,0 +1,124 @@
+"""
+Benchmark de l'index vectoriel local (app/services/rag_service/local_index.py)
+face à Qdrant.
+
+Vecteurs synthétiques de dimension 384 regroupés en campagnes (un centre par
+campagne + bruit), requêtes = variantes bruitées de points indexés. Pour
+chaque méthode : rappel@k par rapport à la recherche exacte, latence p50/p99
+d'une requête, temps de construction.
+- local exact : produit matriciel sur le memmap ;
+- local HNSW : graphe de l'index local (ef = RAG_HNSW_EF_SEARCH) ;
+- Qdrant : --qdrant-url (serveur) ou mode local en mémoire de qdrant-client
+  par défaut (recherche exacte en NumPy, sans réseau : ordre de grandeur
+  seulement, pas un serveur HNSW).
+
+Usage:
+    python scripts/bench_vector_index.py [--points 20000] [--queries 200] [--qdrant-url http://localhost:6333]
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.core.config import settings
+from app.services.rag_service.local_index import LocalVectorIndex
+
+DIM = 384
+COLLECTION = "bench_fraud_vectors"
+
+
+def synthetic(points: int, queries: int, campaigns: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((campaigns, DIM)).astype(np.float32)
+    labels = rng.integers(0, campaigns, points)
+    data = centers[labels] + 0.6 * rng.standard_normal((points, DIM)).astype(np.float32)
+    picked = rng.integers(0, points, queries)
+    query = data[picked] + 0.3 * rng.standard_normal((queries, DIM)).astype(np.float32)
+    return data, query
+
+
+def measure(search, queries, truth, k: int) -> dict:
+    search(queries[0])
+    timings, recalls = [], []
+    for q, expected in zip(queries, truth):
+        start = time.perf_counter()
+        found = search(q)
+        timings.append((time.perf_counter() - start) * 1000)
+        recalls.append(len(set(found[:k]) & set(expected)) / k)
+    return {
+        "recall": float(np.mean(recalls)),
+        "p50": float(np.percentile(timings, 50)),
+        "p99": float(np.percentile(timings, 99)),
+    }
+
+
+def qdrant_client(url):
+    from qdrant_client import QdrantClient
+    from qdrant_client.models import Distance, PointStruct, VectorParams
+
+    client = QdrantClient(url=url) if url else QdrantClient(":memory:")
+    if client.collection_exists(COLLECTION):
+        client.delete_collection(COLLECTION)
+    client.create_collection(COLLECTION, vectors_config=VectorParams(size=DIM, distance=Distance.COSINE))
+    return client, PointStruct
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--campaigns", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--qdrant-url", default=None)
+    parser.add_argument("--skip-qdrant", action="store_true")
+    args = parser.parse_args()
+
+    data, queries = synthetic(args.points, args.queries, args.campaigns)
+    rows = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = LocalVectorIndex(Path(tmp) / COLLECTION, DIM, settings.RAG_HNSW_M)
+        start = time.perf_counter()
+        for i in range(0, len(data), 1000):
+            index.upsert_many([(j, data[j], {"n": j}) for j in range(i, min(i + 1000, len(data)))])
+        build_s = time.perf_counter() - start
+        print(f"{len(data)} points, {len(queries)} requêtes, k={args.k}, index local construit en {build_s:.1f} s\n")
+
+        def local(exact):
+            return lambda q: [r["id"] for r in index.search(q, args.k, exact=exact)]
+
+        truth = [local(True)(q) for q in queries]
+        rows["local exact"] = measure(local(True), queries, truth, args.k)
+        rows["local HNSW"] = measure(local(False), queries, truth, args.k)
+
+        if not args.skip_qdrant:
+            client, PointStruct = qdrant_client(args.qdrant_url)
+            start = time.perf_counter()
+            for i in range(0, len(data), 1000):
+                client.upsert(
+                    COLLECTION,
+                    [PointStruct(id=j, vector=data[j].tolist(), payload={"n": j}) for j in range(i, min(i + 1000, len(data)))],
+                )
+            qdrant_build_s = time.perf_counter() - start
+
+            def qdrant(q):
+                return [r.id for r in client.search(COLLECTION, query_vector=q.tolist(), limit=args.k)]
+
+            label = "Qdrant " + ("serveur" if args.qdrant_url else "local :memory:")
+            rows[label] = measure(qdrant, queries, truth, args.k)
+            client.delete_collection(COLLECTION)
+            print(f"{label} : chargé en {qdrant_build_s:.1f} s\n")
+
+    print(f"{'méthode':<24} {'rappel@k':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, row in rows.items():
+        print(f"{name:<24} {row['recall']:>9.3f} {row['p50']:>8.2f} {row['p99']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
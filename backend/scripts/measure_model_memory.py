@@ -0,0 +1,113 @@
+"""
+Mémoire résidente par worker : modèles en pickle vs artefacts mmap.
+
+Lance N processus qui chargent chacun le modèle SMS (comme N workers uvicorn /
+Celery) puis prédisent quelques messages. Les mesures sont lues dans
+/proc/<pid>/smaps_rollup pendant que tous les processus sont vivants :
+- RSS : pages résidentes (les pages partagées sont comptées dans chaque processus)
+- PSS : pages partagées divisées par le nombre de processus qui les utilisent
+- privé : pages propres au processus (ce qu'un worker de plus coûte réellement)
+Le coût des imports (numpy, sklearn) est mesuré à part et retranché.
+
+Usage:
+    python scripts/measure_model_memory.py [--workers 4] [--model-dir models/ml_models]
+"""
+import argparse
+import csv
+import importlib
+import multiprocessing as mp
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+DATASET = ROOT / "data" / "datasets" / "sms_train.csv"
+
+
+def memory_kb() -> dict:
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss": fields["Rss"],
+        "pss": fields["Pss"],
+        "private": fields["Private_Clean"] + fields["Private_Dirty"],
+    }
+
+
+def worker(mode: str, model_dir: str, messages, barrier, results):
+    import joblib  # noqa: F401 - imports communs aux deux modes, hors mesure
+    # Chargé par joblib.load (forêt picklée) : pré-importé pour rester hors mesure
+    importlib.import_module("sklearn.ensemble")
+    from app.ml.artifacts import load_artifacts
+
+    before = memory_kb()
+    if mode == "pickle":
+        model = joblib.load(Path(model_dir) / "sms_model.pkl")
+        vectorizer = joblib.load(Path(model_dir) / "vectorizer.pkl")
+        model.n_jobs = 1
+    else:
+        model, vectorizer = load_artifacts(Path(model_dir))
+    model.predict_proba(vectorizer.transform(messages))
+
+    # Tous les workers sont chargés avant la mesure : le PSS répartit les pages partagées
+    barrier.wait()
+    after = memory_kb()
+    barrier.wait()
+    results.put({key: after[key] - before[key] for key in after} | {"total_rss": after["rss"]})
+
+
+def measure(mode: str, model_dir: Path, workers: int, messages) -> dict:
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    processes = [
+        ctx.Process(target=worker, args=(mode, str(model_dir), messages, barrier, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    samples = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return {key: sum(s[key] for s in samples) / workers for key in samples[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--model-dir", default=str(ROOT / "models" / "ml_models"))
+    parser.add_argument("--messages", type=int, default=200)
+    args = parser.parse_args()
+
+    import joblib
+    from app.ml.artifacts import MMAP_DIR, export_artifacts, has_artifacts
+
+    model_dir = Path(args.model_dir)
+    with open(DATASET, newline="", encoding="utf-8") as f:
+        messages = [row["content"] for row in csv.DictReader(f)][: args.messages]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        mmap_dir = model_dir
+        if not has_artifacts(model_dir):
+            mmap_dir = Path(tmp)
+            export_artifacts(
+                joblib.load(model_dir / "sms_model.pkl"),
+                joblib.load(model_dir / "vectorizer.pkl"),
+                mmap_dir / MMAP_DIR,
+            )
+
+        print(f"{args.workers} workers, modèle {model_dir}\n")
+        print(f"{'format':>8} {'RSS modèle':>11} {'PSS modèle':>11} {'privé':>9} {'RSS total':>10}  (kB/worker)")
+        for mode, path in (("pickle", model_dir), ("mmap", mmap_dir)):
+            r = measure(mode, path, args.workers, messages)
+            print(f"{mode:>8} {r['rss']:>11.0f} {r['pss']:>11.0f} {r['private']:>9.0f} {r['total_rss']:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,8 @@ from app.db.session import async_session_maker
 from app.models.fraud import FraudulentNumber, FraudulentSMSPattern, FraudulentDomain, FraudType
 from app.models.user import User, UserRole
 from app.services.auth_service import auth_service
+from app.services.cache import cache_service
+from app.services.detection.sms_rules import sms_rule_engine
 import hashlib
 from datetime import datetime, timezone
 from sqlalchemy import select
@@ -155,6 +157,10 @@ async def seed_database():
             session.add_all(sms_patterns)
             await session.commit()
             print(f"✅ {len(sms_patterns)} SMS patterns insérés")
+            # Les workers API recompilent leurs règles sans attendre le rafraîchissement périodique
+            await cache_service.connect()
+            await sms_rule_engine.notify_changed()
+            await cache_service.disconnect()
         else:
             print("✅ SMS patterns existent déjà, skip")
 